@@ -15,6 +15,24 @@ def create_app(config_name=None):
     # Configuration
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['PRESET_CACHE_CHECK_SECONDS'] = float(os.environ.get('PRESET_CACHE_CHECK_SECONDS', 30))
+    app.config['USER_CACHE_TTL_SECONDS'] = float(os.environ.get('USER_CACHE_TTL_SECONDS', 60))
+    app.config['USER_CACHE_SIZE'] = int(os.environ.get('USER_CACHE_SIZE', 1024))
+    app.config['USER_CACHE_CHECK_SECONDS'] = float(os.environ.get('USER_CACHE_CHECK_SECONDS', 5))
+    app.config['RESULT_CACHE_BACKEND'] = os.environ.get('RESULT_CACHE_BACKEND', 'memory')
+    app.config['RESULT_CACHE_PATH'] = os.environ.get('RESULT_CACHE_PATH')
+    app.config['RESULT_CACHE_SIZE'] = int(os.environ.get('RESULT_CACHE_SIZE', 2048))
+    app.config['RESULT_CACHE_TTL_SECONDS'] = float(os.environ.get('RESULT_CACHE_TTL_SECONDS', 86400))
+    app.config['SQL_DEBUG_HEADER'] = _env_flag('SQL_DEBUG_HEADER')
+    app.config['SQL_LOG_REQUESTS'] = _env_flag('SQL_LOG_REQUESTS')
+    app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR')
+    app.config['METRICS_FLUSH_SECONDS'] = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    app.config['ASYNC_READS'] = _env_flag('ASYNC_READS')
+    app.config['ASYNC_POOL_SIZE'] = int(os.environ.get('ASYNC_POOL_SIZE', 5))
+    app.config['ASYNC_READ_TIMEOUT_SECONDS'] = float(os.environ.get('ASYNC_READ_TIMEOUT_SECONDS', 30))
+    app.config['JOB_QUEUE'] = _env_flag('JOB_QUEUE')
+    app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_BYTES', 200 * 1024 * 1024))
     
     # Database: use PostgreSQL if DATABASE_URL exists, otherwise SQLite
     database_url = os.environ.get('DATABASE_URL')
@@ -28,84 +46,58 @@ def create_app(config_name=None):
     else:
         app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///rituals.db'
     
+    # Engine: pool sizing, pre-ping and timeouts from DB_* variables; SQLite
+    # connections get WAL and the other SQLITE_* pragmas on connect
+    from app.database import engine_options, init_engine
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['SQLITE_JOURNAL_MODE'] = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    
     # Initialize extensions
     db.init_app(app)
+    init_engine(app)
     login_manager.init_app(app)
     login_manager.login_view = 'login'
     login_manager.login_message = 'Please log in to access this page.'
     
+    from app.cache import init_result_cache
+    init_result_cache(app)
+    
+    from app.async_db import init_async_reads
+    init_async_reads(app)
+    
+    from app.instrumentation import init_instrumentation, parse_budgets
+    app.config['QUERY_BUDGETS'] = parse_budgets(os.environ.get('QUERY_BUDGETS'))
+    init_instrumentation(app)
+    
+    # After instrumentation, so its after_request hook still sees the SQL stats
+    from app.metrics import init_metrics
+    init_metrics(app)
+    
     @login_manager.user_loader
     def load_user(user_id):
-        from app.models import User
-        return User.query.get(int(user_id))
+        from app.services import auth_service
+        return auth_service.load_user_identity(user_id)
     
-    # Register routes and create tables
-    with app.app_context():
-        from app.routes import register_routes
-        register_routes(app)
-        
-        db.create_all()
-        
-        # Initialize preset rituals if empty
-        from app.models import Ritual
-        if Ritual.query.filter_by(user_id=None).count() == 0:
-            _initialize_preset_rituals()
+    # Register routes. No database I/O happens here: the schema and preset
+    # rituals are set up by `flask init-db`, so workers (or a --preload master)
+    # start without touching the database.
+    from app.routes import register_routes
+    register_routes(app)
+    
+    from app.api import register_api
+    register_api(app)
+    
+    from app.commands import register_commands
+    register_commands(app)
     
     return app
 
 
-def _initialize_preset_rituals():
-    """Initialize shared preset rituals."""
-    from app.models import Ritual
-    
-    presets = [
-        (
-            'Morning Filial Check-In',
-            'Each morning, intentionally check in with a parent or elder about their day, listening with full attention rather than multitasking.',
-            'Ren', 'Li', 'Analects 1.6; 2.7'
-        ),
-        (
-            'Respectful Greeting to Elders or Teachers',
-            'When meeting an elder or teacher, stand if seated, offer a deliberate greeting, and give undivided attention for the first moments of interaction.',
-            'Li', 'Ren', 'Analects 1.6; 10.3-10.5'
-        ),
-        (
-            'Three-Breath Speech Pause',
-            'Before responding in a charged moment, pause for three breaths to sense the standpoint of other people and choose words that are respectful and precise.',
-            'Zhi', 'Yi', 'Analects 1.4; 4.24'
-        ),
-        (
-            'Daily Three-Point Self-Examination',
-            'At the end of the day, review whether you were trustworthy, followed through on what you advised, and practiced what you are learning.',
-            'Zhi', 'Yi', 'Analects 1.4 (Zengzi\'s three examinations)'
-        ),
-        (
-            'Study-and-Practice Mini Session',
-            'Study a brief passage or idea and then design one small concrete action to practice it before the day ends.',
-            'Zhi', 'Li', 'Analects 1.1'
-        ),
-        (
-            'Small Daily Act of Ren',
-            'Seek out one concrete act of kindness—especially where you would normally stay on autopilot—and carry it through to completion.',
-            'Ren', 'Zhi', 'Analects 4.3; 12.22'
-        ),
-        (
-            'Conquer-the-Self Pause',
-            'When anger or resentment surges, notice the familiar pattern, suspend your first impulse, and submit to a chosen ritual response instead.',
-            'Yi', 'Li', 'Analects 12.1 ("conquer the self and submit to ritual")'
-        ),
-        (
-            'Courteous Greeting Ritual',
-            'In everyday greetings, pay attention to posture, tone, and eye contact, treating even brief encounters as mini-rituals of respect.',
-            'Li', 'Ren', 'Analects 10.1-10.9'
-        ),
-    ]
-    
-    for name, desc, primary, secondary, source in presets:
-        db.session.add(Ritual(
-            name=name, description=desc,
-            primary_category=primary, secondary_category=secondary,
-            source=source, user_id=None
-        ))
-    
-    db.session.commit()
+def _env_flag(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
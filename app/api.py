@@ -0,0 +1,326 @@
+"""Versioned JSON API (/api/v1).
+
+Every GET response carries a weak ETag and Last-Modified derived from the
+user's data version (see version_service). A client that sends them back
+gets a 304 after a single version lookup, before any service query runs.
+"""
+import hashlib
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+
+from flask import abort, jsonify, request, Response, url_for
+from flask_login import current_user
+from werkzeug.exceptions import HTTPException
+
+from app.async_db import async_reads_enabled
+from app.services import ritual_service, log_service, reflection_service, version_service, async_reads, timezone_service
+from app.services.summary_engine import get_summary
+
+API_PREFIX = '/api/v1'
+MAX_PAGE_SIZE = 100
+MAX_HEATMAP_YEARS = 10
+
+
+def api_login_required(view):
+    """Like login_required, but answers 401 JSON instead of redirecting."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return jsonify(error='authentication required'), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _validators(user_id, tz_name=None):
+    """Return (etag, last_modified) for the current request and user.
+
+    last_modified is None while it is still in the future (see below).
+    """
+    user_key = version_service.user_data_key(user_id)
+    versions = version_service.get_versions(user_key, ritual_service.PRESET_CACHE_VERSION)
+    user_version, user_updated = versions[user_key]
+    preset_version, preset_updated = versions[ritual_service.PRESET_CACHE_VERSION]
+
+    # The date is part of the tag because streaks and "this week" roll over
+    # at the user's local midnight even when no data changes.
+    zone = timezone_service.get_zone(tz_name)
+    raw = '|'.join(str(part) for part in (
+        user_id, user_version, preset_version, timezone_service.local_today(tz_name).isoformat(),
+        request.path, request.query_string.decode()
+    ))
+    etag = hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+    midnight = datetime.now(zone).replace(hour=0, minute=0, second=0, microsecond=0)
+    stamps = [stamp.replace(tzinfo=timezone.utc) for stamp in (user_updated, preset_updated) if stamp]
+    latest = max(stamps + [midnight.astimezone(timezone.utc)])
+    # HTTP dates have whole seconds: round up, so the header is never older
+    # than the write. Until that second has passed another write could land
+    # in it with the same rounded stamp, so no Last-Modified is sent yet.
+    last_modified = latest.replace(microsecond=0)
+    if latest.microsecond:
+        last_modified += timedelta(seconds=1)
+    if last_modified > datetime.now(timezone.utc):
+        return etag, None
+    return etag, last_modified
+
+
+def conditional(view):
+    """Answer 304 from the user's data version, or tag the JSON response."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        etag, last_modified = _validators(current_user.id, current_user.timezone)
+
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains_weak(etag)
+        else:
+            since = request.if_modified_since
+            not_modified = bool(since and last_modified and last_modified <= since)
+
+        response = Response(status=304) if not_modified else jsonify(view(*args, **kwargs))
+        response.set_etag(etag, weak=True)
+        if last_modified:
+            response.last_modified = last_modified
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+    return wrapper
+
+
+def _page_size():
+    return max(1, min(request.args.get('limit', 20, type=int), MAX_PAGE_SIZE))
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def ritual_to_dict(ritual):
+    return {
+        'id': ritual.id,
+        'name': ritual.name,
+        'description': ritual.description,
+        'primary_category': ritual.primary_category,
+        'secondary_category': ritual.secondary_category,
+        'source': ritual.source,
+        'is_preset': ritual.is_preset,
+    }
+
+
+def log_to_dict(entry):
+    return {
+        'id': entry.id,
+        'ritual_id': entry.ritual_id,
+        'ritual_name': entry.ritual_name,
+        'context': entry.context,
+        'reflection': entry.reflection,
+        'created_at': _iso(entry.created_at),
+        'local_date': entry.local_date.isoformat() if entry.local_date else None,
+    }
+
+
+def reflection_to_dict(reflection):
+    return {
+        'id': reflection.id,
+        'reflection_text': reflection.reflection_text,
+        'created_at': _iso(reflection.created_at),
+        'local_date': reflection.local_date.isoformat() if reflection.local_date else None,
+    }
+
+
+def search_hit_to_dict(hit):
+    return {
+        'kind': hit.kind,
+        'id': hit.id,
+        'created_at': _iso(hit.created_at),
+        'score': hit.score,
+        'snippet': str(hit.highlighted),
+        'ritual_id': hit.ritual_id,
+        'ritual_name': hit.ritual_name,
+    }
+
+
+def time_series_to_dict(series):
+    return {
+        'granularity': series.granularity,
+        'start': series.start.isoformat(),
+        'end': series.end.isoformat(),
+        'buckets': [bucket.isoformat() for bucket in series.buckets],
+        'series': [
+            {'name': s.name, 'ritual_id': s.ritual_id, 'values': s.values}
+            for s in series.series
+        ],
+    }
+
+
+def community_stats_to_dict(stats):
+    return {
+        'week_start': stats.week_start.isoformat(),
+        'log_count': stats.log_count,
+        'active_users': stats.active_users,
+        'virtue_counts': stats.virtue_counts,
+        'top_presets': stats.top_presets,
+        'refreshed_at': _iso(stats.refreshed_at),
+    }
+
+
+def job_to_dict(job):
+    result = job.result
+    download_url = None
+    if isinstance(result, dict) and 'path' in result:
+        # The server-side file location is not the client's business
+        result = {key: value for key, value in result.items() if key != 'path'}
+        download_url = url_for('job_download', job_id=job.id)
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'result': result,
+        'error': job.error,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'created_at': _iso(job.created_at),
+        'started_at': _iso(job.started_at),
+        'finished_at': _iso(job.finished_at),
+        'download_url': download_url if job.status == 'succeeded' else None,
+    }
+
+
+def page_to_dict(page, serialize):
+    return {
+        'items': [serialize(item) for item in page.items],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    }
+
+
+def register_api(app):
+    """Register the JSON API routes with the Flask app."""
+
+    @app.errorhandler(HTTPException)
+    def api_error(e):
+        # Only API paths get JSON errors; pages keep Flask's HTML errors
+        if request.path.startswith(API_PREFIX + '/'):
+            return jsonify(error=e.description), e.code
+        return e
+
+    @app.route(f'{API_PREFIX}/rituals')
+    @api_login_required
+    @conditional
+    def api_rituals():
+        reads = async_reads if async_reads_enabled() else ritual_service
+        rituals = reads.get_available_rituals(current_user.id)
+        return {'items': [ritual_to_dict(r) for r in rituals]}
+
+    @app.route(f'{API_PREFIX}/rituals/top')
+    @api_login_required
+    @conditional
+    def api_top_rituals():
+        from app.services import usage_service
+        limit = request.args.get('limit', usage_service.DEFAULT_TOP_LIMIT, type=int)
+        limit = max(1, min(limit, usage_service.MAX_TOP_LIMIT))
+        return {'items': usage_service.get_top_rituals(current_user.id, limit)}
+
+    @app.route(f'{API_PREFIX}/logs')
+    @api_login_required
+    @conditional
+    def api_logs():
+        reads = async_reads if async_reads_enabled() else log_service
+        page = reads.get_user_ritual_logs_page(
+            current_user.id, cursor=request.args.get('cursor'), per_page=_page_size()
+        )
+        return page_to_dict(page, log_to_dict)
+
+    @app.route(f'{API_PREFIX}/logs/<int:entry_id>')
+    @api_login_required
+    @conditional
+    def api_log(entry_id):
+        entry = log_service.get_log_entry_by_id(entry_id)
+        if not entry or not log_service.can_user_modify_log(entry, current_user.id):
+            abort(404)
+        return log_to_dict(entry)
+
+    @app.route(f'{API_PREFIX}/reflections')
+    @api_login_required
+    @conditional
+    def api_reflections():
+        reads = async_reads if async_reads_enabled() else reflection_service
+        page = reads.get_user_reflections_page(
+            current_user.id, cursor=request.args.get('cursor'), per_page=_page_size()
+        )
+        return page_to_dict(page, reflection_to_dict)
+
+    @app.route(f'{API_PREFIX}/search')
+    @api_login_required
+    @conditional
+    def api_search():
+        from app.services import search_service
+        try:
+            filters = search_service.parse_search_args(request.args)
+        except ValueError:
+            abort(400, 'Dates must be in YYYY-MM-DD format.')
+        page = search_service.search(
+            current_user.id, cursor=request.args.get('cursor'), per_page=_page_size(), **filters
+        )
+        return page_to_dict(page, search_hit_to_dict)
+
+    @app.route(f'{API_PREFIX}/timeseries')
+    @api_login_required
+    @conditional
+    def api_timeseries():
+        from app.services import timeseries_service
+        try:
+            series = timeseries_service.get_time_series(
+                current_user.id, **timeseries_service.parse_time_series_args(
+                    request.args, timezone_service.local_today(current_user.timezone)
+                )
+            )
+        except ValueError as e:
+            abort(400, str(e))
+        return time_series_to_dict(series)
+
+    @app.route(f'{API_PREFIX}/heatmap')
+    @api_login_required
+    @conditional
+    def api_heatmap():
+        from app.services import activity_service
+        today = timezone_service.local_today(current_user.timezone)
+        years = max(1, min(request.args.get('years', 1, type=int), MAX_HEATMAP_YEARS))
+        return activity_service.get_heatmap(current_user.id, today.year - years + 1, today.year, today)
+
+    # Not @conditional: the numbers change when the scheduler refreshes them,
+    # which no per-user version tracks.
+    @app.route(f'{API_PREFIX}/community')
+    @api_login_required
+    def api_community():
+        from app.services import community_service
+        today = timezone_service.local_today(current_user.timezone)
+        week_start = today - timedelta(days=today.weekday())
+        return community_stats_to_dict(community_service.get_community_stats(week_start))
+
+    # Not @conditional either: job progress is written by the worker, not the user
+    @app.route(f'{API_PREFIX}/jobs/<int:job_id>')
+    @api_login_required
+    def api_job(job_id):
+        from app.services import job_service
+        job = job_service.get_job(job_id, user_id=current_user.id)
+        if job is None:
+            abort(404)
+        return job_to_dict(job)
+
+    @app.route(f'{API_PREFIX}/summary')
+    @api_login_required
+    @conditional
+    def api_summary():
+        if async_reads_enabled():
+            result = async_reads.get_summary(current_user.id, current_user.created_at,
+                                             current_user.timezone)
+        else:
+            result = get_summary(current_user.id, joined_at=current_user.created_at,
+                                 timezone=current_user.timezone)
+        data = asdict(result)
+        data['week_change'] = result.week_change
+        data['week_start'] = result.week_start.isoformat()
+        data['week_end'] = result.week_end.isoformat()
+        return data
@@ -0,0 +1,104 @@
+"""Async SQLAlchemy engine for the optional async read path (ASYNC_READS).
+
+Each worker process runs one asyncio event loop in a background thread and
+keeps its AsyncEngine (and connection pool) on that loop. A request thread
+hands a coroutine to run_async() and waits for the result; inside the
+coroutine, independent queries run concurrently on separate connections.
+Views stay ordinary Flask views, so this works under gunicorn sync workers.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+
+from flask import current_app
+
+from app import db
+
+DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+psycopg_async',
+}
+
+
+class AsyncReader:
+    """Per-process event loop thread plus the async engine that lives on it."""
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = threading.Lock()
+        self._pid = None
+        self._loop = None
+        self.engine = None
+        self.sessionmaker = None
+
+    def _async_url(self):
+        with self.app.app_context():
+            url = db.engine.url
+        backend = url.get_backend_name()
+        if backend not in DRIVERS:
+            raise RuntimeError(f'ASYNC_READS does not support the "{backend}" database')
+        return url.set(drivername=DRIVERS[backend])
+
+    def _start(self):
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+        from app.database import attach_sqlite_pragmas
+        from app.instrumentation import attach_listeners
+
+        url = self._async_url()
+        options = {'pool_size': self.app.config['ASYNC_POOL_SIZE'], 'pool_pre_ping': True}
+        if url.get_backend_name() == 'sqlite':
+            options['connect_args'] = {'timeout': self.app.config['SQLITE_BUSY_TIMEOUT_MS'] / 1000.0}
+        self.engine = create_async_engine(url, **options)
+        if url.get_backend_name() == 'sqlite':
+            attach_sqlite_pragmas(self.engine.sync_engine, self.app)
+        # Async statements count towards the request's X-SQL-Queries, budgets and metrics
+        attach_listeners(self.engine.sync_engine)
+        self.sessionmaker = async_sessionmaker(self.engine, expire_on_commit=False)
+
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name='async-reads', daemon=True).start()
+        self._pid = os.getpid()
+
+    def run(self, coroutine):
+        """Run a coroutine on this process's loop and return its result."""
+        if self._pid != os.getpid():
+            # Not started yet, or inherited from a --preload master
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._start()
+        # The caller's context carries the request context, so statement
+        # listeners on the loop thread find the request's SQL stats
+        context = contextvars.copy_context()
+        future = asyncio.run_coroutine_threadsafe(_in_context(coroutine, context), self._loop)
+        return future.result(timeout=self.app.config['ASYNC_READ_TIMEOUT_SECONDS'])
+
+    async def read(self, func, *args):
+        """Await func(session, *args) with a session of its own."""
+        async with self.sessionmaker() as session:
+            return await func(session, *args)
+
+
+async def _in_context(coroutine, context):
+    # Cancelling this task (e.g. on timeout) cancels the inner one too
+    return await asyncio.get_running_loop().create_task(coroutine, context=context)
+
+
+def init_async_reads(app):
+    """Set up the async reader when ASYNC_READS is enabled."""
+    if not app.config.get('ASYNC_READS'):
+        return
+    try:
+        import greenlet  # noqa: F401  (SQLAlchemy's asyncio layer needs it)
+        import sqlalchemy.ext.asyncio  # noqa: F401
+    except ImportError as e:
+        raise RuntimeError('ASYNC_READS needs the async extras: pip install aiosqlite greenlet') from e
+    app.extensions['async_reader'] = AsyncReader(app)
+
+
+def async_reads_enabled():
+    return 'async_reader' in current_app.extensions
+
+
+def get_async_reader():
+    return current_app.extensions['async_reader']
@@ -0,0 +1,237 @@
+"""Caching helpers: an in-process TTL/LRU cache and the pluggable result cache."""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after ttl seconds."""
+
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete_where(self, predicate):
+        """Drop every entry whose key matches predicate."""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# =============================================================================
+# RESULT CACHE
+# =============================================================================
+#
+# Computed results (e.g. a SummaryResult) are cached under keys that embed the
+# user's data version, so a write never has to delete anything: it bumps the
+# version and later reads simply miss. Backends only need get/set/stats.
+
+class MemoryBackend:
+    """Per-process LRU backend (the default)."""
+
+    name = 'memory'
+    shared = False
+
+    def __init__(self, maxsize=2048, ttl=86400):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._missing = object()
+
+    def get(self, key):
+        value = self._cache.get(key, self._missing)
+        return (False, None) if value is self._missing else (True, value)
+
+    def set(self, key, value):
+        self._cache.set(key, value)
+
+    def clear(self):
+        self._cache.clear()
+
+    def record(self, hit):
+        """Hits and misses are already counted by the TTLCache itself."""
+
+    def counters(self):
+        return {'hits': self._cache.hits, 'misses': self._cache.misses, 'entries': len(self._cache)}
+
+
+class SQLiteBackend:
+    """File-backed backend shared by every worker process on the host.
+
+    Values are pickled into a local SQLite file in WAL mode; hit/miss counters
+    are stored in the same file so they cover all workers.
+    """
+
+    name = 'sqlite'
+    shared = True
+    PURGE_EVERY = 500
+
+    def __init__(self, path, ttl=86400):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connect(self):
+        # Connections are opened lazily, per thread and per process, so the
+        # backend can be created before gunicorn forks its workers.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS entries '
+                         '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS counters '
+                         '(name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            conn.execute("INSERT OR IGNORE INTO counters VALUES ('hits', 0), ('misses', 0)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        try:
+            row = self._connect().execute(
+                'SELECT value FROM entries WHERE key = ? AND expires_at > ?', (key, time.time())
+            ).fetchone()
+            return (True, pickle.loads(row[0])) if row else (False, None)
+        except (sqlite3.Error, pickle.UnpicklingError):
+            return False, None
+
+    def set(self, key, value):
+        try:
+            conn = self._connect()
+            conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?)',
+                         (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), time.time() + self.ttl))
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                conn.execute('DELETE FROM entries WHERE expires_at <= ?', (time.time(),))
+        except sqlite3.Error:
+            pass
+
+    def clear(self):
+        conn = self._connect()
+        conn.execute('DELETE FROM entries')
+        conn.execute('UPDATE counters SET value = 0')
+
+    def record(self, hit):
+        try:
+            self._connect().execute('UPDATE counters SET value = value + 1 WHERE name = ?',
+                                    ('hits' if hit else 'misses',))
+        except sqlite3.Error:
+            pass
+
+    def counters(self):
+        conn = self._connect()
+        counters = dict(conn.execute('SELECT name, value FROM counters').fetchall())
+        counters['entries'] = conn.execute(
+            'SELECT COUNT(*) FROM entries WHERE expires_at > ?', (time.time(),)
+        ).fetchone()[0]
+        return counters
+
+
+class NullBackend:
+    """Disables caching while keeping the counters meaningful."""
+
+    name = 'none'
+    shared = False
+
+    def __init__(self):
+        self._misses = 0
+
+    def get(self, key):
+        return False, None
+
+    def set(self, key, value):
+        pass
+
+    def clear(self):
+        pass
+
+    def record(self, hit):
+        self._misses += 1
+
+    def counters(self):
+        return {'hits': 0, 'misses': self._misses, 'entries': 0}
+
+
+class ResultCache:
+    """Front end for the configured result cache backend."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get_or_compute(self, key, compute):
+        found, value = self.backend.get(key)
+        self.backend.record(found)
+        if found:
+            return value
+        value = compute()
+        self.backend.set(key, value)
+        return value
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        counters = self.backend.counters()
+        lookups = counters['hits'] + counters['misses']
+        counters['backend'] = self.backend.name
+        counters['hit_rate'] = counters['hits'] / lookups if lookups else 0.0
+        return counters
+
+
+def init_result_cache(app):
+    """Create the result cache selected by RESULT_CACHE_BACKEND."""
+    backend_name = app.config.get('RESULT_CACHE_BACKEND', 'memory')
+    ttl = app.config.get('RESULT_CACHE_TTL_SECONDS', 86400)
+    if backend_name == 'sqlite':
+        path = app.config.get('RESULT_CACHE_PATH') or os.path.join(app.instance_path, 'result_cache.sqlite3')
+        backend = SQLiteBackend(path, ttl=ttl)
+    elif backend_name == 'memory':
+        backend = MemoryBackend(maxsize=app.config.get('RESULT_CACHE_SIZE', 2048), ttl=ttl)
+    elif backend_name == 'none':
+        backend = NullBackend()
+    else:
+        raise ValueError(f'Unknown RESULT_CACHE_BACKEND "{backend_name}"')
+    app.extensions['result_cache'] = ResultCache(backend)
+    return app.extensions['result_cache']
+
+
+def get_result_cache():
+    return current_app.extensions['result_cache']
@@ -0,0 +1,239 @@
+"""Flask CLI commands."""
+import click
+
+
+def register_commands(app):
+    """Register all CLI commands with the Flask app."""
+    
+    @app.cli.command('init-db')
+    def init_db():
+        """Create tables, apply migrations and seed preset rituals (run once per deploy)."""
+        from app import migrations
+        from app.seed import seed_preset_rituals
+        for version, description in migrations.upgrade():
+            click.echo(f'Applied migration {version}: {description}')
+        click.echo(f'Database is at schema version {migrations.get_current_version()}.')
+        added = seed_preset_rituals()
+        if added:
+            click.echo(f'Seeded {added} preset ritual(s).')
+    
+    @app.cli.command('seed')
+    def seed():
+        """Add the preset rituals if the database has none."""
+        from app.seed import seed_preset_rituals
+        click.echo(f'Seeded {seed_preset_rituals()} preset ritual(s).')
+    
+    @app.cli.command('db-upgrade')
+    def db_upgrade():
+        """Create missing tables and apply pending schema migrations."""
+        from app import migrations
+        applied = migrations.upgrade()
+        for version, description in applied:
+            click.echo(f'Applied migration {version}: {description}')
+        click.echo(f'Database is at schema version {migrations.get_current_version()}.')
+    
+    @app.cli.command('db-version')
+    def db_version():
+        """Show the applied and latest schema migration versions."""
+        from app import migrations
+        click.echo(f'Current: {migrations.get_current_version()}')
+        click.echo(f'Latest:  {migrations.get_latest_version()}')
+    
+    @app.cli.command('rebuild-rollups')
+    @click.option('--user-id', type=int, default=None, help='Only rebuild rollups for this user.')
+    def rebuild_rollups(user_id):
+        """Regenerate the daily rollup table from raw ritual logs."""
+        from app.services import rollup_service
+        rows = rollup_service.rebuild_rollups(user_id)
+        click.echo(f'Rebuilt {rows} daily rollup row(s).')
+    
+    @app.cli.command('backfill-local-dates')
+    @click.option('--user-id', type=int, default=None, help='Only backfill this user.')
+    @click.option('--recompute', is_flag=True, help='Redo rows that already have a local date.')
+    def backfill_local_dates(user_id, recompute):
+        """Fill local_date on logs and reflections from each user's time zone, then rebuild rollups."""
+        from app.services import rollup_service, timezone_service
+        updated = timezone_service.backfill_local_dates(user_id, recompute=recompute)
+        click.echo(f'Updated {updated} row(s).')
+        if updated:
+            rows = rollup_service.rebuild_rollups(user_id)
+            click.echo(f'Rebuilt {rows} daily rollup row(s).')
+    
+    @app.cli.command('check-usage')
+    @click.option('--user-id', type=int, default=None, help='Only check this user.')
+    @click.option('--repair', is_flag=True, help='Rewrite counters that disagree with the logs.')
+    def check_usage(user_id, repair):
+        """Compare per-ritual usage counters with the ritual logs."""
+        from app.services import usage_service
+        drift = usage_service.check_usage(user_id, repair=repair)
+        for item in drift:
+            click.echo(f'user {item.user_id} ritual {item.ritual_id}: '
+                       f'stored {item.stored}, actual {item.actual}')
+        if not drift:
+            click.echo('Usage counters match the logs.')
+        elif repair:
+            click.echo(f'Repaired {len(drift)} counter(s).')
+        else:
+            click.echo(f'{len(drift)} counter(s) out of step; run with --repair to fix them.')
+    
+    @app.cli.command('refresh-community-stats')
+    @click.option('--full', is_flag=True, help='Rebuild from every log instead of only new ones.')
+    @click.option('--every', type=int, default=None,
+                  help='Keep running, refreshing every N seconds (with a full rebuild daily).')
+    def refresh_community_stats(full, every):
+        """Fold new ritual logs into the community-wide aggregates."""
+        import time
+        from app.services import community_service
+        last_full = time.monotonic() if full else None
+        while True:
+            advanced = community_service.refresh_community_stats(full=full)
+            click.echo(f'{"Rebuilt" if full else "Refreshed"} community stats '
+                       f'({advanced} log id(s) folded in).')
+            if every is None:
+                return
+            time.sleep(every)
+            full = last_full is None or \
+                time.monotonic() - last_full >= community_service.FULL_REBUILD_SECONDS
+            if full:
+                last_full = time.monotonic()
+    
+    @app.cli.command('worker')
+    @click.option('--concurrency', type=int, default=2, show_default=True,
+                  help='Jobs to run at the same time.')
+    @click.option('--processes', is_flag=True, help='Run jobs in worker processes instead of threads.')
+    @click.option('--poll-interval', type=float, default=1.0, show_default=True,
+                  help='Seconds to wait before polling an empty queue again.')
+    @click.option('--drain', is_flag=True, help='Exit once the queue is empty.')
+    def worker(concurrency, processes, poll_interval, drain):
+        """Run queued background jobs until stopped (Ctrl+C or SIGTERM)."""
+        import signal
+        from app.worker import Worker
+        
+        runner = Worker(app, concurrency=concurrency, processes=processes,
+                        poll_interval=poll_interval)
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: runner.stop())
+        click.echo(f'Worker {runner.name} running {concurrency} job(s) at a time '
+                   f'in {"processes" if processes else "threads"}.')
+        started = runner.run(drain=drain)
+        click.echo(f'Worker stopped after starting {started} job(s).')
+    
+    @app.cli.command('enqueue-job')
+    @click.argument('kind')
+    @click.option('--payload', default='{}', help='Job payload as a JSON object.')
+    @click.option('--priority', type=int, default=None, help='Higher runs first (default: per kind).')
+    @click.option('--dedup-key', default=None, help='Skip if a job with this key is already waiting.')
+    def enqueue_job(kind, payload, priority, dedup_key):
+        """Queue a background job, e.g. enqueue-job refresh_community_stats --payload '{"full": true}'."""
+        import json
+        from app.jobs import PRIORITIES
+        from app.services import job_service
+        
+        try:
+            data = json.loads(payload)
+        except ValueError as e:
+            raise click.ClickException(f'Invalid payload: {e}')
+        if priority is None:
+            priority = PRIORITIES.get(kind, 0)
+        try:
+            job = job_service.enqueue(kind, data, priority=priority, dedup_key=dedup_key)
+        except job_service.UnknownJobKind as e:
+            raise click.ClickException(str(e))
+        click.echo(f'Job {job.id} ({job.kind}) is {job.status}.')
+    
+    @app.cli.command('prune-jobs')
+    @click.option('--days', type=int, default=7, show_default=True,
+                  help='Keep finished jobs younger than this.')
+    def prune_jobs(days):
+        """Delete old finished jobs and their export files."""
+        from app.services import job_service
+        click.echo(f'Deleted {job_service.prune_finished(days)} job(s).')
+    
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index():
+        """Re-index log and reflection text for full-text search (SQLite FTS5 tables)."""
+        from app.services import search_service
+        search_service.rebuild_search_indexes()
+        click.echo('Search index rebuilt.')
+    
+    @app.cli.command('invalidate-preset-cache')
+    def invalidate_preset_cache():
+        """Make every worker reload the preset ritual catalog (after editing presets)."""
+        from app import db
+        from app.services import ritual_service
+        ritual_service.invalidate_preset_cache()
+        db.session.commit()
+        click.echo('Preset ritual cache invalidated.')
+    
+    @app.cli.command('import-data')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--username', required=True, help='Account to import into.')
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default=None,
+                  help='File format (default: from the file extension).')
+    @click.option('--batch-size', type=int, default=1000, show_default=True)
+    def import_data(path, username, fmt, batch_size):
+        """Bulk import ritual logs and reflections from a CSV or JSONL file."""
+        from app.models import User
+        from app.services import import_service
+        
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.ClickException(f'No user named "{username}".')
+        
+        try:
+            fmt = import_service.detect_format(path, fmt)
+        except import_service.ImportFormatError as e:
+            raise click.ClickException(str(e))
+        
+        def progress(report):
+            click.echo(f'  {report.rows_read} rows read, {report.imported} imported, '
+                       f'{report.error_count} errors', err=True)
+        
+        with open(path, 'rb') as f:
+            report = import_service.import_file(user.id, f, fmt, batch_size=batch_size,
+                                                on_progress=progress)
+        
+        for line, message in report.errors:
+            click.echo(f'Line {line}: {message}', err=True)
+        click.echo(f'Imported {report.logs_imported} log(s) and {report.reflections_imported} '
+                   f'reflection(s) from {report.rows_read} row(s); {report.error_count} error(s).')
+    
+    @app.cli.command('delete-account')
+    @click.option('--username', required=True, help='Account to delete.')
+    @click.option('--chunk-size', type=int, default=5000, show_default=True,
+                  help='Rows per DELETE statement.')
+    @click.confirmation_option(prompt='Delete this account and all of its data?')
+    def delete_account(username, chunk_size):
+        """Delete a user with their logs, reflections and custom rituals, in chunks."""
+        from app.models import User
+        from app.services import account_service
+        
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.ClickException(f'No user named "{username}".')
+        
+        def progress(data):
+            click.echo(f'  {sum(data["deleted"].values())} of {data["total"]} rows deleted', err=True)
+        
+        deleted = account_service.delete_account(user.id, chunk_size=chunk_size,
+                                                 on_progress=progress)
+        click.echo(f'Deleted "{username}" with {deleted["ritual_log_entries"]} log(s), '
+                   f'{deleted["reflections"]} reflection(s) and {deleted["rituals"]} custom ritual(s).')
+    
+    @app.cli.command('cache-stats')
+    def cache_stats():
+        """Show hit/miss counters for the summary result cache."""
+        from app.cache import get_result_cache
+        stats = get_result_cache().stats()
+        click.echo(f'Backend:  {stats["backend"]}')
+        click.echo(f'Entries:  {stats["entries"]}')
+        click.echo(f'Hits:     {stats["hits"]}')
+        click.echo(f'Misses:   {stats["misses"]}')
+        click.echo(f'Hit rate: {stats["hit_rate"]:.1%}')
+    
+    @app.cli.command('cache-clear')
+    def cache_clear():
+        """Drop every entry from the summary result cache."""
+        from app.cache import get_result_cache
+        get_result_cache().clear()
+        click.echo('Result cache cleared.')
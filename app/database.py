@@ -0,0 +1,106 @@
+"""Engine configuration, SQLite connection pragmas and retries on busy errors."""
+import functools
+import os
+import random
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from app import db
+
+# PostgreSQL SQLSTATEs worth retrying: serialization failure, deadlock
+RETRYABLE_PG_CODES = {'40001', '40P01'}
+SQLITE_BUSY_MESSAGES = ('database is locked', 'database is busy')
+
+
+def engine_options(database_uri, env=os.environ):
+    """Build SQLALCHEMY_ENGINE_OPTIONS from environment variables."""
+    options = {
+        'pool_pre_ping': env.get('DB_POOL_PRE_PING', '1').lower() in ('1', 'true', 'yes', 'on'),
+        'pool_recycle': int(env.get('DB_POOL_RECYCLE', 1800)),
+    }
+    if database_uri.startswith('sqlite'):
+        # busy_timeout is set as a pragma on connect; the driver timeout matches it
+        options['connect_args'] = {'timeout': int(env.get('SQLITE_BUSY_TIMEOUT_MS', 5000)) / 1000.0}
+        return options
+
+    options.update({
+        'pool_size': int(env.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(env.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(env.get('DB_POOL_TIMEOUT', 30)),
+    })
+    statement_timeout = env.get('DB_STATEMENT_TIMEOUT_MS')
+    if statement_timeout and database_uri.startswith('postgresql'):
+        options['connect_args'] = {'options': f'-c statement_timeout={int(statement_timeout)}'}
+    return options
+
+
+def _sqlite_pragmas(app):
+    return [
+        f"PRAGMA journal_mode={app.config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous={app.config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout={int(app.config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA mmap_size={int(app.config['SQLITE_MMAP_SIZE'])}",
+    ]
+
+
+def attach_sqlite_pragmas(engine, app):
+    """Run the SQLITE_* pragmas on every new connection of a SQLite engine."""
+    pragmas = _sqlite_pragmas(app)
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def init_engine(app):
+    """Apply SQLite pragmas to every new connection of the app's engine."""
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name == 'sqlite':
+        attach_sqlite_pragmas(engine, app)
+
+
+def dialect_name():
+    """Name of the session's database dialect ('sqlite', 'postgresql', ...)."""
+    return db.session.get_bind().dialect.name
+
+
+def is_busy_error(exc):
+    """True for lock/serialization errors that succeed when simply retried."""
+    if not isinstance(exc, OperationalError):
+        return False
+    pgcode = getattr(exc.orig, 'sqlstate', None) or getattr(exc.orig, 'pgcode', None)
+    if pgcode in RETRYABLE_PG_CODES:
+        return True
+    message = str(exc.orig).lower()
+    return any(text in message for text in SQLITE_BUSY_MESSAGES)
+
+
+def retry_on_busy(func=None, *, attempts=4, backoff=0.05):
+    """Retry a committing service function when the database is busy.
+
+    The session is rolled back before each retry, so the function must
+    redo all of its work (service write functions do: they stage and commit
+    in one call).
+    """
+    if func is None:
+        return functools.partial(retry_on_busy, attempts=attempts, backoff=backoff)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(attempts):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as exc:
+                if attempt == attempts - 1 or not is_busy_error(exc):
+                    raise
+                db.session.rollback()
+                time.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+    return wrapper
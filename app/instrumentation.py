@@ -0,0 +1,148 @@
+"""Per-request SQL instrumentation and query budgets.
+
+SQLAlchemy engine events time every statement; statements run while a request
+is being handled are added to that request's QueryStats on flask.g. After the
+request the stats are logged as one JSON line on the 'app.sql' logger, echoed
+in an X-SQL-Queries header when SQL_DEBUG_HEADER is on, and checked against
+QUERY_BUDGETS.
+"""
+import json
+import logging
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from app import db
+
+logger = logging.getLogger('app.sql')
+
+SLOWEST_KEPT = 3
+STATEMENT_PREVIEW = 200
+
+# Maximum queries per request, by endpoint. Overridden by QUERY_BUDGETS.
+DEFAULT_QUERY_BUDGETS = {
+    'index': 4,
+    'rituals': 10,
+    'my_rituals': 6,
+    'summary': 10,
+    'profile': 6,
+    'search': 8,
+    'api_logs': 6,
+    'api_summary': 8,
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised under TESTING when a request runs more queries than its budget."""
+
+
+class QueryStats:
+    """Query count, total time and slowest statements for one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest = []
+
+    def record(self, statement, elapsed_ms):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        if len(self.slowest) < SLOWEST_KEPT or elapsed_ms > self.slowest[-1][0]:
+            self.slowest.append((elapsed_ms, ' '.join(statement.split())[:STATEMENT_PREVIEW]))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[SLOWEST_KEPT:]
+
+    def to_dict(self):
+        return {
+            'queries': self.count,
+            'sql_ms': round(self.total_ms, 2),
+            'slowest': [{'ms': round(ms, 2), 'statement': sql} for ms, sql in self.slowest],
+        }
+
+
+def parse_budgets(value):
+    """Parse "summary=8,rituals=10" into {'summary': 8, 'rituals': 10}."""
+    budgets = {}
+    for item in (value or '').split(','):
+        endpoint, _, limit = item.partition('=')
+        if endpoint.strip() and limit.strip():
+            budgets[endpoint.strip()] = int(limit)
+    return budgets
+
+
+def current_stats():
+    """QueryStats for the request being handled, or None outside a request."""
+    if has_request_context():
+        return g.get('sql_stats')
+    return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_start'].pop()
+    stats = current_stats()
+    if stats is not None:
+        stats.record(statement, (time.perf_counter() - started) * 1000.0)
+
+
+def attach_listeners(engine):
+    """Time engine's statements into the current request's stats (once per engine)."""
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def _check_budget(app, endpoint, stats):
+    budget = app.config['QUERY_BUDGETS'].get(endpoint)
+    if budget is None or stats.count <= budget:
+        return
+    message = f'{endpoint} ran {stats.count} queries (budget {budget})'
+    if app.testing:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+def init_instrumentation(app):
+    """Attach the engine listeners and request hooks."""
+    if app.config.get('SQL_LOG_REQUESTS'):
+        # 'app.sql' is a child of app.logger, so it shares Flask's handler
+        app.logger
+        logger.setLevel(logging.INFO)
+    
+    budgets = dict(DEFAULT_QUERY_BUDGETS)
+    budgets.update(app.config.get('QUERY_BUDGETS') or {})
+    app.config['QUERY_BUDGETS'] = budgets
+
+    # The async read engine (app/async_db.py) attaches itself when it starts
+    with app.app_context():
+        attach_listeners(db.engine)
+
+    @app.before_request
+    def start_sql_stats():
+        g.sql_stats = QueryStats()
+
+    @app.after_request
+    def finish_sql_stats(response):
+        stats = g.pop('sql_stats', None)
+        endpoint = request.endpoint
+        if stats is None or endpoint in (None, 'static'):
+            return response
+
+        if app.config.get('SQL_DEBUG_HEADER') or app.debug:
+            response.headers['X-SQL-Queries'] = f'count={stats.count}; time_ms={stats.total_ms:.2f}'
+
+        if logger.isEnabledFor(logging.INFO):
+            record = {'endpoint': endpoint, 'method': request.method, 'path': request.path,
+                      'status': response.status_code}
+            record.update(stats.to_dict())
+            logger.info(json.dumps(record))
+
+        # Budgets cover page reads; form posts such as a time zone change
+        # rewrite a user's history and legitimately run more.
+        if request.method in ('GET', 'HEAD'):
+            _check_budget(app, endpoint, stats)
+        return response
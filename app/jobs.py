@@ -0,0 +1,113 @@
+"""Background job handlers (see app/services/job_service.py).
+
+Each handler takes the claimed Job, commits its own work and returns a
+JSON-serializable result, which job_service stores on the job. Files a job
+reads or writes live under the instance folder; their paths go in the
+payload or result under 'path' so prune_finished() can remove them.
+"""
+import os
+import uuid
+
+from flask import current_app
+
+from app.services import job_service
+from app.services.job_service import handler
+
+EXPORT_DIR = 'exports'
+IMPORT_DIR = 'imports'
+
+# Kind -> default priority; interactive downloads jump ahead of maintenance
+PRIORITIES = {
+    'export': 10,
+    'import': 5,
+    'recompute_local_history': 5,
+    'delete_account': 1,
+    'refresh_community_stats': 0,
+}
+
+
+def job_file_path(directory, filename):
+    """Return a path for filename under instance/<directory>, creating the folder."""
+    folder = os.path.join(current_app.instance_path, directory)
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, filename)
+
+
+def save_upload(upload, fmt):
+    """Store an uploaded import file for a worker and return its path."""
+    path = job_file_path(IMPORT_DIR, f'{uuid.uuid4().hex}.{fmt}')
+    upload.save(path)
+    return path
+
+
+@handler('export')
+def export(job):
+    """payload: kind, fmt, start, end (YYYY-MM-DD or None)."""
+    from app.services import export_service
+
+    payload = job.payload
+    kind, fmt = payload['kind'], payload['fmt']
+    start_at, end_before = export_service.parse_date_range(payload.get('start'),
+                                                           payload.get('end'))
+    path = job_file_path(EXPORT_DIR, f'job-{job.id}.{fmt}')
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        for chunk in export_service.generate_export(kind, fmt, job.user_id, start_at, end_before):
+            f.write(chunk)
+    return {
+        'path': path,
+        'filename': export_service.export_filename(kind, fmt),
+        'mimetype': export_service.MIMETYPES[fmt],
+        'bytes': os.path.getsize(path),
+    }
+
+
+@handler('import')
+def import_upload(job):
+    """payload: path (from save_upload), fmt.
+
+    Batches commit as they go, so a retry would import them twice; queue
+    import jobs with max_attempts=1.
+    """
+    from app.services import import_service
+
+    def progress(report):
+        job_service.report_progress(job, rows_read=report.rows_read,
+                                    imported=report.imported, error_count=report.error_count)
+
+    path = job.payload['path']
+    try:
+        with open(path, 'rb') as f:
+            report = import_service.import_file(job.user_id, f, job.payload['fmt'],
+                                                on_progress=progress)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    return report.to_dict()
+
+
+@handler('recompute_local_history')
+def recompute_local_history(job):
+    """Re-date the user's history after a time zone change; rebuilds rollups and streaks."""
+    from app.services import timezone_service
+    return {'updated': timezone_service.recompute_local_history(job.user_id)}
+
+
+@handler('delete_account')
+def delete_account(job):
+    """payload: user_id. The job has no owner, so it outlives the account.
+
+    Deletion is idempotent, so retries after a failure are safe.
+    """
+    from app.services import account_service
+
+    def progress(data):
+        job_service.report_progress(job, **data)
+
+    return account_service.delete_account(job.payload['user_id'], on_progress=progress)
+
+
+@handler('refresh_community_stats')
+def refresh_community_stats(job):
+    """payload: full (bool)."""
+    from app.services import community_service
+    return {'advanced': community_service.refresh_community_stats(full=job.payload.get('full', False))}
@@ -0,0 +1,257 @@
+"""Prometheus-style metrics (/metrics).
+
+Each worker process counts requests, latencies and SQL use in memory; the
+request hooks only take a lock and bump a few numbers. When METRICS_DIR is
+set, a worker writes its totals to METRICS_DIR/worker-<pid>.json at most once
+per METRICS_FLUSH_SECONDS, and /metrics merges every worker's file, so the
+numbers cover all gunicorn workers whichever one answers the scrape.
+"""
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+
+from flask import Response, abort, g, request
+
+from app import db
+
+PREFIX = 'ritual_tracker'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Registry:
+    """This process's request metrics."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.latency = {}
+        self.sql_queries = {}
+        self.sql_seconds = {}
+        self.flushed_at = 0.0
+
+    def observe(self, endpoint, method, status, seconds, sql_stats=None):
+        key = f'{endpoint}|{method}|{status}'
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with self.lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+            histogram = self.latency.get(endpoint)
+            if histogram is None:
+                histogram = self.latency[endpoint] = {
+                    'buckets': [0] * (len(LATENCY_BUCKETS) + 1), 'sum': 0.0, 'count': 0
+                }
+            histogram['buckets'][bucket] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+            if sql_stats is not None:
+                self.sql_queries[endpoint] = self.sql_queries.get(endpoint, 0) + sql_stats.count
+                self.sql_seconds[endpoint] = self.sql_seconds.get(endpoint, 0.0) + sql_stats.total_ms / 1000.0
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'requests': dict(self.requests),
+                'latency': {k: {'buckets': list(v['buckets']), 'sum': v['sum'], 'count': v['count']}
+                            for k, v in self.latency.items()},
+                'sql_queries': dict(self.sql_queries),
+                'sql_seconds': dict(self.sql_seconds),
+            }
+
+
+_registry = _Registry()
+
+
+def _cache_counters(include_shared):
+    """{cache name: [hits, misses]} for this process."""
+    from app.cache import get_result_cache
+    from app.services import auth_service, ritual_service
+
+    counters = {
+        'presets': list(ritual_service.preset_cache_stats()),
+        'user_identity': list(auth_service.identity_cache_stats()),
+    }
+    result_cache = get_result_cache()
+    # A shared backend already counts for every worker; report it only once.
+    if include_shared or not result_cache.backend.shared:
+        stats = result_cache.stats()
+        counters['summary_results'] = [stats['hits'], stats['misses']]
+    return counters
+
+
+def _pool_gauges():
+    pool = db.engine.pool
+    gauges = {}
+    for name in ('size', 'checkedout', 'overflow', 'checkedin'):
+        method = getattr(pool, name, None)
+        if callable(method):
+            gauges[name] = max(0, method()) if name == 'overflow' else method()
+    return gauges
+
+
+def _worker_state(include_shared=False):
+    state = _registry.snapshot()
+    state['pid'] = os.getpid()
+    state['caches'] = _cache_counters(include_shared)
+    state['pool'] = _pool_gauges()
+    return state
+
+
+def _write_state(directory):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'worker-{os.getpid()}.json')
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(_worker_state(), f)
+    os.replace(tmp_path, path)
+
+
+def _maybe_flush(app):
+    directory = app.config.get('METRICS_DIR')
+    if not directory:
+        return
+    now = time.monotonic()
+    if now - _registry.flushed_at < app.config.get('METRICS_FLUSH_SECONDS', 5):
+        return
+    _registry.flushed_at = now
+    try:
+        _write_state(directory)
+    except OSError:
+        app.logger.warning('Could not write metrics to %s', directory, exc_info=True)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _load_states(app):
+    """Every worker's state; this process's is always fresh."""
+    own = _worker_state(include_shared=True)
+    directory = app.config.get('METRICS_DIR')
+    if not directory:
+        return [own]
+    states = [own]
+    for path in glob.glob(os.path.join(directory, 'worker-*.json')):
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if state.get('pid') != own['pid']:
+            states.append(state)
+    return states
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _header(lines, name, kind, help_text):
+    lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+    lines.append(f'# TYPE {PREFIX}_{name} {kind}')
+
+
+def render_metrics(states):
+    """Merge worker states into the Prometheus text exposition format."""
+    requests, latency, sql_queries, sql_seconds, caches = {}, {}, {}, {}, {}
+    for state in states:
+        for key, value in state['requests'].items():
+            requests[key] = requests.get(key, 0) + value
+        for endpoint, histogram in state['latency'].items():
+            merged = latency.setdefault(
+                endpoint, {'buckets': [0] * (len(LATENCY_BUCKETS) + 1), 'sum': 0.0, 'count': 0}
+            )
+            merged['buckets'] = [a + b for a, b in zip(merged['buckets'], histogram['buckets'])]
+            merged['sum'] += histogram['sum']
+            merged['count'] += histogram['count']
+        for endpoint, value in state['sql_queries'].items():
+            sql_queries[endpoint] = sql_queries.get(endpoint, 0) + value
+        for endpoint, value in state['sql_seconds'].items():
+            sql_seconds[endpoint] = sql_seconds.get(endpoint, 0.0) + value
+        for cache, (hits, misses) in state.get('caches', {}).items():
+            totals = caches.setdefault(cache, [0, 0])
+            totals[0] += hits
+            totals[1] += misses
+
+    lines = []
+    _header(lines, 'requests_total', 'counter', 'Requests handled, by endpoint, method and status.')
+    for key in sorted(requests):
+        endpoint, method, status = key.split('|')
+        lines.append(f'{PREFIX}_requests_total{_labels(endpoint=endpoint, method=method, status=status)} '
+                     f'{requests[key]}')
+
+    _header(lines, 'request_duration_seconds', 'histogram', 'Time to produce a response, by endpoint.')
+    for endpoint in sorted(latency):
+        histogram = latency[endpoint]
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), histogram['buckets']):
+            cumulative += count
+            lines.append(f'{PREFIX}_request_duration_seconds_bucket{_labels(endpoint=endpoint, le=bound)} '
+                         f'{cumulative}')
+        lines.append(f'{PREFIX}_request_duration_seconds_sum{_labels(endpoint=endpoint)} {histogram["sum"]:.6f}')
+        lines.append(f'{PREFIX}_request_duration_seconds_count{_labels(endpoint=endpoint)} {histogram["count"]}')
+
+    _header(lines, 'sql_queries_total', 'counter', 'SQL statements run while handling requests.')
+    for endpoint in sorted(sql_queries):
+        lines.append(f'{PREFIX}_sql_queries_total{_labels(endpoint=endpoint)} {sql_queries[endpoint]}')
+    _header(lines, 'sql_seconds_total', 'counter', 'Time spent in SQL while handling requests.')
+    for endpoint in sorted(sql_seconds):
+        lines.append(f'{PREFIX}_sql_seconds_total{_labels(endpoint=endpoint)} {sql_seconds[endpoint]:.6f}')
+
+    _header(lines, 'cache_hits_total', 'counter', 'Cache lookups answered from the cache.')
+    for cache in sorted(caches):
+        lines.append(f'{PREFIX}_cache_hits_total{_labels(cache=cache)} {caches[cache][0]}')
+    _header(lines, 'cache_misses_total', 'counter', 'Cache lookups that had to load or compute.')
+    for cache in sorted(caches):
+        lines.append(f'{PREFIX}_cache_misses_total{_labels(cache=cache)} {caches[cache][1]}')
+
+    # Pool gauges only make sense for workers that are still running
+    live = [state for state in states if _pid_alive(state['pid'])]
+    _header(lines, 'workers', 'gauge', 'Worker processes reporting metrics.')
+    lines.append(f'{PREFIX}_workers {len(live)}')
+    for name, help_text in (('size', 'Configured connection pool size.'),
+                            ('checkedout', 'Connections currently in use.'),
+                            ('overflow', 'Connections opened beyond the pool size.'),
+                            ('checkedin', 'Idle connections in the pool.')):
+        _header(lines, f'db_pool_{name}', 'gauge', help_text)
+        for state in live:
+            if name in state.get('pool', {}):
+                lines.append(f'{PREFIX}_db_pool_{name}{_labels(pid=state["pid"])} {state["pool"][name]}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def init_metrics(app):
+    """Register the request hooks and the /metrics endpoint."""
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop('metrics_started', None)
+        if started is None or request.endpoint == 'static':
+            return response
+        from app.instrumentation import current_stats
+        _registry.observe(request.endpoint or 'unmatched', request.method, response.status_code,
+                          time.perf_counter() - started, current_stats())
+        _maybe_flush(app)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        token = app.config.get('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            abort(401)
+        body = render_metrics(_load_states(app))
+        return Response(body, mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,238 @@
+"""Versioned schema migrations.
+
+db.create_all() creates missing tables but never changes existing ones, so
+anything that alters a deployed schema (new indexes, columns, backfills) is
+registered here as a numbered migration. Each migration runs once, in order,
+and is recorded in the schema_migrations table. Migrations must work on both
+SQLite and PostgreSQL.
+
+Schema objects the models cannot describe (full-text tables, triggers,
+expression indexes) are created by migrations registered with fresh=True,
+which also run on a brand-new database right after create_all().
+"""
+from datetime import date
+
+from sqlalchemy import LargeBinary, bindparam, inspect, text
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+
+MIGRATIONS = []
+
+
+def migration(version, description, fresh=False):
+    """Register a migration function under a version number.
+
+    fresh=True also runs it on a new database, for DDL create_all() cannot emit.
+    """
+    def decorator(func):
+        func.run_on_fresh = fresh
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return decorator
+
+
+def _create_index(model, name):
+    """Create a model's declared index if the database does not have it yet."""
+    index = next(i for i in model.__table__.indexes if i.name == name)
+    index.create(bind=db.session.connection(), checkfirst=True)
+
+
+def _add_column(table, column, ddl):
+    """Add a column to an existing table unless it is already there."""
+    columns = {c['name'] for c in inspect(db.session.connection()).get_columns(table)}
+    if column not in columns:
+        db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+
+
+def _sync_foreign_key_ondelete(model, column):
+    """Recreate a foreign key of an existing table with the model's ON DELETE action.
+
+    PostgreSQL only: SQLite cannot alter constraints (and this app does not
+    turn on its foreign key enforcement), so there the models' DDL only
+    applies to tables created from now on.
+    """
+    connection = db.session.connection()
+    if connection.dialect.name != 'postgresql':
+        return
+    declared = next(iter(model.__table__.c[column].foreign_keys))
+    table = model.__tablename__
+    for fk in inspect(connection).get_foreign_keys(table):
+        if fk['constrained_columns'] != [column]:
+            continue
+        if (fk.get('options', {}).get('ondelete') or '').upper() == declared.ondelete:
+            return
+        referred = f"{fk['referred_table']} ({', '.join(fk['referred_columns'])})"
+        db.session.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT {fk["name"]}'))
+        db.session.execute(text(
+            f'ALTER TABLE {table} ADD CONSTRAINT {fk["name"]} FOREIGN KEY ({column}) '
+            f'REFERENCES {referred} ON DELETE {declared.ondelete}'
+        ))
+
+
+# =============================================================================
+# MIGRATIONS
+# =============================================================================
+
+# Migrations run against the schema of their own time, so backfills use
+# fixed SQL here instead of service code that may read later columns.
+
+# Rollup score column and its virtue; a log earns 1.0 for its ritual's primary
+# category and 0.5 for its secondary one
+_ROLLUP_SCORES = (
+    ('ren_score', 'Ren'),
+    ('yi_score', 'Yi'),
+    ('li_score', 'Li'),
+    ('zhi_score', 'Zhi'),
+)
+
+
+@migration(1, 'Backfill daily rollups from existing ritual logs')
+def _backfill_daily_rollups():
+    # Days are UTC dates of created_at; migration 6 dates logs the same way
+    scores = ', '.join(
+        f"SUM(CASE WHEN r.primary_category = '{virtue}' THEN 1.0 ELSE 0.0 END"
+        f" + CASE WHEN r.secondary_category = '{virtue}' THEN 0.5 ELSE 0.0 END)"
+        for _, virtue in _ROLLUP_SCORES
+    )
+    columns = ', '.join(column for column, _ in _ROLLUP_SCORES)
+    db.session.execute(text('DELETE FROM daily_rollups'))
+    db.session.execute(text(
+        f'INSERT INTO daily_rollups (user_id, day, log_count, {columns}) '
+        f'SELECT e.user_id, date(e.created_at), COUNT(e.id), {scores} '
+        f'FROM ritual_log_entries e LEFT JOIN rituals r ON r.id = e.ritual_id '
+        f'GROUP BY e.user_id, date(e.created_at)'
+    ))
+
+
+@migration(2, 'Add (user_id, created_at) indexes to log and reflection tables')
+def _add_user_created_at_indexes():
+    from app.models import RitualLogEntry, Reflection
+    _create_index(RitualLogEntry, 'ix_ritual_log_entries_user_id_created_at')
+    _create_index(RitualLogEntry, 'ix_ritual_log_entries_ritual_id')
+    _create_index(Reflection, 'ix_reflections_user_id_created_at')
+
+
+@migration(3, 'Add users.session_version')
+def _add_user_session_version():
+    _add_column('users', 'session_version', 'INTEGER NOT NULL DEFAULT 1')
+
+
+@migration(4, 'Add full-text search indexes over log and reflection text', fresh=True)
+def _add_search_indexes():
+    from app.services import search_service
+    search_service.install_search_indexes()
+    search_service.rebuild_search_indexes()
+
+
+@migration(5, 'Backfill per-year activity bitmaps from daily rollups')
+def _backfill_activity_bitmaps():
+    # One bit per day of the year, little-endian, 46 bytes per (user, year) row
+    bitmaps = {}
+    for user_id, day in db.session.execute(text('SELECT user_id, day FROM daily_rollups')):
+        if not isinstance(day, date):
+            day = date.fromisoformat(str(day)[:10])
+        key = (user_id, day.year)
+        bitmaps[key] = bitmaps.get(key, 0) | 1 << (day - date(day.year, 1, 1)).days
+    db.session.execute(text('DELETE FROM activity_bitmaps'))
+    if bitmaps:
+        db.session.execute(
+            text('INSERT INTO activity_bitmaps (user_id, year, days) VALUES (:user_id, :year, :days)')
+            .bindparams(bindparam('days', type_=LargeBinary)),
+            [{'user_id': user_id, 'year': year, 'days': bits.to_bytes(46, 'little')}
+             for (user_id, year), bits in bitmaps.items()]
+        )
+
+
+@migration(6, 'Add users.timezone and local_date columns on logs and reflections')
+def _add_local_dates():
+    from app.models import RitualLogEntry, Reflection
+    from app.services import timezone_service
+    _add_column('users', 'timezone', "VARCHAR(64) NOT NULL DEFAULT 'UTC'")
+    _add_column('ritual_log_entries', 'local_date', 'DATE')
+    _add_column('reflections', 'local_date', 'DATE')
+    _create_index(RitualLogEntry, 'ix_ritual_log_entries_user_id_local_date')
+    _create_index(Reflection, 'ix_reflections_user_id_local_date')
+    # Everyone is on UTC at this point, so the rollup days are unchanged
+    timezone_service.backfill_local_dates()
+
+
+@migration(7, 'Backfill per-ritual usage counters from existing ritual logs')
+def _backfill_ritual_usage():
+    from app.services import usage_service
+    usage_service.rebuild_usage()
+
+
+@migration(8, 'Build community aggregates from existing ritual logs')
+def _build_community_stats():
+    from app.services import community_service
+    community_service.refresh_community_stats(full=True)
+
+
+@migration(9, 'Cascade deletes from users to their rows on PostgreSQL')
+def _cascade_user_deletes():
+    from app.models import (ActivityBitmap, CommunityWeeklyUser, DailyRollup, Job, Reflection,
+                            Ritual, RitualLogEntry, RitualUsage)
+    for model in (Ritual, RitualLogEntry, Reflection, DailyRollup, RitualUsage,
+                  ActivityBitmap, CommunityWeeklyUser, Job):
+        _sync_foreign_key_ondelete(model, 'user_id')
+
+
+# =============================================================================
+# RUNNER
+# =============================================================================
+
+def get_current_version():
+    """Return the highest applied migration version (0 if none)."""
+    from app.models import SchemaMigration
+    return db.session.query(db.func.max(SchemaMigration.version)).scalar() or 0
+
+
+def get_latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def _record(version, description):
+    from app.models import SchemaMigration
+    db.session.add(SchemaMigration(version=version, description=description))
+
+
+def upgrade():
+    """Create missing tables and apply pending migrations.
+
+    A brand-new database gets the current schema from create_all() and is
+    stamped at the latest version, running only the migrations registered
+    with fresh=True. Returns the list of (version, description) pairs applied.
+    """
+    fresh = not inspect(db.engine).has_table('users')
+    db.create_all()
+
+    if fresh:
+        for version, description, func in MIGRATIONS:
+            if func.run_on_fresh:
+                func()
+            _record(version, description)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another process stamped the database first
+            db.session.rollback()
+        return []
+
+    applied = []
+    current = get_current_version()
+    for version, description, func in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            func()
+            _record(version, description)
+            db.session.commit()
+        except IntegrityError:
+            # Another process applied this migration concurrently
+            db.session.rollback()
+            continue
+        applied.append((version, description))
+
+    return applied
@@ -12,15 +12,27 @@ class User(UserMixin, db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    session_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    timezone = db.Column(db.String(64), nullable=False, default='UTC', server_default='UTC')
     
-    ritual_logs = db.relationship('RitualLogEntry', backref='user', lazy=True, cascade='all, delete-orphan')
-    reflections = db.relationship('Reflection', backref='user', lazy=True, cascade='all, delete-orphan')
+    # passive_deletes: deleting a User never loads its history into the session.
+    # Delete accounts with account_service.delete_account, which removes the
+    # rows in chunks (the foreign keys also cascade where the database enforces them).
+    ritual_logs = db.relationship('RitualLogEntry', backref='user', lazy=True,
+                                  cascade='all, delete-orphan', passive_deletes=True)
+    reflections = db.relationship('Reflection', backref='user', lazy=True,
+                                  cascade='all, delete-orphan', passive_deletes=True)
     
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
     
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
+    
+    def get_id(self):
+        # The session version is part of the login id so bumping it
+        # invalidates existing sessions and cached identities.
+        return f'{self.id}:{self.session_version or 1}'
 
 
 class Ritual(db.Model):
@@ -32,11 +44,14 @@ class Ritual(db.Model):
     primary_category = db.Column(db.String(50))
     secondary_category = db.Column(db.String(50), nullable=True)
     source = db.Column(db.String(200))
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    log_entries = db.relationship('RitualLogEntry', backref='ritual', lazy=True)
-    owner = db.relationship('User', backref='custom_rituals', lazy=True)
+    log_entries = db.relationship('RitualLogEntry', back_populates='ritual', lazy=True)
+    # passive_deletes='all': never NULL out user_id on delete, which would turn
+    # the ritual into a preset; the rows are deleted with the account instead.
+    owner = db.relationship('User', backref=db.backref('custom_rituals', passive_deletes='all'),
+                            lazy=True)
     
     @property
     def is_preset(self):
@@ -45,13 +60,22 @@ class Ritual(db.Model):
 
 class RitualLogEntry(db.Model):
     __tablename__ = 'ritual_log_entries'
+    __table_args__ = (
+        db.Index('ix_ritual_log_entries_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_ritual_log_entries_ritual_id', 'ritual_id'),
+        db.Index('ix_ritual_log_entries_user_id_local_date', 'user_id', 'local_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     ritual_id = db.Column(db.Integer, db.ForeignKey('rituals.id'), nullable=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     context = db.Column(db.String(50))
     reflection = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # Calendar date in the user's time zone when the entry was written
+    local_date = db.Column(db.Date)
+    
+    ritual = db.relationship('Ritual', back_populates='log_entries', lazy=True)
     
     @property
     def ritual_name(self):
@@ -60,8 +84,138 @@ class RitualLogEntry(db.Model):
 
 class Reflection(db.Model):
     __tablename__ = 'reflections'
+    __table_args__ = (
+        db.Index('ix_reflections_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_reflections_user_id_local_date', 'user_id', 'local_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     reflection_text = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    local_date = db.Column(db.Date)
+
+
+class DailyRollup(db.Model):
+    """Per-user, per-day log count and virtue score sums, kept in step with RitualLogEntry."""
+    __tablename__ = 'daily_rollups'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    log_count = db.Column(db.Integer, nullable=False, default=0)
+    ren_score = db.Column(db.Float, nullable=False, default=0.0)
+    yi_score = db.Column(db.Float, nullable=False, default=0.0)
+    li_score = db.Column(db.Float, nullable=False, default=0.0)
+    zhi_score = db.Column(db.Float, nullable=False, default=0.0)
+
+
+class RitualUsage(db.Model):
+    """Per-user, per-ritual log count, kept in step with RitualLogEntry.
+
+    A row exists only while the count is positive.
+    """
+    __tablename__ = 'ritual_usage'
+    __table_args__ = (
+        db.Index('ix_ritual_usage_ritual_id', 'ritual_id'),
+    )
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    ritual_id = db.Column(db.Integer, db.ForeignKey('rituals.id'), primary_key=True, autoincrement=False)
+    log_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ActivityBitmap(db.Model):
+    """One bit per day of a year, set when the user logged anything that day."""
+    __tablename__ = 'activity_bitmaps'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    days = db.Column(db.LargeBinary(46), nullable=False)
+
+
+class CommunityWeek(db.Model):
+    """Community-wide log counts for one week (Monday start), by local date."""
+    __tablename__ = 'community_weeks'
+    
+    week_start = db.Column(db.Date, primary_key=True)
+    log_count = db.Column(db.Integer, nullable=False, default=0)
+    ren_count = db.Column(db.Integer, nullable=False, default=0)
+    yi_count = db.Column(db.Integer, nullable=False, default=0)
+    li_count = db.Column(db.Integer, nullable=False, default=0)
+    zhi_count = db.Column(db.Integer, nullable=False, default=0)
+    active_users = db.Column(db.Integer, nullable=False, default=0)
+
+
+class CommunityRitualWeek(db.Model):
+    """Community-wide log count for one preset ritual in one week."""
+    __tablename__ = 'community_ritual_weeks'
+    
+    week_start = db.Column(db.Date, primary_key=True)
+    ritual_id = db.Column(db.Integer, db.ForeignKey('rituals.id'), primary_key=True, autoincrement=False)
+    log_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class CommunityWeeklyUser(db.Model):
+    """One row per user who logged anything in a week, for active-user counts."""
+    __tablename__ = 'community_weekly_users'
+    
+    week_start = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True, autoincrement=False)
+
+
+class AggregateWatermark(db.Model):
+    """Highest source row id already folded into a materialized aggregate."""
+    __tablename__ = 'aggregate_watermarks'
+    
+    name = db.Column(db.String(100), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    refreshed_at = db.Column(db.DateTime)
+
+
+class Job(db.Model):
+    """A unit of background work, run by `flask worker` (see app/services/job_service.py)."""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_status_priority_id', 'status', 'priority', 'id'),
+        # At most one queued or running job per deduplication key
+        db.Index('uq_jobs_active_dedup_key', 'dedup_key', unique=True,
+                 sqlite_where=db.text("status IN ('queued', 'running')"),
+                 postgresql_where=db.text("status IN ('queued', 'running')")),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    priority = db.Column(db.Integer, nullable=False, default=0)
+    dedup_key = db.Column(db.String(200))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True, index=True)
+    payload = db.Column(db.JSON)
+    progress = db.Column(db.JSON)
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_after = db.Column(db.DateTime)
+    worker = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+
+class SchemaMigration(db.Model):
+    """One row per applied schema migration (see app/migrations.py)."""
+    __tablename__ = 'schema_migrations'
+    
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class CacheVersion(db.Model):
+    """Version stamp for a named piece of cached data, shared by all workers."""
+    __tablename__ = 'cache_versions'
+    
+    name = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
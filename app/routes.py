@@ -1,7 +1,14 @@
 """Application routes."""
-from flask import render_template, request, redirect, url_for, flash
+import os
+
+from flask import (render_template, request, redirect, url_for, flash, abort, Response,
+                   send_file, stream_with_context)
 from flask_login import login_required, login_user, logout_user, current_user
-from app.services import ritual_service, log_service, summary_service, reflection_service, auth_service
+from app.async_db import async_reads_enabled
+from app.services import (ritual_service, log_service, reflection_service, auth_service,
+                          account_service, activity_service, async_reads, community_service,
+                          job_service, timezone_service, usage_service)
+from app.services.summary_engine import get_summary
 
 
 def register_routes(app):
@@ -100,15 +107,24 @@ def register_routes(app):
                 user_id=current_user.id,
                 ritual_id=int(ritual_id),
                 context=context,
-                reflection=reflection
+                reflection=reflection,
+                timezone=current_user.timezone
             )
             
             flash('Ritual logged successfully!', 'success')
             return redirect(url_for('rituals'))
         
+        cursor = request.args.get('cursor')
         page = request.args.get('page', 1, type=int)
-        available_rituals = ritual_service.get_available_rituals(current_user.id)
-        pagination = log_service.get_user_ritual_logs_paginated(current_user.id, page=page, per_page=10)
+        if async_reads_enabled():
+            available_rituals, pagination = async_reads.get_rituals_page(
+                current_user.id, cursor=cursor, page=page, per_page=10
+            )
+        else:
+            available_rituals = ritual_service.get_available_rituals(current_user.id)
+            pagination = log_service.get_user_ritual_logs_page(
+                current_user.id, cursor=cursor, page=page, per_page=10
+            )
         
         return render_template('rituals.html', 
                              available_rituals=available_rituals,
@@ -180,9 +196,12 @@ def register_routes(app):
     def my_rituals():
         preset_rituals = ritual_service.get_preset_rituals()
         custom_rituals = ritual_service.get_user_custom_rituals(current_user.id)
+        # Counters instead of ritual.log_entries, which loads every log of each ritual
+        usage_counts = usage_service.get_usage_counts(current_user.id)
         return render_template('my_rituals.html',
                              preset_rituals=preset_rituals,
-                             custom_rituals=custom_rituals)
+                             custom_rituals=custom_rituals,
+                             usage_counts=usage_counts)
     
     @app.route('/my-rituals/create', methods=['GET', 'POST'])
     @login_required
@@ -286,16 +305,14 @@ def register_routes(app):
     @app.route('/summary', methods=['GET', 'POST'])
     @login_required
     def summary():
-        from datetime import timedelta
-        week_start, _ = summary_service.get_week_date_range()
-        
         if request.method == 'POST':
             reflection_text = request.form.get('reflection', '').strip()
             
             if reflection_text:
                 reflection_service.create_reflection(
                     user_id=current_user.id,
-                    reflection_text=reflection_text
+                    reflection_text=reflection_text,
+                    timezone=current_user.timezone
                 )
                 flash('Reflection saved!', 'success')
             else:
@@ -303,33 +320,158 @@ def register_routes(app):
             
             return redirect(url_for('summary'))
         
-        virtue_metrics = summary_service.calculate_virtue_metrics(current_user.id)
-        total_rituals = summary_service.get_total_rituals_this_week(current_user.id)
-        last_week_total = summary_service.get_total_rituals_last_week(current_user.id)
-        week_change = total_rituals - last_week_total
-        days_practiced = summary_service.get_days_practiced_this_week(current_user.id)
-        streak = summary_service.calculate_current_streak(current_user.id)
-        all_time = summary_service.get_all_time_stats(current_user.id)
-        weekly_trend = summary_service.get_weekly_trend(current_user.id)
-        
+        cursor = request.args.get('cursor')
         page = request.args.get('page', 1, type=int)
-        reflection_pagination = reflection_service.get_user_reflections_paginated(
-            current_user.id, page=page, per_page=10
-        )
+        if async_reads_enabled():
+            # Summary stats and the reflection page are fetched concurrently
+            result, reflection_pagination = async_reads.get_summary_page(
+                current_user.id, current_user.created_at, cursor=cursor, page=page, per_page=10,
+                timezone=current_user.timezone
+            )
+        else:
+            result = get_summary(current_user.id, joined_at=current_user.created_at,
+                                 timezone=current_user.timezone)
+            reflection_pagination = reflection_service.get_user_reflections_page(
+                current_user.id, cursor=cursor, page=page, per_page=10
+            )
+        
+        # Community numbers come from the materialized aggregates, never the log table
+        community = community_service.get_community_stats(result.week_start)
         
         return render_template('summary.html',
-                             virtue_metrics=virtue_metrics,
-                             total_rituals=total_rituals,
-                             week_change=week_change,
-                             days_practiced=days_practiced,
-                             streak=streak,
-                             week_start=week_start,
-                             timedelta=timedelta,
-                             all_time=all_time,
-                             weekly_trend=weekly_trend,
+                             summary=result,
+                             community=community,
                              reflections=reflection_pagination.items,
                              reflection_pagination=reflection_pagination)
     
+    # =========================================================================
+    # SEARCH
+    # =========================================================================
+    
+    @app.route('/search')
+    @login_required
+    def search():
+        from app.services import search_service
+        from app.services.rollup_service import VIRTUE_COLUMNS
+        
+        try:
+            filters = search_service.parse_search_args(request.args)
+        except ValueError:
+            flash('Dates must be in YYYY-MM-DD format.', 'error')
+            return redirect(url_for('search'))
+        
+        results = search_service.search(
+            current_user.id, cursor=request.args.get('cursor'), per_page=20, **filters
+        )
+        next_url = None
+        if results.has_next:
+            next_url = url_for('search', **dict(request.args.to_dict(), cursor=results.next_cursor))
+        available_rituals = ritual_service.get_available_rituals(current_user.id)
+        return render_template('search.html',
+                             filters=filters,
+                             results=results,
+                             next_url=next_url,
+                             available_rituals=available_rituals,
+                             virtues=list(VIRTUE_COLUMNS))
+    
+    # =========================================================================
+    # IMPORT
+    # =========================================================================
+    
+    @app.route('/import', methods=['GET', 'POST'])
+    @login_required
+    def import_data():
+        # Imported lazily: bulk import/export are rarely used, so workers
+        # don't pay for these modules at startup.
+        from app.services import import_service
+        report = None
+        
+        if request.method == 'POST':
+            upload = request.files.get('file')
+            
+            if not upload or not upload.filename:
+                flash('Please choose a file to import.', 'error')
+                return redirect(url_for('import_data'))
+            
+            try:
+                fmt = import_service.detect_format(upload.filename)
+            except import_service.ImportFormatError as e:
+                flash(str(e), 'error')
+                return redirect(url_for('import_data'))
+            
+            if job_service.queue_enabled():
+                from app.jobs import PRIORITIES, save_upload
+                # Retrying would import the committed batches again, so one attempt only
+                job = job_service.enqueue('import', {'path': save_upload(upload, fmt), 'fmt': fmt},
+                                          user_id=current_user.id, priority=PRIORITIES['import'],
+                                          max_attempts=1)
+                return redirect(url_for('job_status', job_id=job.id))
+            
+            report = import_service.import_file(current_user.id, upload.stream, fmt)
+            flash(f'Imported {report.imported} of {report.rows_read} row(s).',
+                  'success' if not report.error_count else 'warning')
+        
+        available_rituals = ritual_service.get_available_rituals(current_user.id)
+        return render_template('import.html', report=report, available_rituals=available_rituals)
+    
+    # =========================================================================
+    # EXPORT
+    # =========================================================================
+    
+    @app.route('/export/<kind>.<fmt>', methods=['GET', 'POST'])
+    @login_required
+    def export_data(kind, fmt):
+        from app.services import export_service
+        if kind not in export_service.KINDS or fmt not in export_service.FORMATS:
+            abort(404)
+        
+        args = request.form if request.method == 'POST' else request.args
+        start, end = args.get('start') or None, args.get('end') or None
+        try:
+            start_at, end_before = export_service.parse_date_range(start, end)
+        except ValueError:
+            abort(400, 'Dates must be in YYYY-MM-DD format.')
+        
+        # POST builds the file in the background; the job page offers the download
+        if request.method == 'POST' and job_service.queue_enabled():
+            from app.jobs import PRIORITIES
+            job = job_service.enqueue(
+                'export', {'kind': kind, 'fmt': fmt, 'start': start, 'end': end},
+                user_id=current_user.id, priority=PRIORITIES['export'],
+                dedup_key=f'export:{current_user.id}:{kind}.{fmt}:{start}:{end}'
+            )
+            return redirect(url_for('job_status', job_id=job.id))
+        
+        chunks = export_service.generate_export(kind, fmt, current_user.id, start_at, end_before)
+        filename = export_service.export_filename(kind, fmt)
+        return Response(
+            stream_with_context(chunks),
+            mimetype=export_service.MIMETYPES[fmt],
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+    
+    # =========================================================================
+    # BACKGROUND JOBS
+    # =========================================================================
+    
+    @app.route('/jobs/<int:job_id>')
+    @login_required
+    def job_status(job_id):
+        job = job_service.get_job(job_id, user_id=current_user.id)
+        if job is None:
+            abort(404)
+        return render_template('job.html', job=job, finished=job.status in job_service.FINISHED_STATUSES)
+    
+    @app.route('/jobs/<int:job_id>/download')
+    @login_required
+    def job_download(job_id):
+        job = job_service.get_job(job_id, user_id=current_user.id)
+        if job is None or job.kind != 'export' or job.status != job_service.SUCCEEDED \
+                or not os.path.exists(job.result['path']):
+            abort(404)
+        return send_file(job.result['path'], mimetype=job.result['mimetype'],
+                         as_attachment=True, download_name=job.result['filename'])
+    
     # =========================================================================
     # USER PROFILE
     # =========================================================================
@@ -341,28 +483,76 @@ def register_routes(app):
             action = request.form.get('action')
             
             if action == 'change_password':
-                current_password = request.form.get('current_password', '')
-                new_password = request.form.get('new_password', '')
-                confirm_password = request.form.get('confirm_password', '')
+                user, error_msg = auth_service.change_password(
+                    current_user.id,
+                    request.form.get('current_password', ''),
+                    request.form.get('new_password', ''),
+                    request.form.get('confirm_password', '')
+                )
                 
-                if not current_user.check_password(current_password):
-                    flash('Current password is incorrect.', 'error')
+                if error_msg:
+                    flash(error_msg, 'error')
                     return redirect(url_for('profile'))
                 
-                if len(new_password) < 6:
-                    flash('New password must be at least 6 characters long.', 'error')
-                    return redirect(url_for('profile'))
+                # Re-issue the login with the new session version so this
+                # browser stays signed in while older sessions are dropped.
+                remember_cookie = app.config.get('REMEMBER_COOKIE_NAME', 'remember_token')
+                login_user(user, remember=remember_cookie in request.cookies)
                 
-                if new_password != confirm_password:
-                    flash('New passwords do not match.', 'error')
+                flash('Password changed successfully!', 'success')
+                return redirect(url_for('profile'))
+            
+            if action == 'set_timezone':
+                tz_name = request.form.get('timezone', '')
+                in_background = job_service.queue_enabled() and tz_name != current_user.timezone
+                try:
+                    timezone_service.set_user_timezone(current_user.id, tz_name,
+                                                       recompute=not in_background)
+                except ValueError as e:
+                    flash(str(e), 'error')
                     return redirect(url_for('profile'))
                 
-                current_user.set_password(new_password)
-                from app import db
-                db.session.commit()
-                
-                flash('Password changed successfully!', 'success')
+                if in_background:
+                    from app.jobs import PRIORITIES
+                    job_service.enqueue('recompute_local_history', user_id=current_user.id,
+                                        priority=PRIORITIES['recompute_local_history'],
+                                        dedup_key=f'local-history:{current_user.id}:{tz_name}')
+                    flash('Time zone updated. Your history is being re-dated in the background.',
+                          'success')
+                else:
+                    flash('Time zone updated.', 'success')
                 return redirect(url_for('profile'))
+            
+            if action == 'delete_account':
+                user, error_msg = account_service.close_account(
+                    current_user.id, request.form.get('password', '')
+                )
+                if error_msg:
+                    flash(error_msg, 'error')
+                    return redirect(url_for('profile'))
+                
+                # The account is locked now; its rows are deleted after logout
+                user_id = current_user.id
+                logout_user()
+                if job_service.queue_enabled():
+                    from app.jobs import PRIORITIES
+                    job_service.enqueue('delete_account', {'user_id': user_id},
+                                        priority=PRIORITIES['delete_account'],
+                                        dedup_key=f'delete-account:{user_id}')
+                    flash('Your account is closed. Its data is being deleted in the background.',
+                          'info')
+                else:
+                    account_service.delete_account(user_id)
+                    flash('Your account and all of its data have been deleted.', 'success')
+                return redirect(url_for('index'))
+        
+        # Shares the cached summary, so the streak is free after a /summary view
+        result = get_summary(current_user.id, joined_at=current_user.created_at,
+                             timezone=current_user.timezone)
+        stats = {'streak': result.streak}
         
-        stats = {'streak': summary_service.calculate_current_streak(current_user.id)}
-        return render_template('profile.html', stats=stats)
+        year = timezone_service.local_today(current_user.timezone).year
+        heatmap = activity_service.heatmap_weeks(activity_service.get_activity(current_user.id), year)
+        return render_template('profile.html', stats=stats, heatmap=heatmap, heatmap_year=year,
+                             timezones=timezone_service.timezone_choices(),
+                             background_jobs=job_service.queue_enabled())
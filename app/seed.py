@@ -0,0 +1,66 @@
+"""Seed data: the shared preset rituals."""
+from app import db
+from app.models import Ritual
+
+# (name, description, primary virtue, secondary virtue, source)
+PRESET_RITUALS = [
+    (
+        'Morning Filial Check-In',
+        'Each morning, intentionally check in with a parent or elder about their day, listening with full attention rather than multitasking.',
+        'Ren', 'Li', 'Analects 1.6; 2.7'
+    ),
+    (
+        'Respectful Greeting to Elders or Teachers',
+        'When meeting an elder or teacher, stand if seated, offer a deliberate greeting, and give undivided attention for the first moments of interaction.',
+        'Li', 'Ren', 'Analects 1.6; 10.3-10.5'
+    ),
+    (
+        'Three-Breath Speech Pause',
+        'Before responding in a charged moment, pause for three breaths to sense the standpoint of other people and choose words that are respectful and precise.',
+        'Zhi', 'Yi', 'Analects 1.4; 4.24'
+    ),
+    (
+        'Daily Three-Point Self-Examination',
+        'At the end of the day, review whether you were trustworthy, followed through on what you advised, and practiced what you are learning.',
+        'Zhi', 'Yi', 'Analects 1.4 (Zengzi\'s three examinations)'
+    ),
+    (
+        'Study-and-Practice Mini Session',
+        'Study a brief passage or idea and then design one small concrete action to practice it before the day ends.',
+        'Zhi', 'Li', 'Analects 1.1'
+    ),
+    (
+        'Small Daily Act of Ren',
+        'Seek out one concrete act of kindness—especially where you would normally stay on autopilot—and carry it through to completion.',
+        'Ren', 'Zhi', 'Analects 4.3; 12.22'
+    ),
+    (
+        'Conquer-the-Self Pause',
+        'When anger or resentment surges, notice the familiar pattern, suspend your first impulse, and submit to a chosen ritual response instead.',
+        'Yi', 'Li', 'Analects 12.1 ("conquer the self and submit to ritual")'
+    ),
+    (
+        'Courteous Greeting Ritual',
+        'In everyday greetings, pay attention to posture, tone, and eye contact, treating even brief encounters as mini-rituals of respect.',
+        'Li', 'Ren', 'Analects 10.1-10.9'
+    ),
+]
+
+
+def seed_preset_rituals():
+    """Add the preset rituals if there are none yet. Returns how many were added."""
+    from app.services import ritual_service
+    
+    if Ritual.query.filter_by(user_id=None).count() > 0:
+        return 0
+    
+    for name, desc, primary, secondary, source in PRESET_RITUALS:
+        db.session.add(Ritual(
+            name=name, description=desc,
+            primary_category=primary, secondary_category=secondary,
+            source=source, user_id=None
+        ))
+    
+    ritual_service.invalidate_preset_cache()
+    db.session.commit()
+    return len(PRESET_RITUALS)
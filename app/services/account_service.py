@@ -0,0 +1,119 @@
+"""Closing and deleting user accounts.
+
+Deleting a User through the ORM would load every log and reflection into
+the session and issue one DELETE per row. delete_account() removes a user's
+rows with set-based DELETE statements instead:
+- logs, reflections and custom rituals go in chunks of DELETE_CHUNK rows,
+  with a commit after each chunk, so no lock is held for long and memory
+  stays flat;
+- the small derived tables each go with a single statement;
+- the users row goes last.
+
+Where the database enforces foreign keys (PostgreSQL), the derived per-user
+tables are left to ON DELETE CASCADE on that final DELETE.
+
+The account is locked first (no usable password, every session ended), so
+nothing new is written while the rows go away. Every step is idempotent:
+a deletion that stops halfway, e.g. a background job whose worker died, can
+simply run again.
+"""
+from sqlalchemy import delete, func
+
+from app import db
+from app.database import retry_on_busy
+from app.models import (ActivityBitmap, CommunityWeeklyUser, DailyRollup, Reflection, Ritual,
+                        RitualLogEntry, RitualUsage, User)
+from app.services import auth_service, job_service, version_service
+
+DELETE_CHUNK = 5000
+# Not a valid werkzeug hash, so no password ever matches it
+LOCKED_PASSWORD_HASH = '!'
+
+# Deleted in chunks, in this order: logs reference rituals
+CHUNKED_MODELS = (RitualLogEntry, Reflection, Ritual)
+# Per-user tables the foreign keys cascade to on PostgreSQL
+CASCADED_MODELS = (DailyRollup, ActivityBitmap, CommunityWeeklyUser)
+
+
+def _lock(user):
+    if user.password_hash != LOCKED_PASSWORD_HASH:
+        user.password_hash = LOCKED_PASSWORD_HASH
+        user.session_version = (user.session_version or 1) + 1
+        # Drops the user's cached summaries and signed-in identity in every worker
+        version_service.bump_user_data_version(user.id)
+        auth_service.invalidate_user(user.id)
+    db.session.commit()
+
+
+@retry_on_busy
+def close_account(user_id, password):
+    """Check the password and lock the account ahead of deletion. Returns (user, error_message)."""
+    user = db.session.get(User, user_id)
+    if user is None or not user.check_password(password):
+        return None, 'Password is incorrect.'
+    _lock(user)
+    return user, None
+
+
+def _cascades(dialect):
+    # SQLite only enforces foreign keys with PRAGMA foreign_keys=ON, which this app leaves off
+    return dialect == 'postgresql'
+
+
+@retry_on_busy
+def _delete_chunk(model, user_id, chunk_size):
+    table = model.__table__
+    ids = db.select(table.c.id).where(table.c.user_id == user_id).limit(chunk_size)
+    deleted = db.session.execute(delete(table).where(table.c.id.in_(ids))).rowcount
+    db.session.commit()
+    return deleted
+
+
+def count_account_rows(user_id):
+    """Return {table name: rows} for the tables delete_account() clears in chunks."""
+    return {
+        model.__tablename__: db.session.query(func.count(model.id))
+        .filter(model.user_id == user_id).scalar()
+        for model in CHUNKED_MODELS
+    }
+
+
+def delete_account(user_id, chunk_size=DELETE_CHUNK, on_progress=None):
+    """Delete a user and all of their data. Returns {table name: rows deleted}.
+
+    on_progress, if given, is called after every chunk with
+    {'deleted': {table: rows so far}, 'total': rows to delete}.
+    A user that no longer exists is a no-op.
+    """
+    user = db.session.get(User, user_id)
+    if user is None:
+        return {}
+    _lock(user)
+    total = sum(count_account_rows(user_id).values())
+    deleted = {model.__tablename__: 0 for model in CHUNKED_MODELS}
+
+    # Queued jobs (and export files) go now, so no import lands mid-deletion
+    job_service.delete_user_jobs(user_id)
+    # Usage counters reference the custom rituals deleted below
+    db.session.execute(delete(RitualUsage.__table__).where(RitualUsage.user_id == user_id))
+    db.session.commit()
+
+    for model in CHUNKED_MODELS:
+        name = model.__tablename__
+        while True:
+            count = _delete_chunk(model, user_id, chunk_size)
+            deleted[name] += count
+            if on_progress:
+                on_progress({'deleted': dict(deleted), 'total': total})
+            if count < chunk_size:
+                break
+
+    if not _cascades(db.session.get_bind().dialect.name):
+        for model in CASCADED_MODELS:
+            db.session.execute(delete(model.__table__).where(model.user_id == user_id))
+    # The user's cache_versions rows stay: if the id is ever reused, its
+    # versions keep counting up and cannot match a stale cached summary or
+    # identity. _lock() already invalidated the identity in every worker.
+    db.session.execute(delete(User.__table__).where(User.id == user_id))
+    db.session.commit()
+    return deleted
@@ -0,0 +1,229 @@
+"""Per-user, per-year day-activity bitmaps.
+
+Bit n of a user's bitmap for a year is set when they logged anything on day
+n of that year (0 = 1 January); 366 bits fit in 46 bytes. The bits are kept
+in step with the daily rollups: rollup_service.adjust_day sets a bit when a
+day row is created and clears it when the row is deleted. The helpers here
+only stage changes; the calling service commits.
+
+A user's years are combined into one Python integer (ActivitySet), so
+streaks, weekly counts and heatmaps are shifts, masks and popcounts over a
+few machine words per year instead of per-day queries or loops.
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import insert, update, delete
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import ActivityBitmap, DailyRollup
+from app.services import timezone_service
+
+BITMAP_BYTES = 46
+
+
+def _year_start(year):
+    return date(year, 1, 1)
+
+
+def _days_in_year(year):
+    return (_year_start(year + 1) - _year_start(year)).days
+
+
+def _popcount(bits):
+    return bin(bits).count('1')
+
+
+def _mask(width):
+    return (1 << width) - 1 if width > 0 else 0
+
+
+def _to_bytes(bits):
+    return bits.to_bytes(BITMAP_BYTES, 'little')
+
+
+def _from_bytes(raw):
+    return int.from_bytes(raw or b'', 'little')
+
+
+class ActivitySet:
+    """A user's active days as one integer; bit k stands for base + k days."""
+
+    def __init__(self, bits=0, base=None):
+        self.bits = bits
+        self.base = base
+
+    @classmethod
+    def from_bitmaps(cls, rows):
+        """Build from (year, bitmap bytes) rows."""
+        rows = sorted(rows)
+        if not rows:
+            return cls()
+        base = _year_start(rows[0][0])
+        bits = 0
+        for year, raw in rows:
+            bits |= _from_bytes(raw) << (_year_start(year) - base).days
+        return cls(bits, base)
+
+    @classmethod
+    def from_days(cls, days):
+        """Build from an iterable of active dates."""
+        days = list(days)
+        if not days:
+            return cls()
+        base = _year_start(min(days).year)
+        bits = 0
+        for day in days:
+            bits |= 1 << (day - base).days
+        return cls(bits, base)
+
+    def _index(self, day):
+        return (day - self.base).days
+
+    def is_active(self, day):
+        if self.base is None or day < self.base:
+            return False
+        return bool(self.bits >> self._index(day) & 1)
+
+    def count_between(self, start, end):
+        """Number of active days in the inclusive range [start, end]."""
+        if self.base is None or end < self.base:
+            return 0
+        first = max(self._index(start), 0)
+        last = self._index(end)
+        return _popcount(self.bits >> first & _mask(last - first + 1))
+
+    def current_streak(self, today):
+        """Consecutive active days ending today, or yesterday if today has no log yet."""
+        if self.base is None or today < self.base:
+            return 0
+        top = self._index(today)
+        if not self.bits >> top & 1:
+            top -= 1
+        if top < 0 or not self.bits >> top & 1:
+            return 0
+        # The highest clear bit at or below top ends the run
+        gaps = ~self.bits & _mask(top + 1)
+        return top + 1 - gaps.bit_length()
+
+    def longest_streak(self):
+        """Length of the longest run of consecutive active days."""
+        # Each step keeps only bits that still have an active day before them,
+        # so a run of n days survives exactly n steps.
+        bits = self.bits
+        longest = 0
+        while bits:
+            bits &= bits >> 1
+            longest += 1
+        return longest
+
+    def year_bits(self, year):
+        """The bits for one calendar year, bit 0 = 1 January."""
+        if self.base is None or year < self.base.year:
+            return 0
+        offset = (_year_start(year) - self.base).days
+        return self.bits >> offset & _mask(_days_in_year(year))
+
+
+def get_activity(user_id):
+    """Load all of a user's bitmaps as one ActivitySet (a single query)."""
+    rows = db.session.query(ActivityBitmap.year, ActivityBitmap.days)\
+        .filter(ActivityBitmap.user_id == user_id).all()
+    return ActivitySet.from_bitmaps(rows)
+
+
+def mark_day(user_id, day, active):
+    """Stage setting (or clearing) the bit for one day. The caller commits."""
+    table = ActivityBitmap.__table__
+    where = (table.c.user_id == user_id, table.c.year == day.year)
+    bit = 1 << (day - _year_start(day.year)).days
+
+    # FOR UPDATE keeps concurrent writers on PostgreSQL from losing each
+    # other's bits; SQLite already holds the write lock from the rollup update.
+    raw = db.session.execute(
+        db.select(table.c.days).where(*where).with_for_update()
+    ).scalar()
+    if raw is not None:
+        bits = _from_bytes(raw)
+        new_bits = bits | bit if active else bits & ~bit
+        if new_bits != bits:
+            db.session.execute(update(table).where(*where).values(days=_to_bytes(new_bits)))
+        return
+    if not active:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(table).values(
+                user_id=user_id, year=day.year, days=_to_bytes(bit)
+            ))
+    except IntegrityError:
+        # Another worker created this year's row first; retry as an update
+        mark_day(user_id, day, active)
+
+
+def rebuild_bitmaps(user_id=None):
+    """Stage regenerating bitmaps from the daily rollups. Returns rows written."""
+    delete_stmt = delete(ActivityBitmap)
+    query = db.session.query(DailyRollup.user_id, DailyRollup.day)
+    if user_id is not None:
+        delete_stmt = delete_stmt.where(ActivityBitmap.user_id == user_id)
+        query = query.filter(DailyRollup.user_id == user_id)
+    db.session.execute(delete_stmt)
+
+    bitmaps = {}
+    for row_user_id, day in query.yield_per(5000):
+        key = (row_user_id, day.year)
+        bitmaps[key] = bitmaps.get(key, 0) | 1 << (day - _year_start(day.year)).days
+
+    rows = [
+        {'user_id': row_user_id, 'year': year, 'days': _to_bytes(bits)}
+        for (row_user_id, year), bits in bitmaps.items()
+    ]
+    if rows:
+        db.session.execute(insert(ActivityBitmap), rows)
+    return len(rows)
+
+
+def get_heatmap(user_id, first_year, last_year, today=None):
+    """Per-year activity for a GitHub-style heatmap, oldest year first.
+
+    Each year has its bitmap as hex (little-endian, bit 0 = 1 January), its
+    active-day count and longest streak; current and longest streaks cover
+    the whole history. today defaults to today in the user's time zone.
+    """
+    today = today or timezone_service.local_today(timezone_service.get_user_timezone(user_id))
+    activity = get_activity(user_id)
+    years = []
+    for year in range(first_year, last_year + 1):
+        bits = activity.year_bits(year)
+        years.append({
+            'year': year,
+            'day_count': _days_in_year(year),
+            'active_days': _popcount(bits),
+            'longest_streak': ActivitySet(bits, _year_start(year)).longest_streak(),
+            'bitmap': _to_bytes(bits).hex(),
+        })
+    return {
+        'current_streak': activity.current_streak(today),
+        'longest_streak': activity.longest_streak(),
+        'years': years,
+    }
+
+
+def heatmap_weeks(activity, year):
+    """Lay one year out as Monday-first weeks of (date, active) cells.
+
+    Cells before 1 January or after 31 December are None, so every week has
+    seven entries and the grid lines up like a calendar.
+    """
+    first = _year_start(year)
+    last = _year_start(year + 1) - timedelta(days=1)
+    day = first - timedelta(days=first.weekday())
+    weeks = []
+    while day <= last:
+        week = []
+        for _ in range(7):
+            week.append((day, activity.is_active(day)) if first <= day <= last else None)
+            day += timedelta(days=1)
+        weeks.append(week)
+    return weeks
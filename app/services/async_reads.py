@@ -0,0 +1,143 @@
+"""Async read path for the summary, ritual log and JSON listing views.
+
+Used instead of the sync services when ASYNC_READS is on. Each public
+function here is called from the request thread and returns the same objects
+as its sync counterpart; the queries it needs run concurrently on the async
+engine (see app.async_db). Result caching and the preset catalog stay in the
+request thread.
+"""
+import asyncio
+
+from app import db
+from app.async_db import get_async_reader
+from app.cache import get_result_cache
+from app.models import Reflection, Ritual, RitualLogEntry
+from app.services import ritual_service, timezone_service, version_service
+from app.services.log_service import WITH_RITUAL
+from app.services.pagination import build_page, keyset_plan
+from app.services.summary_engine import SummaryEngine, summary_cache_key
+
+
+async def _page(session, stmt, model, cursor, page, per_page):
+    criterion, order_by, offset, direction = keyset_plan(model, cursor, page, per_page)
+    if criterion is not None:
+        stmt = stmt.where(criterion)
+    stmt = stmt.order_by(*order_by).offset(offset or None).limit(per_page + 1)
+    rows = (await session.execute(stmt)).scalars().all()
+    return build_page(list(rows), per_page, offset, direction)
+
+
+async def _rows(session, stmt):
+    return (await session.execute(stmt)).all()
+
+
+async def _first(session, stmt):
+    return (await session.execute(stmt)).first()
+
+
+async def _scalar(session, stmt):
+    return (await session.execute(stmt)).scalar()
+
+
+async def _scalars(session, stmt):
+    return (await session.execute(stmt)).scalars().all()
+
+
+def _logs_statement(user_id):
+    return db.select(RitualLogEntry).options(WITH_RITUAL).where(RitualLogEntry.user_id == user_id)
+
+
+def _reflections_statement(user_id):
+    return db.select(Reflection).where(Reflection.user_id == user_id)
+
+
+def _custom_rituals_statement(user_id):
+    return db.select(Ritual).where(Ritual.user_id == user_id).order_by(Ritual.name)
+
+
+def _version_names(user_id):
+    return version_service.user_data_key(user_id), ritual_service.PRESET_CACHE_VERSION
+
+
+def _gather(*awaitables):
+    async def gather():
+        return await asyncio.gather(*awaitables)
+    return get_async_reader().run(gather())
+
+
+def _summary(user_id, joined_at, timezone, versions):
+    """Cached SummaryResult; on a miss its three queries run concurrently."""
+    reader = get_async_reader()
+    today = timezone_service.local_today(timezone)
+
+    def compute():
+        day_rows, most_practiced_row, total_reflections = _gather(
+            reader.read(_rows, SummaryEngine.days_statement(user_id)),
+            reader.read(_first, SummaryEngine.most_practiced_statement(user_id)),
+            reader.read(_scalar, SummaryEngine.reflection_count_statement(user_id)),
+        )
+        return SummaryEngine(
+            user_id, today=today, joined_at=joined_at, day_rows=day_rows,
+            most_practiced_row=most_practiced_row, total_reflections=total_reflections,
+            timezone=timezone or timezone_service.DEFAULT_TIMEZONE
+        ).compute()
+
+    return get_result_cache().get_or_compute(summary_cache_key(user_id, today, versions), compute)
+
+
+def get_summary(user_id, joined_at, timezone=None):
+    """Async-path equivalent of summary_engine.get_summary.
+
+    timezone is the user's zone name (current_user.timezone); it is not
+    looked up here so the read stays a single round of queries.
+    """
+    reader = get_async_reader()
+    names = _version_names(user_id)
+    (rows,) = _gather(reader.read(_rows, version_service.versions_statement(*names)))
+    return _summary(user_id, joined_at, timezone,
+                    version_service.versions_from_rows(names, rows))
+
+
+def get_summary_page(user_id, joined_at, cursor=None, page=None, per_page=10, timezone=None):
+    """Return (SummaryResult, reflections KeysetPage) for the summary view."""
+    reader = get_async_reader()
+    names = _version_names(user_id)
+    version_rows, reflections = _gather(
+        reader.read(_rows, version_service.versions_statement(*names)),
+        reader.read(_page, _reflections_statement(user_id), Reflection, cursor, page, per_page),
+    )
+    result = _summary(user_id, joined_at, timezone,
+                      version_service.versions_from_rows(names, version_rows))
+    return result, reflections
+
+
+def get_rituals_page(user_id, cursor=None, page=None, per_page=10):
+    """Return (available rituals, log KeysetPage) for the rituals view."""
+    reader = get_async_reader()
+    custom, logs = _gather(
+        reader.read(_scalars, _custom_rituals_statement(user_id)),
+        reader.read(_page, _logs_statement(user_id), RitualLogEntry, cursor, page, per_page),
+    )
+    return ritual_service.get_preset_rituals() + list(custom), logs
+
+
+def get_available_rituals(user_id):
+    reader = get_async_reader()
+    (custom,) = _gather(reader.read(_scalars, _custom_rituals_statement(user_id)))
+    return ritual_service.get_preset_rituals() + list(custom)
+
+
+def get_user_ritual_logs_page(user_id, cursor=None, page=None, per_page=10):
+    reader = get_async_reader()
+    (logs,) = _gather(
+        reader.read(_page, _logs_statement(user_id), RitualLogEntry, cursor, page, per_page)
+    )
+    return logs
+
+
+def get_user_reflections_page(user_id, cursor=None, page=None, per_page=10):
+    reader = get_async_reader()
+    (reflections,) = _gather(
+        reader.read(_page, _reflections_statement(user_id), Reflection, cursor, page, per_page)
+    )
+    return reflections
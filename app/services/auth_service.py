@@ -1,6 +1,103 @@
 """Authentication service."""
+import time
+
+from flask import current_app
+from flask_login import UserMixin
 from app import db
-from app.models import User
+from app.database import retry_on_busy
+from app.cache import TTLCache
+from app.models import CacheVersion, User
+from app.services import version_service
+
+# Lightweight identities for Flask-Login, keyed by (user_id, session_version).
+# Sized and timed by USER_CACHE_SIZE / USER_CACHE_TTL_SECONDS on first use.
+# Each entry remembers the user's shared identity version, re-read at most
+# once per USER_CACHE_CHECK_SECONDS, so a password change, time zone change
+# or account deletion in one worker reaches the others within that interval
+# while most hits run no query at all.
+_identity_cache = None
+
+
+class UserIdentity(UserMixin):
+    """Detached, read-only stand-in for User used as current_user."""
+    
+    def __init__(self, id, username, created_at, session_version, timezone='UTC', stamp=0):
+        self.id = id
+        self.username = username
+        self.created_at = created_at
+        self.session_version = session_version
+        self.timezone = timezone
+        self.stamp = stamp
+        self.checked_at = time.monotonic()
+    
+    def get_id(self):
+        return f'{self.id}:{self.session_version}'
+
+
+def _get_identity_cache():
+    global _identity_cache
+    if _identity_cache is None:
+        _identity_cache = TTLCache(
+            maxsize=current_app.config.get('USER_CACHE_SIZE', 1024),
+            ttl=current_app.config.get('USER_CACHE_TTL_SECONDS', 60)
+        )
+    return _identity_cache
+
+
+def load_user_identity(session_id):
+    """Resolve a Flask-Login session id ("<id>:<session_version>") to a UserIdentity.
+    
+    Returns None if the user no longer exists or the session version is stale.
+    Ids without a version (sessions created before versioning) count as version 1.
+    """
+    user_id, _, version = str(session_id).partition(':')
+    try:
+        user_id = int(user_id)
+        version = int(version) if version else 1
+    except ValueError:
+        return None
+    
+    cache = _get_identity_cache()
+    identity = cache.get((user_id, version))
+    if identity is not None:
+        interval = current_app.config.get('USER_CACHE_CHECK_SECONDS', 5)
+        now = time.monotonic()
+        if now - identity.checked_at < interval:
+            return identity
+        if version_service.get_version(version_service.identity_key(user_id)) == identity.stamp:
+            identity.checked_at = now
+            return identity
+    
+    # The stamp comes with the row, so a bump committed after this read
+    # leaves the entry stale and the next check reloads it
+    row = db.session.query(
+        User.id, User.username, User.created_at, User.session_version, User.timezone,
+        CacheVersion.version
+    ).outerjoin(CacheVersion, CacheVersion.name == version_service.identity_key(user_id))\
+        .filter(User.id == user_id).first()
+    if row is None or (row.session_version or 1) != version:
+        return None
+    
+    identity = UserIdentity(row.id, row.username, row.created_at, version, row.timezone or 'UTC',
+                            row.version or 0)
+    cache.set((user_id, version), identity)
+    return identity
+
+
+def identity_cache_stats():
+    """Return (hits, misses) for this process's identity cache."""
+    if _identity_cache is None:
+        return 0, 0
+    return _identity_cache.hits, _identity_cache.misses
+
+
+def invalidate_user(user_id):
+    """Stage a bump of the user's identity version and drop this process's copies.
+
+    Other workers see the new version on their next cache hit. The caller commits.
+    """
+    version_service.bump_version(version_service.identity_key(user_id))
+    _get_identity_cache().delete_where(lambda key: key[0] == user_id)
 
 
 def validate_registration_data(username, password, password_confirm):
@@ -30,6 +127,7 @@ def check_user_exists(username):
     return False, None
 
 
+@retry_on_busy
 def create_user(username, password):
     """Create a new user account."""
     new_user = User(username=username)
@@ -50,3 +148,24 @@ def authenticate_user(username, password):
         return None, 'Invalid username or password.'
     
     return user, None
+
+
+@retry_on_busy
+def change_password(user_id, current_password, new_password, confirm_password):
+    """Change a user's password and end their other sessions. Returns (user, error_message)."""
+    user = db.session.get(User, user_id)
+    
+    if user is None or not user.check_password(current_password):
+        return None, 'Current password is incorrect.'
+    
+    if len(new_password) < 6:
+        return None, 'New password must be at least 6 characters long.'
+    
+    if new_password != confirm_password:
+        return None, 'New passwords do not match.'
+    
+    user.set_password(new_password)
+    user.session_version = (user.session_version or 1) + 1
+    invalidate_user(user_id)
+    db.session.commit()
+    return user, None
@@ -0,0 +1,190 @@
+"""Community-wide statistics, materialized for constant-time reads.
+
+Summing every user's logs on each page view would scan ritual_log_entries,
+so the numbers live in small aggregate tables instead:
+
+- community_weeks: per week, the log count, logs per virtue (a log counts
+  toward its ritual's primary and secondary virtue) and active users
+- community_ritual_weeks: per week, logs of each preset ritual
+- community_weekly_users: which users logged in a week, for active users
+
+Weeks are Monday-start weeks of each log's local_date. refresh_community_stats()
+folds in logs with ids above the high-water mark kept in aggregate_watermarks,
+one window of ids at a time with set-based GROUP BY statements, and commits
+after each window. The incremental pass never sees edits or deletions of logs
+it already counted (or ids committed out of order), so the scheduler also runs
+a full rebuild, which replays every log in one transaction, once a day.
+"""
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import case, delete, exists, func, insert, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import (AggregateWatermark, CommunityRitualWeek, CommunityWeek,
+                        CommunityWeeklyUser, Ritual, RitualLogEntry)
+from app.services.timeseries_service import truncate_date
+
+WATERMARK = 'community'
+REFRESH_WINDOW = 50000
+TOP_PRESETS = 5
+FULL_REBUILD_SECONDS = 24 * 60 * 60
+
+# Virtue category -> community_weeks column
+VIRTUE_COUNT_COLUMNS = {
+    'Ren': 'ren_count',
+    'Yi': 'yi_count',
+    'Li': 'li_count',
+    'Zhi': 'zhi_count',
+}
+
+
+@dataclass
+class CommunityStats:
+    week_start: date
+    log_count: int = 0
+    active_users: int = 0
+    virtue_counts: Dict[str, int] = field(default_factory=dict)
+    top_presets: List[dict] = field(default_factory=list)
+    refreshed_at: Optional[datetime] = None
+
+
+def _watermark(lock=False):
+    """Return the community watermark row, creating it if missing."""
+    query = db.select(AggregateWatermark).where(AggregateWatermark.name == WATERMARK)
+    if lock:
+        # Keeps two schedulers from folding the same window twice on PostgreSQL
+        query = query.with_for_update()
+    row = db.session.execute(query).scalar()
+    if row is not None:
+        return row
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(AggregateWatermark).values(name=WATERMARK, last_id=0))
+    except IntegrityError:
+        # Another process created it first
+        pass
+    return db.session.execute(query).scalar()
+
+
+def _add_counts(model, key, counts):
+    """Add counts to the row of model identified by key, inserting it if missing."""
+    table = model.__table__
+    where = [table.c[column] == value for column, value in key.items()]
+    result = db.session.execute(
+        update(table).where(*where)
+        .values(**{column: table.c[column] + value for column, value in counts.items()})
+    )
+    if result.rowcount == 0:
+        db.session.execute(insert(table).values(**key, **counts))
+
+
+def _fold_window(low, high):
+    """Stage adding logs with low < id <= high to the aggregates."""
+    in_window = (
+        RitualLogEntry.id > low,
+        RitualLogEntry.id <= high,
+        RitualLogEntry.local_date.isnot(None),
+    )
+    week = truncate_date(RitualLogEntry.local_date, 'week').label('week_start')
+
+    virtue_counts = [
+        func.sum(case((or_(Ritual.primary_category == virtue,
+                           Ritual.secondary_category == virtue), 1), else_=0))
+        for virtue in VIRTUE_COUNT_COLUMNS
+    ]
+    week_rows = db.session.query(week, func.count(RitualLogEntry.id), *virtue_counts)\
+        .outerjoin(Ritual, Ritual.id == RitualLogEntry.ritual_id)\
+        .filter(*in_window)\
+        .group_by(week).all()
+    for week_start, count, *virtues in week_rows:
+        counts = {'log_count': count}
+        counts.update(zip(VIRTUE_COUNT_COLUMNS.values(), (value or 0 for value in virtues)))
+        _add_counts(CommunityWeek, {'week_start': week_start}, counts)
+
+    preset_rows = db.session.query(week, RitualLogEntry.ritual_id, func.count(RitualLogEntry.id))\
+        .join(Ritual, Ritual.id == RitualLogEntry.ritual_id)\
+        .filter(*in_window, Ritual.user_id.is_(None))\
+        .group_by(week, RitualLogEntry.ritual_id).all()
+    for week_start, ritual_id, count in preset_rows:
+        _add_counts(CommunityRitualWeek, {'week_start': week_start, 'ritual_id': ritual_id},
+                    {'log_count': count})
+
+    if not week_rows:
+        return
+    pairs = db.select(week, RitualLogEntry.user_id).where(*in_window).distinct().subquery()
+    seen = CommunityWeeklyUser.__table__
+    db.session.execute(insert(seen).from_select(
+        ['week_start', 'user_id'],
+        db.select(pairs.c.week_start, pairs.c.user_id).where(~exists().where(
+            seen.c.week_start == pairs.c.week_start, seen.c.user_id == pairs.c.user_id
+        ))
+    ))
+    weeks = CommunityWeek.__table__
+    db.session.execute(
+        update(weeks)
+        .where(weeks.c.week_start.in_([row[0] for row in week_rows]))
+        .values(active_users=db.select(func.count())
+                .where(seen.c.week_start == weeks.c.week_start)
+                .scalar_subquery())
+    )
+
+
+def refresh_community_stats(full=False, window=REFRESH_WINDOW):
+    """Fold new logs into the community aggregates. Returns how far the mark advanced.
+
+    full=True clears the aggregates and replays every log in one transaction,
+    so readers keep seeing the previous numbers until it commits.
+    """
+    watermark = _watermark(lock=True)
+    if full:
+        for model in (CommunityWeek, CommunityRitualWeek, CommunityWeeklyUser):
+            db.session.execute(delete(model))
+        watermark.last_id = 0
+
+    start = watermark.last_id
+    max_id = db.session.query(func.max(RitualLogEntry.id)).scalar() or 0
+    while watermark.last_id < max_id:
+        high = min(watermark.last_id + window, max_id)
+        _fold_window(watermark.last_id, high)
+        watermark.last_id = high
+        if not full:
+            watermark.refreshed_at = datetime.utcnow()
+            db.session.commit()
+            watermark = _watermark(lock=True)
+
+    watermark.refreshed_at = datetime.utcnow()
+    db.session.commit()
+    return watermark.last_id - start
+
+
+def get_community_stats(week_start, limit=TOP_PRESETS):
+    """Return CommunityStats for the week starting week_start, read from the aggregates."""
+    week = db.session.get(CommunityWeek, week_start)
+    presets = db.session.query(
+        CommunityRitualWeek.ritual_id, Ritual.name, CommunityRitualWeek.log_count
+    ).join(Ritual, Ritual.id == CommunityRitualWeek.ritual_id)\
+        .filter(CommunityRitualWeek.week_start == week_start)\
+        .order_by(CommunityRitualWeek.log_count.desc(), CommunityRitualWeek.ritual_id)\
+        .limit(limit).all()
+    refreshed_at = db.session.query(AggregateWatermark.refreshed_at)\
+        .filter(AggregateWatermark.name == WATERMARK).scalar()
+
+    stats = CommunityStats(
+        week_start=week_start,
+        virtue_counts={virtue: 0 for virtue in VIRTUE_COUNT_COLUMNS},
+        top_presets=[
+            {'ritual_id': ritual_id, 'name': name, 'count': count}
+            for ritual_id, name, count in presets
+        ],
+        refreshed_at=refreshed_at,
+    )
+    if week is not None:
+        stats.log_count = week.log_count
+        stats.active_users = week.active_users
+        stats.virtue_counts = {
+            virtue: getattr(week, column) for virtue, column in VIRTUE_COUNT_COLUMNS.items()
+        }
+    return stats
@@ -0,0 +1,116 @@
+"""Streaming export of a user's history as CSV or NDJSON.
+
+Rows are read with yield_per, which uses a server-side cursor where the
+driver supports one, and are encoded in chunks as the response is sent, so
+memory use stays flat however long the history is. Log and reflection
+exports use the same columns as the importer, so a file can be re-imported.
+"""
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Reflection, Ritual, RitualLogEntry
+
+CHUNK_SIZE = 500
+KINDS = ('logs', 'reflections', 'rituals')
+FORMATS = ('csv', 'ndjson')
+MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+COLUMNS = {
+    'logs': ['type', 'id', 'created_at', 'ritual_id', 'ritual_name', 'context', 'reflection'],
+    'reflections': ['type', 'id', 'created_at', 'reflection'],
+    'rituals': ['id', 'name', 'description', 'primary_category', 'secondary_category',
+                'source', 'created_at'],
+}
+
+
+def parse_date_range(start, end):
+    """Turn optional YYYY-MM-DD strings into a half-open datetime range.
+
+    The end date is inclusive for the caller. Raises ValueError on bad input.
+    """
+    start_at = datetime.strptime(start, '%Y-%m-%d') if start else None
+    end_before = datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1) if end else None
+    return start_at, end_before
+
+
+def _statement(kind, user_id, start_at, end_before):
+    if kind == 'logs':
+        model = RitualLogEntry
+        stmt = db.select(
+            RitualLogEntry.id, RitualLogEntry.created_at, RitualLogEntry.ritual_id,
+            Ritual.name.label('ritual_name'), RitualLogEntry.context, RitualLogEntry.reflection
+        ).outerjoin(Ritual, Ritual.id == RitualLogEntry.ritual_id)\
+         .where(RitualLogEntry.user_id == user_id)
+    elif kind == 'reflections':
+        model = Reflection
+        stmt = db.select(
+            Reflection.id, Reflection.created_at, Reflection.reflection_text.label('reflection')
+        ).where(Reflection.user_id == user_id)
+    else:
+        model = Ritual
+        stmt = db.select(
+            Ritual.id, Ritual.name, Ritual.description, Ritual.primary_category,
+            Ritual.secondary_category, Ritual.source, Ritual.created_at
+        ).where(Ritual.user_id == user_id)
+
+    if start_at is not None:
+        stmt = stmt.where(model.created_at >= start_at)
+    if end_before is not None:
+        stmt = stmt.where(model.created_at < end_before)
+    return stmt.order_by(model.created_at, model.id)
+
+
+def _iter_rows(kind, user_id, start_at, end_before):
+    """Yield one dict per exported row, fetching CHUNK_SIZE rows at a time."""
+    stmt = _statement(kind, user_id, start_at, end_before)
+    result = db.session.execute(stmt.execution_options(yield_per=CHUNK_SIZE))
+    row_type = {'logs': 'log', 'reflections': 'reflection'}.get(kind)
+    for row in result.mappings():
+        record = dict(row)
+        if record.get('created_at') is not None:
+            record['created_at'] = record['created_at'].isoformat()
+        if row_type:
+            record['type'] = row_type
+        yield record
+
+
+def _encode_csv(kind, rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS[kind], extrasaction='ignore')
+    writer.writeheader()
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _encode_ndjson(kind, rows):
+    lines = []
+    for row in rows:
+        ordered = {column: row.get(column) for column in COLUMNS[kind]}
+        lines.append(json.dumps(ordered, ensure_ascii=False) + '\n')
+        if len(lines) >= CHUNK_SIZE:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def generate_export(kind, fmt, user_id, start_at=None, end_before=None):
+    """Return a generator of text chunks for a user's export."""
+    if kind not in KINDS or fmt not in FORMATS:
+        raise ValueError(f'Unsupported export {kind}.{fmt}')
+    rows = _iter_rows(kind, user_id, start_at, end_before)
+    if fmt == 'csv':
+        return _encode_csv(kind, rows)
+    return _encode_ndjson(kind, rows)
+
+
+def export_filename(kind, fmt):
+    return f'ritual-tracker-{kind}-{datetime.utcnow():%Y%m%d}.{fmt}'
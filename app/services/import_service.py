@@ -0,0 +1,212 @@
+"""Bulk import of ritual logs and reflections from CSV or JSONL files.
+
+Rows are streamed from the file, validated, and inserted in batches with one
+transaction per batch, so memory use does not grow with the file size.
+
+Each row has these fields (CSV header or JSON keys):
+    type        'log' (default) or 'reflection'
+    created_at  ISO 8601 timestamp in UTC; defaults to the import time
+    ritual_id   id of a preset or one of the user's custom rituals (logs only)
+    context     optional context label (logs only)
+    reflection  the reflection text (required)
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from app.database import retry_on_busy
+from app.models import Reflection, RitualLogEntry
+from app.services import ritual_service, rollup_service, timezone_service, usage_service, version_service
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+MAX_CONTEXT_LENGTH = 50
+FORMATS = ('csv', 'jsonl')
+
+
+class ImportFormatError(ValueError):
+    """Raised when a whole file cannot be imported (e.g. unknown format)."""
+
+
+class ImportReport:
+    """Counts and per-row errors from one import run."""
+
+    def __init__(self):
+        self.rows_read = 0
+        self.logs_imported = 0
+        self.reflections_imported = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    @property
+    def imported(self):
+        return self.logs_imported + self.reflections_imported
+
+    def to_dict(self):
+        return {
+            'rows_read': self.rows_read,
+            'logs_imported': self.logs_imported,
+            'reflections_imported': self.reflections_imported,
+            'error_count': self.error_count,
+            'errors': [{'line': line, 'message': message} for line, message in self.errors],
+        }
+
+
+def detect_format(filename, declared=None):
+    """Pick 'csv' or 'jsonl' from an explicit choice or the file extension."""
+    if declared:
+        fmt = declared.lower()
+    else:
+        extension = filename.rsplit('.', 1)[-1].lower() if filename and '.' in filename else ''
+        fmt = {'csv': 'csv', 'jsonl': 'jsonl', 'ndjson': 'jsonl', 'json': 'jsonl'}.get(extension)
+    if fmt not in FORMATS:
+        raise ImportFormatError('Unsupported file format. Use .csv or .jsonl.')
+    return fmt
+
+
+def _iter_records(binary_stream, fmt):
+    """Yield (line_number, dict or error message) from a binary file stream."""
+    text = io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield line_number, 'Invalid JSON.'
+                continue
+            if not isinstance(record, dict):
+                yield line_number, 'Each line must be a JSON object.'
+                continue
+            yield line_number, record
+
+
+def _parse_timestamp(value, default):
+    if value in (None, ''):
+        return default
+    parsed = datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = (parsed - parsed.utcoffset()).replace(tzinfo=None)
+    return parsed
+
+
+def _validate(record, allowed_ritual_ids, now, tz_name):
+    """Turn a raw record into (kind, row dict). Raises ValueError with a message."""
+    kind = str(record.get('type') or 'log').strip().lower()
+    if kind not in ('log', 'reflection'):
+        raise ValueError(f'Unknown type "{kind}".')
+
+    text = str(record.get('reflection') or '').strip()
+    if not text:
+        raise ValueError('Reflection text is required.')
+
+    try:
+        created_at = _parse_timestamp(record.get('created_at'), now)
+    except ValueError:
+        raise ValueError(f'Invalid created_at "{record.get("created_at")}".')
+
+    local_date = timezone_service.local_date(created_at, tz_name)
+    if kind == 'reflection':
+        return kind, {'reflection_text': text, 'created_at': created_at, 'local_date': local_date}
+
+    try:
+        ritual_id = int(record.get('ritual_id'))
+    except (TypeError, ValueError):
+        raise ValueError('A numeric ritual_id is required for log rows.')
+    if ritual_id not in allowed_ritual_ids:
+        raise ValueError(f'Ritual {ritual_id} is not available to this user.')
+
+    context = str(record.get('context') or '').strip() or None
+    if context and len(context) > MAX_CONTEXT_LENGTH:
+        raise ValueError(f'Context is longer than {MAX_CONTEXT_LENGTH} characters.')
+
+    return kind, {
+        'ritual_id': ritual_id,
+        'context': context,
+        'reflection': text,
+        'created_at': created_at,
+        'local_date': local_date,
+    }
+
+
+@retry_on_busy
+def _write_batch(user_id, logs, reflections):
+    """Insert one batch and its rollup changes in a single transaction."""
+    if logs:
+        rows = [dict(row, user_id=user_id) for _, row in logs]
+        db.session.execute(insert(RitualLogEntry), rows)
+        rollup_service.record_entries_added(
+            user_id, ((row['local_date'], row['ritual_id']) for row in rows)
+        )
+        usage_service.record_entries_added(user_id, (row['ritual_id'] for row in rows))
+    if reflections:
+        db.session.execute(
+            insert(Reflection), [dict(row, user_id=user_id) for _, row in reflections]
+        )
+    version_service.bump_user_data_version(user_id)
+    db.session.commit()
+
+
+def _flush_batch(user_id, logs, reflections, report):
+    """Write one batch, recording every row as failed if the batch fails."""
+    try:
+        _write_batch(user_id, logs, reflections)
+    except SQLAlchemyError as exc:
+        db.session.rollback()
+        for line, _ in logs + reflections:
+            report.add_error(line, f'Batch failed: {exc.__class__.__name__}')
+        return
+    report.logs_imported += len(logs)
+    report.reflections_imported += len(reflections)
+
+
+def import_file(user_id, binary_stream, fmt, batch_size=BATCH_SIZE, on_progress=None):
+    """Import a CSV/JSONL stream for a user. Returns an ImportReport.
+
+    on_progress, if given, is called with the report after every batch.
+    """
+    allowed_ritual_ids = {r.id for r in ritual_service.get_available_rituals(user_id)}
+    tz_name = timezone_service.get_user_timezone(user_id)
+    now = datetime.utcnow()
+    report = ImportReport()
+    logs, reflections = [], []
+
+    for line, record in _iter_records(binary_stream, fmt):
+        report.rows_read += 1
+        if isinstance(record, str):
+            report.add_error(line, record)
+            continue
+        try:
+            kind, row = _validate(record, allowed_ritual_ids, now, tz_name)
+        except ValueError as exc:
+            report.add_error(line, str(exc))
+            continue
+
+        (logs if kind == 'log' else reflections).append((line, row))
+        if len(logs) + len(reflections) >= batch_size:
+            _flush_batch(user_id, logs, reflections, report)
+            logs, reflections = [], []
+            if on_progress:
+                on_progress(report)
+
+    if logs or reflections:
+        _flush_batch(user_id, logs, reflections, report)
+    if on_progress:
+        on_progress(report)
+
+    return report
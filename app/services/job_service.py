@@ -0,0 +1,256 @@
+"""Durable background jobs, queued in the application database.
+
+enqueue() inserts a row into the jobs table; `flask worker` (app/worker.py)
+claims queued rows, highest priority first, and runs the handler registered
+for the job's kind (handlers live in app/jobs.py). There is no broker: the
+table is the queue, so jobs survive restarts and a claim is a conditional
+UPDATE that only one worker can win.
+
+A failed job is retried up to max_attempts times with exponential backoff
+(run_after); after that it stays 'failed' with the error. A dedup_key keeps
+at most one queued or running job per key (a partial unique index), so
+enqueueing the same work twice returns the job that is already waiting.
+The worker refreshes heartbeat_at on the jobs it is running (handlers also
+refresh it when they report progress) and puts jobs whose heartbeat went
+stale, i.e. whose worker crashed, back in the queue.
+"""
+import logging
+import os
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.database import retry_on_busy
+from app.models import Job
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+FINISHED_STATUSES = (SUCCEEDED, FAILED)
+
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 30
+STALE_AFTER_SECONDS = 15 * 60
+HEARTBEAT_SECONDS = 60
+CLAIM_CANDIDATES = 5
+KEEP_FINISHED_DAYS = 7
+
+# kind -> handler(job) returning a JSON-serializable result
+HANDLERS = {}
+
+
+class UnknownJobKind(ValueError):
+    """No handler is registered for a job's kind."""
+
+
+def handler(kind):
+    """Register the decorated function as the handler for jobs of kind."""
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def _handlers():
+    # The handlers import most of the services, so they are loaded on first use
+    import app.jobs  # noqa: F401
+    return HANDLERS
+
+
+def queue_enabled():
+    """True when long-running work should go to the queue instead of running inline."""
+    return bool(current_app.config.get('JOB_QUEUE'))
+
+
+def _active_job(dedup_key):
+    return Job.query.filter(Job.dedup_key == dedup_key,
+                            Job.status.in_(ACTIVE_STATUSES)).first()
+
+
+@retry_on_busy
+def enqueue(kind, payload=None, user_id=None, priority=0, dedup_key=None,
+            max_attempts=DEFAULT_MAX_ATTEMPTS, delay=0):
+    """Queue a job and return it.
+
+    If dedup_key is given and a job with that key is still queued or
+    running, that job is returned instead of a new one. Higher priorities
+    run first; delay postpones the first attempt by that many seconds.
+    """
+    if kind not in _handlers():
+        raise UnknownJobKind(f'Unknown job kind "{kind}".')
+    if dedup_key is not None:
+        existing = _active_job(dedup_key)
+        if existing is not None:
+            return existing
+
+    job = Job(kind=kind, payload=payload or {}, user_id=user_id, priority=priority,
+              dedup_key=dedup_key, max_attempts=max_attempts,
+              run_after=datetime.utcnow() + timedelta(seconds=delay) if delay else None)
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request queued the same key between the check and the insert
+        db.session.rollback()
+        existing = _active_job(dedup_key) if dedup_key is not None else None
+        if existing is None:
+            raise
+        return existing
+    return job
+
+
+def get_job(job_id, user_id=None):
+    """Return a job by id, or None. With user_id, only that user's jobs are found."""
+    job = db.session.get(Job, job_id)
+    if job is None or (user_id is not None and job.user_id != user_id):
+        return None
+    return job
+
+
+@retry_on_busy
+def claim_next(worker):
+    """Mark the next runnable job as running for worker and return it (None if idle)."""
+    now = datetime.utcnow()
+    candidates = db.select(Job.id)\
+        .where(Job.status == QUEUED, db.or_(Job.run_after.is_(None), Job.run_after <= now))\
+        .order_by(Job.priority.desc(), Job.id)\
+        .limit(CLAIM_CANDIDATES)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        candidates = candidates.with_for_update(skip_locked=True)
+
+    jobs = Job.__table__
+    for job_id in db.session.execute(candidates).scalars().all():
+        # The status check makes the claim atomic even without row locks (SQLite):
+        # a worker that lost the race updates nothing and tries the next id.
+        result = db.session.execute(
+            update(jobs).where(jobs.c.id == job_id, jobs.c.status == QUEUED)
+            .values(status=RUNNING, worker=worker, attempts=jobs.c.attempts + 1,
+                    started_at=now, heartbeat_at=now)
+        )
+        if result.rowcount:
+            db.session.commit()
+            return db.session.get(Job, job_id)
+    db.session.commit()
+    return None
+
+
+def report_progress(job, **progress):
+    """Store progress on a running job, refresh its heartbeat and commit.
+
+    Anything else the handler has staged is committed with it.
+    """
+    job.progress = progress
+    job.heartbeat_at = datetime.utcnow()
+    db.session.commit()
+
+
+@retry_on_busy
+def heartbeat(job_ids, worker):
+    """Refresh heartbeat_at on worker's running jobs among job_ids. Returns how many."""
+    if not job_ids:
+        return 0
+    jobs = Job.__table__
+    count = db.session.execute(
+        update(jobs).where(jobs.c.id.in_(job_ids), jobs.c.status == RUNNING,
+                           jobs.c.worker == worker)
+        .values(heartbeat_at=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    return count
+
+
+def run_job(job_id):
+    """Run a claimed job's handler and record the outcome. Returns the job."""
+    job = db.session.get(Job, job_id)
+    try:
+        func = _handlers().get(job.kind)
+        if func is None:
+            raise UnknownJobKind(f'Unknown job kind "{job.kind}".')
+        result = func(job)
+    except Exception as exc:
+        db.session.rollback()
+        logger.exception('Job %s (%s) failed on attempt %s', job_id, job.kind, job.attempts)
+        return _record_failure(job_id, exc, retry=not isinstance(exc, UnknownJobKind))
+
+    job.status = SUCCEEDED
+    job.result = result
+    job.error = None
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return job
+
+
+@retry_on_busy
+def _record_failure(job_id, exc, retry=True):
+    job = db.session.get(Job, job_id)
+    job.error = f'{type(exc).__name__}: {exc}'
+    if retry and job.attempts < job.max_attempts:
+        job.status = QUEUED
+        job.run_after = datetime.utcnow() + timedelta(
+            seconds=RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1)
+        )
+    else:
+        job.status = FAILED
+        job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return job
+
+
+@retry_on_busy
+def requeue_stale(older_than=STALE_AFTER_SECONDS):
+    """Put running jobs with no heartbeat for older_than seconds back in the queue.
+
+    Returns how many were requeued. Their attempt still counts, so a job that
+    keeps killing its worker ends up failed instead of looping.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=older_than)
+    jobs = Job.__table__
+    stale = (jobs.c.status == RUNNING, jobs.c.heartbeat_at < cutoff)
+    failed = db.session.execute(
+        update(jobs).where(*stale, jobs.c.attempts >= jobs.c.max_attempts)
+        .values(status=FAILED, error='Worker stopped responding.', finished_at=datetime.utcnow())
+    ).rowcount
+    requeued = db.session.execute(
+        update(jobs).where(*stale).values(status=QUEUED, worker=None)
+    ).rowcount
+    db.session.commit()
+    return requeued + failed
+
+
+def _delete_jobs(*where):
+    """Delete the jobs matching where, with the files named in their payload or result."""
+    for result, payload in db.session.query(Job.result, Job.payload).filter(*where):
+        for data in (result, payload):
+            path = (data or {}).get('path')
+            if path and os.path.exists(path):
+                os.remove(path)
+    return db.session.execute(delete(Job.__table__).where(*where)).rowcount
+
+
+@retry_on_busy
+def prune_finished(older_than_days=KEEP_FINISHED_DAYS):
+    """Delete finished jobs older than older_than_days with their result files. Returns the count."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    count = _delete_jobs(Job.status.in_(FINISHED_STATUSES), Job.finished_at < cutoff)
+    db.session.commit()
+    return count
+
+
+@retry_on_busy
+def delete_user_jobs(user_id):
+    """Delete a user's queued and finished jobs (and their files); detach running ones.
+
+    Returns how many were deleted. Running jobs keep going without an owner.
+    """
+    count = _delete_jobs(Job.user_id == user_id, Job.status != RUNNING)
+    jobs = Job.__table__
+    db.session.execute(update(jobs).where(jobs.c.user_id == user_id).values(user_id=None))
+    db.session.commit()
+    return count
@@ -1,26 +1,46 @@
 """Ritual log entry service."""
 from datetime import datetime
+from sqlalchemy.orm import joinedload
 from app import db
+from app.database import retry_on_busy
 from app.models import RitualLogEntry
+from app.services import rollup_service, timezone_service, usage_service, version_service
+from app.services.pagination import paginate_keyset
 
+# Log listings always show the ritual name and categories, so load the ritual
+# in the same SELECT rather than one lazy query per entry.
+WITH_RITUAL = joinedload(RitualLogEntry.ritual)
 
-def create_log_entry(user_id, ritual_id, context, reflection):
-    """Create a new ritual log entry."""
+
+@retry_on_busy
+def create_log_entry(user_id, ritual_id, context, reflection, timezone=None):
+    """Create a new ritual log entry.
+    
+    timezone is the user's zone name, if the caller already has it.
+    """
+    now = datetime.utcnow()
     entry = RitualLogEntry(
         ritual_id=ritual_id,
         context=context,
         reflection=reflection,
         user_id=user_id,
-        created_at=datetime.utcnow()
+        created_at=now,
+        local_date=timezone_service.local_date(
+            now, timezone or timezone_service.get_user_timezone(user_id)
+        )
     )
     db.session.add(entry)
+    rollup_service.record_entry_added(entry)
+    usage_service.record_entry_added(entry)
+    version_service.bump_user_data_version(user_id)
     db.session.commit()
     return entry
 
 
 def get_user_ritual_logs(user_id, limit=None):
     """Get all ritual log entries for a user, most recent first."""
-    query = RitualLogEntry.query.filter_by(user_id=user_id)\
+    query = RitualLogEntry.query.options(WITH_RITUAL)\
+                                 .filter_by(user_id=user_id)\
                                  .order_by(RitualLogEntry.created_at.desc())
     if limit:
         query = query.limit(limit)
@@ -29,14 +49,21 @@ def get_user_ritual_logs(user_id, limit=None):
 
 def get_user_ritual_logs_paginated(user_id, page=1, per_page=10):
     """Get paginated ritual log entries for a user."""
-    return RitualLogEntry.query.filter_by(user_id=user_id)\
+    return RitualLogEntry.query.options(WITH_RITUAL)\
+                               .filter_by(user_id=user_id)\
                                .order_by(RitualLogEntry.created_at.desc())\
                                .paginate(page=page, per_page=per_page, error_out=False)
 
 
+def get_user_ritual_logs_page(user_id, cursor=None, page=None, per_page=10):
+    """Get one cursor-paginated page of ritual log entries for a user."""
+    query = RitualLogEntry.query.options(WITH_RITUAL).filter_by(user_id=user_id)
+    return paginate_keyset(query, RitualLogEntry, cursor=cursor, page=page, per_page=per_page)
+
+
 def get_user_logs_for_period(user_id, start_date, end_date):
     """Get ritual logs for a specific time period."""
-    return RitualLogEntry.query.filter(
+    return RitualLogEntry.query.options(WITH_RITUAL).filter(
         RitualLogEntry.user_id == user_id,
         RitualLogEntry.created_at >= start_date,
         RitualLogEntry.created_at < end_date
@@ -45,20 +72,29 @@ def get_user_logs_for_period(user_id, start_date, end_date):
 
 def get_log_entry_by_id(entry_id):
     """Get a single ritual log entry by ID."""
-    return RitualLogEntry.query.get(entry_id)
+    return db.session.get(RitualLogEntry, entry_id, options=[WITH_RITUAL])
 
 
+@retry_on_busy
 def update_log_entry(entry, ritual_id, context, reflection):
     """Update an existing ritual log entry."""
+    old_ritual_id = entry.ritual_id
     entry.ritual_id = ritual_id
     entry.context = context
     entry.reflection = reflection
+    rollup_service.record_entry_changed(entry, old_ritual_id)
+    usage_service.record_entry_changed(entry, old_ritual_id)
+    version_service.bump_user_data_version(entry.user_id)
     db.session.commit()
     return entry
 
 
+@retry_on_busy
 def delete_log_entry(entry):
     """Delete a ritual log entry."""
+    rollup_service.record_entry_removed(entry)
+    usage_service.record_entry_removed(entry)
+    version_service.bump_user_data_version(entry.user_id)
     db.session.delete(entry)
     db.session.commit()
     return True
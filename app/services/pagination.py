@@ -0,0 +1,126 @@
+"""Keyset (cursor) pagination helpers.
+
+Listings are ordered newest first by (created_at, id). Instead of OFFSET and a
+COUNT(*) per page view, each page hands out opaque cursors that encode the
+(created_at, id) of its first and last rows; the next query seeks directly to
+that position using the (user_id, created_at) index.
+"""
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+NEXT = 'n'
+PREV = 'p'
+
+# Largest id a BIGINT (and SQLite INTEGER) column can hold
+MAX_ID = 2 ** 63 - 1
+
+
+class KeysetPage:
+    """One page of results plus cursors for the neighbouring pages."""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def encode_token(payload):
+    """Encode a JSON-serialisable list as an opaque, URL-safe token."""
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_token(token):
+    """Decode a token from encode_token. Raises ValueError if it is malformed."""
+    raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+    return json.loads(raw)
+
+
+def encode_cursor(row, direction):
+    """Build an opaque cursor pointing just past row in the given direction."""
+    return encode_token([row.created_at.isoformat(), row.id, direction])
+
+
+def decode_cursor(token):
+    """Decode a cursor into (created_at, id, direction). Returns None if invalid."""
+    if not token:
+        return None
+    try:
+        created_at, row_id, direction = decode_token(token)
+        row_id = int(row_id)
+        if direction not in (NEXT, PREV) or not 0 <= row_id <= MAX_ID:
+            return None
+        return datetime.fromisoformat(created_at), row_id, direction
+    except (ValueError, TypeError, OverflowError):
+        return None
+
+
+def keyset_plan(model, cursor=None, page=None, per_page=10):
+    """Work out how to fetch one page ordered by (created_at, id) descending.
+
+    Returns (criterion or None, order_by, offset, direction), where direction
+    is None for an offset page or the cursor's direction. Shared by the sync
+    Query helper below and the async read path, which run the same SQL.
+    """
+    key = tuple_(model.created_at, model.id)
+    newest_first = (model.created_at.desc(), model.id.desc())
+    decoded = decode_cursor(cursor)
+
+    if decoded is None:
+        page = max(page or 1, 1)
+        return None, newest_first, (page - 1) * per_page, None
+
+    created_at, row_id, direction = decoded
+    if direction == NEXT:
+        return key < tuple_(created_at, row_id), newest_first, 0, NEXT
+    return key > tuple_(created_at, row_id), (model.created_at, model.id), 0, PREV
+
+
+def build_page(rows, per_page, offset, direction):
+    """Turn the per_page + 1 rows fetched for a keyset_plan into a KeysetPage."""
+    if direction is None:
+        items = rows[:per_page]
+        has_more = len(rows) > per_page
+        has_before = offset > 0
+    elif direction == NEXT:
+        items = rows[:per_page]
+        has_more = len(rows) > per_page
+        has_before = True
+    else:
+        items = list(reversed(rows[:per_page]))
+        has_more = True
+        has_before = len(rows) > per_page
+
+    if not items:
+        return KeysetPage(items)
+
+    return KeysetPage(
+        items,
+        next_cursor=encode_cursor(items[-1], NEXT) if has_more else None,
+        prev_cursor=encode_cursor(items[0], PREV) if has_before else None,
+    )
+
+
+def paginate_keyset(query, model, cursor=None, page=None, per_page=10):
+    """Return a KeysetPage of query results ordered by (created_at, id) descending.
+
+    cursor is a token from a previous page. When no valid cursor is given, a
+    legacy page number falls back to a single OFFSET query so old page=N links
+    keep working; pages reached from there use cursors.
+    """
+    criterion, order_by, offset, direction = keyset_plan(model, cursor, page, per_page)
+    if criterion is not None:
+        query = query.filter(criterion)
+    rows = query.order_by(*order_by).offset(offset or None).limit(per_page + 1).all()
+    return build_page(rows, per_page, offset, direction)
@@ -1,17 +1,29 @@
 """Reflection journal service."""
 from datetime import datetime
 from app import db
+from app.database import retry_on_busy
 from app.models import Reflection
+from app.services import timezone_service, version_service
+from app.services.pagination import paginate_keyset
 
 
-def create_reflection(user_id, reflection_text):
-    """Create a new reflection entry."""
+@retry_on_busy
+def create_reflection(user_id, reflection_text, timezone=None):
+    """Create a new reflection entry.
+    
+    timezone is the user's zone name, if the caller already has it.
+    """
+    now = datetime.utcnow()
     reflection = Reflection(
         user_id=user_id,
         reflection_text=reflection_text,
-        created_at=datetime.utcnow()
+        created_at=now,
+        local_date=timezone_service.local_date(
+            now, timezone or timezone_service.get_user_timezone(user_id)
+        )
     )
     db.session.add(reflection)
+    version_service.bump_user_data_version(user_id)
     db.session.commit()
     return reflection
 
@@ -32,16 +44,24 @@ def get_user_reflections_paginated(user_id, page=1, per_page=10):
                            .paginate(page=page, per_page=per_page, error_out=False)
 
 
+def get_user_reflections_page(user_id, cursor=None, page=None, per_page=10):
+    """Get one cursor-paginated page of reflections for a user."""
+    query = Reflection.query.filter_by(user_id=user_id)
+    return paginate_keyset(query, Reflection, cursor=cursor, page=page, per_page=per_page)
+
+
 def get_reflection_count(user_id):
     """Get total number of reflections for a user."""
     return Reflection.query.filter_by(user_id=user_id).count()
 
 
+@retry_on_busy
 def delete_reflection(reflection_id, user_id):
     """Delete a reflection if owned by user. Returns True if deleted."""
     reflection = Reflection.query.filter_by(id=reflection_id, user_id=user_id).first()
     if not reflection:
         return False
     db.session.delete(reflection)
+    version_service.bump_user_data_version(user_id)
     db.session.commit()
     return True
@@ -1,18 +1,107 @@
 """Ritual management service."""
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+from flask import current_app
 from app import db
+from app.database import retry_on_busy
 from app.models import Ritual
+from app.services import rollup_service, usage_service, version_service
+
+
+PRESET_CACHE_VERSION = 'presets'
+
+
+@dataclass(frozen=True)
+class PresetRitual:
+    """Read-only, session-independent copy of a shared preset ritual."""
+    id: int
+    name: str
+    description: Optional[str]
+    primary_category: Optional[str]
+    secondary_category: Optional[str]
+    source: Optional[str]
+    created_at: Optional[datetime]
+    user_id: None = None
+
+    @property
+    def is_preset(self):
+        return True
+
+
+class _PresetCatalog:
+    """Process-wide cache of preset rituals, keyed by the shared 'presets' version.
+
+    The version row is re-read at most once per check interval, so every worker
+    notices a bump from another process within that interval.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rituals = None
+        self._version = None
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self):
+        interval = current_app.config.get('PRESET_CACHE_CHECK_SECONDS', 30)
+        now = time.monotonic()
+        if self._rituals is not None and now - self._checked_at < interval:
+            self.hits += 1
+            return self._rituals
+
+        with self._lock:
+            version = version_service.get_version(PRESET_CACHE_VERSION)
+            if self._rituals is None or version != self._version:
+                self.misses += 1
+                rows = Ritual.query.filter_by(user_id=None).order_by(Ritual.name).all()
+                self._rituals = tuple(
+                    PresetRitual(
+                        id=r.id, name=r.name, description=r.description,
+                        primary_category=r.primary_category,
+                        secondary_category=r.secondary_category,
+                        source=r.source, created_at=r.created_at
+                    )
+                    for r in rows
+                )
+                self._version = version
+            else:
+                self.hits += 1
+            self._checked_at = now
+            return self._rituals
+
+    def clear(self):
+        with self._lock:
+            self._rituals = None
+            self._version = None
+
+
+_preset_catalog = _PresetCatalog()
 
 
 def get_available_rituals(user_id):
     """Get all rituals available to a user (presets + custom)."""
-    return Ritual.query.filter(
-        (Ritual.user_id == None) | (Ritual.user_id == user_id)
-    ).order_by(Ritual.user_id.nullsfirst(), Ritual.name).all()
+    custom = Ritual.query.filter_by(user_id=user_id).order_by(Ritual.name).all()
+    return list(_preset_catalog.get()) + custom
 
 
 def get_preset_rituals():
     """Get all shared preset rituals."""
-    return Ritual.query.filter_by(user_id=None).all()
+    return list(_preset_catalog.get())
+
+
+def preset_cache_stats():
+    """Return (hits, misses) for this process's preset catalog."""
+    return _preset_catalog.hits, _preset_catalog.misses
+
+
+def invalidate_preset_cache():
+    """Mark the preset catalog as changed in every worker. The caller commits."""
+    version_service.bump_version(PRESET_CACHE_VERSION)
+    _preset_catalog.clear()
 
 
 def get_user_custom_rituals(user_id):
@@ -25,6 +114,7 @@ def get_ritual_by_id(ritual_id):
     return Ritual.query.get(ritual_id)
 
 
+@retry_on_busy
 def create_custom_ritual(user_id, name, description=None, primary_category=None, 
                          secondary_category=None, source=None):
     """Create a new custom ritual for a user."""
@@ -37,26 +127,34 @@ def create_custom_ritual(user_id, name, description=None, primary_category=None,
         user_id=user_id
     )
     db.session.add(ritual)
+    version_service.bump_user_data_version(user_id)
     db.session.commit()
     return ritual
 
 
+@retry_on_busy
 def update_custom_ritual(ritual, name, description=None, primary_category=None,
                          secondary_category=None, source=None):
     """Update an existing custom ritual."""
+    old_primary = ritual.primary_category
+    old_secondary = ritual.secondary_category
     ritual.name = name
     ritual.description = description or None
     ritual.primary_category = primary_category or None
     ritual.secondary_category = secondary_category or None
     ritual.source = source or None
+    rollup_service.record_ritual_recategorized(ritual, old_primary, old_secondary)
+    version_service.bump_user_data_version(ritual.user_id)
     db.session.commit()
     return ritual
 
 
+@retry_on_busy
 def delete_custom_ritual(ritual):
     """Delete a custom ritual. Returns False if ritual has been used in logs."""
-    if ritual.log_entries:
+    if usage_service.is_ritual_in_use(ritual.id):
         return False
+    version_service.bump_user_data_version(ritual.user_id)
     db.session.delete(ritual)
     db.session.commit()
     return True
@@ -0,0 +1,204 @@
+"""Daily rollup maintenance service.
+
+Each DailyRollup row holds the log count and virtue score sums for one user
+on one day, keyed by the logs' local_date (the user's own calendar day). The
+helpers here only stage changes on the current session; the calling service
+commits them together with the log entry itself. A day row
+appearing or disappearing also flips that day's activity bit (activity_service).
+"""
+from app import db
+from app.models import DailyRollup, Ritual, RitualLogEntry
+from app.services import activity_service
+from sqlalchemy import func, case, insert, update, delete, literal
+from sqlalchemy.exc import IntegrityError
+
+# Virtue category -> rollup column name
+VIRTUE_COLUMNS = {
+    'Ren': 'ren_score',
+    'Yi': 'yi_score',
+    'Li': 'li_score',
+    'Zhi': 'zhi_score',
+}
+
+PRIMARY_POINTS = 1.0
+SECONDARY_POINTS = 0.5
+
+
+def virtue_points(primary_category, secondary_category):
+    """Return {rollup column: points} earned by one log of a ritual."""
+    points = {}
+    if primary_category in VIRTUE_COLUMNS:
+        column = VIRTUE_COLUMNS[primary_category]
+        points[column] = points.get(column, 0.0) + PRIMARY_POINTS
+    if secondary_category in VIRTUE_COLUMNS:
+        column = VIRTUE_COLUMNS[secondary_category]
+        points[column] = points.get(column, 0.0) + SECONDARY_POINTS
+    return points
+
+
+def _ritual_points(ritual_id):
+    if ritual_id is None:
+        return {}
+    ritual = db.session.get(Ritual, ritual_id)
+    if ritual is None:
+        return {}
+    return virtue_points(ritual.primary_category, ritual.secondary_category)
+
+
+def adjust_day(user_id, day, count, points):
+    """Add count and per-column points (may be negative) to a user's day row."""
+    # Plain table statements: these run for every log write, and the ORM's
+    # bulk-update bookkeeping costs more than the SQL itself.
+    table = DailyRollup.__table__
+    values = {'log_count': table.c.log_count + count}
+    for column, value in points.items():
+        values[column] = table.c[column] + value
+
+    result = db.session.execute(
+        update(table)
+        .where(table.c.user_id == user_id, table.c.day == day)
+        .values(**values)
+    )
+
+    if result.rowcount == 0:
+        if count <= 0:
+            return
+        row = {column: 0.0 for column in VIRTUE_COLUMNS.values()}
+        row.update(points)
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(table).values(
+                    user_id=user_id, day=day, log_count=count, **row
+                ))
+        except IntegrityError:
+            # Another transaction created this day's row first; retry as an update
+            adjust_day(user_id, day, count, points)
+            return
+        activity_service.mark_day(user_id, day, True)
+    elif count < 0:
+        result = db.session.execute(
+            delete(table).where(
+                table.c.user_id == user_id,
+                table.c.day == day,
+                table.c.log_count <= 0
+            )
+        )
+        if result.rowcount:
+            activity_service.mark_day(user_id, day, False)
+
+
+def record_entry_added(entry):
+    """Stage the rollup change for a newly created log entry."""
+    adjust_day(entry.user_id, entry.local_date, 1, _ritual_points(entry.ritual_id))
+
+
+def record_entries_added(user_id, entries):
+    """Stage rollup changes for many new entries of one user.
+
+    entries is an iterable of (local_date, ritual_id) pairs; changes are summed
+    per day so each day row is touched once.
+    """
+    points_by_ritual = {}
+    counts = {}
+    points_by_day = {}
+    for day, ritual_id in entries:
+        if ritual_id not in points_by_ritual:
+            points_by_ritual[ritual_id] = _ritual_points(ritual_id)
+        counts[day] = counts.get(day, 0) + 1
+        day_points = points_by_day.setdefault(day, {})
+        for column, value in points_by_ritual[ritual_id].items():
+            day_points[column] = day_points.get(column, 0.0) + value
+
+    for day, count in counts.items():
+        adjust_day(user_id, day, count, points_by_day[day])
+
+
+def record_entry_removed(entry, ritual_id=None):
+    """Stage the rollup change for a deleted log entry.
+
+    Pass ritual_id when the entry has already been pointed at another ritual.
+    """
+    if ritual_id is None:
+        ritual_id = entry.ritual_id
+    points = {column: -value for column, value in _ritual_points(ritual_id).items()}
+    adjust_day(entry.user_id, entry.local_date, -1, points)
+
+
+def record_entry_changed(entry, old_ritual_id):
+    """Stage the rollup change for a log entry that moved to another ritual."""
+    if old_ritual_id == entry.ritual_id:
+        return
+    old_points = _ritual_points(old_ritual_id)
+    new_points = _ritual_points(entry.ritual_id)
+    delta = {
+        column: new_points.get(column, 0.0) - old_points.get(column, 0.0)
+        for column in set(old_points) | set(new_points)
+    }
+    adjust_day(entry.user_id, entry.local_date, 0, delta)
+
+
+def record_ritual_recategorized(ritual, old_primary, old_secondary):
+    """Stage rollup changes after a ritual's virtue categories changed."""
+    old_points = virtue_points(old_primary, old_secondary)
+    new_points = virtue_points(ritual.primary_category, ritual.secondary_category)
+    delta = {
+        column: new_points.get(column, 0.0) - old_points.get(column, 0.0)
+        for column in set(old_points) | set(new_points)
+    }
+    delta = {column: value for column, value in delta.items() if value}
+    if not delta:
+        return
+
+    log_day = RitualLogEntry.local_date
+    rows = db.session.query(
+        RitualLogEntry.user_id, log_day, func.count(RitualLogEntry.id)
+    ).filter(
+        RitualLogEntry.ritual_id == ritual.id
+    ).group_by(RitualLogEntry.user_id, log_day).all()
+
+    for user_id, day, count in rows:
+        adjust_day(user_id, day, 0, {column: value * count for column, value in delta.items()})
+
+
+def _score_expression(category):
+    return (
+        case((Ritual.primary_category == category, PRIMARY_POINTS), else_=0.0)
+        + case((Ritual.secondary_category == category, SECONDARY_POINTS), else_=0.0)
+    )
+
+
+def rebuild_rollups(user_id=None):
+    """Regenerate rollup rows (and activity bitmaps) from raw log entries.
+
+    Returns the number of rollup rows written.
+    """
+    delete_stmt = delete(DailyRollup)
+    if user_id is not None:
+        delete_stmt = delete_stmt.where(DailyRollup.user_id == user_id)
+    db.session.execute(delete_stmt)
+
+    log_day = RitualLogEntry.local_date
+    source = db.select(
+        RitualLogEntry.user_id,
+        log_day,
+        func.count(RitualLogEntry.id),
+        *[func.coalesce(func.sum(_score_expression(category)), literal(0.0))
+          for category in VIRTUE_COLUMNS]
+    ).select_from(RitualLogEntry).outerjoin(
+        Ritual, Ritual.id == RitualLogEntry.ritual_id
+    ).group_by(RitualLogEntry.user_id, log_day)
+    if user_id is not None:
+        source = source.where(RitualLogEntry.user_id == user_id)
+
+    db.session.execute(
+        insert(DailyRollup).from_select(
+            ['user_id', 'day', 'log_count', *VIRTUE_COLUMNS.values()], source
+        )
+    )
+    activity_service.rebuild_bitmaps(user_id)
+    db.session.commit()
+
+    count_query = DailyRollup.query
+    if user_id is not None:
+        count_query = count_query.filter_by(user_id=user_id)
+    return count_query.count()
@@ -0,0 +1,274 @@
+"""Full-text search over ritual log reflections and journal reflections.
+
+SQLite uses FTS5 external-content tables (ritual_log_entries_fts and
+reflections_fts) that index the text columns of the base tables by rowid;
+triggers on the base tables keep them in step, so every write path (ORM,
+bulk import, raw deletes) is covered. PostgreSQL uses GIN expression indexes
+on to_tsvector() of the same columns and needs no extra tables.
+
+Hits are ranked (bm25 on SQLite, ts_rank_cd on PostgreSQL), carry a snippet
+with the matched terms marked, and are paged with opaque cursors over
+(score, kind, id). Scores are "lower is better" on both dialects.
+"""
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from markupsafe import Markup, escape
+from sqlalchemy import and_, bindparam, column, func, literal, literal_column, or_, table, text
+
+from app import db
+from app.database import dialect_name
+from app.models import Reflection, Ritual, RitualLogEntry
+from app.services.pagination import MAX_ID, KeysetPage, decode_token, encode_token
+
+KINDS = ('logs', 'reflections')
+MAX_TERMS = 8
+SNIPPET_TOKENS = 16
+PG_TS_CONFIG = 'english'
+
+# Private-use characters mark matches inside snippets until highlight() turns
+# them into <mark> tags after HTML-escaping the text around them.
+MARK_START = '\ue000'
+MARK_END = '\ue001'
+ELLIPSIS = '…'
+
+
+@dataclass(frozen=True)
+class _Source:
+    kind: str
+    model: type
+    column: str
+    fts_table: str
+
+
+SOURCES = {
+    'logs': _Source('log', RitualLogEntry, 'reflection', 'ritual_log_entries_fts'),
+    'reflections': _Source('reflection', Reflection, 'reflection_text', 'reflections_fts'),
+}
+
+
+@dataclass
+class SearchHit:
+    kind: str
+    id: int
+    created_at: datetime
+    score: float
+    snippet: str
+    ritual_id: Optional[int] = None
+    ritual_name: Optional[str] = None
+
+    @property
+    def highlighted(self):
+        return highlight(self.snippet)
+
+
+def _gin_index_name(source):
+    return f'ix_{source.model.__tablename__}_{source.column}_search'
+
+
+def _sqlite_ddl(source):
+    base, col, fts = source.model.__tablename__, source.column, source.fts_table
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{col}, content='{base}', content_rowid='id', "
+        f"tokenize='porter unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {base} BEGIN "
+        f"INSERT INTO {fts}(rowid, {col}) VALUES (new.id, new.{col}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {base} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {col}) VALUES ('delete', old.id, old.{col}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {col} ON {base} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {col}) VALUES ('delete', old.id, old.{col}); "
+        f"INSERT INTO {fts}(rowid, {col}) VALUES (new.id, new.{col}); END",
+    ]
+
+
+def _postgres_ddl(source):
+    return [
+        f"CREATE INDEX IF NOT EXISTS {_gin_index_name(source)} ON {source.model.__tablename__} "
+        f"USING gin (to_tsvector('{PG_TS_CONFIG}'::regconfig, {source.column}))",
+    ]
+
+
+def install_search_indexes():
+    """Create the full-text tables, triggers or indexes if missing. The caller commits."""
+    dialect = dialect_name()
+    for source in SOURCES.values():
+        statements = _sqlite_ddl(source) if dialect == 'sqlite' else _postgres_ddl(source)
+        for statement in statements:
+            db.session.execute(text(statement))
+
+
+def rebuild_search_indexes():
+    """Re-index all log and reflection text from the base tables.
+
+    Only needed on SQLite (after restoring a database or if the FTS tables
+    drift); PostgreSQL maintains its GIN indexes itself.
+    """
+    if dialect_name() == 'sqlite':
+        for source in SOURCES.values():
+            db.session.execute(text(
+                f"INSERT INTO {source.fts_table}({source.fts_table}) VALUES ('rebuild')"
+            ))
+    db.session.commit()
+
+
+def _terms(query_text):
+    return re.findall(r'\w+', query_text or '')[:MAX_TERMS]
+
+
+def _sqlite_match(terms):
+    # Quoted terms are literal tokens, so user input can't inject FTS5 syntax;
+    # the last term is a prefix to match words still being typed.
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def _pg_tsquery(terms):
+    return ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+
+
+def _ranked(source, terms, dialect):
+    """Return (statement, score expression) selecting SearchHit columns for one source."""
+    model = source.model
+    text_column = getattr(model, source.column)
+
+    if dialect == 'sqlite':
+        fts = table(source.fts_table, column('rowid'))
+        fts_ref = literal_column(source.fts_table)
+        score = func.bm25(fts_ref)
+        snippet = func.snippet(fts_ref, 0, MARK_START, MARK_END, ELLIPSIS, SNIPPET_TOKENS)
+        match = text(f'{source.fts_table} MATCH :match').bindparams(match=_sqlite_match(terms))
+        from_clause = fts.join(model.__table__, model.id == fts.c.rowid)
+    else:
+        config = literal_column(f"'{PG_TS_CONFIG}'::regconfig")
+        tsquery = func.to_tsquery(config, bindparam('tsquery', _pg_tsquery(terms)))
+        vector = func.to_tsvector(config, text_column)
+        score = -func.ts_rank_cd(vector, tsquery)
+        snippet = func.ts_headline(
+            config, text_column, tsquery,
+            f'StartSel="{MARK_START}", StopSel="{MARK_END}", '
+            f'MaxWords={SNIPPET_TOKENS}, MinWords={SNIPPET_TOKENS // 2}, FragmentDelimiter="{ELLIPSIS}"'
+        )
+        match = vector.op('@@')(tsquery)
+        from_clause = model.__table__
+
+    if model is RitualLogEntry:
+        ritual_columns = [RitualLogEntry.ritual_id, Ritual.name.label('ritual_name')]
+        from_clause = from_clause.outerjoin(Ritual, Ritual.id == RitualLogEntry.ritual_id)
+    else:
+        ritual_columns = [literal(None).label('ritual_id'), literal(None).label('ritual_name')]
+
+    stmt = db.select(
+        model.id, model.created_at, score.label('score'), snippet.label('snippet'), *ritual_columns
+    ).select_from(from_clause).where(match)
+    return stmt, score
+
+
+def _after_cursor(score, model, kind_rank, cursor):
+    """Criterion for rows of one source that sort after the cursor position."""
+    last_score, last_kind, last_id = cursor
+    if kind_rank < last_kind:
+        return score > last_score
+    if kind_rank > last_kind:
+        return score >= last_score
+    return or_(score > last_score, and_(score == last_score, model.id > last_id))
+
+
+def _decode_search_cursor(token):
+    if not token:
+        return None
+    try:
+        score, kind_rank, row_id = decode_token(token)
+        score, kind_rank, row_id = float(score), int(kind_rank), int(row_id)
+        if not 0 <= row_id <= MAX_ID:
+            return None
+        return score, kind_rank, row_id
+    except (ValueError, TypeError, OverflowError):
+        return None
+
+
+def parse_search_args(args):
+    """Turn request args (q, kind, ritual_id, virtue, start, end) into search() keywords.
+
+    Raises ValueError if a date is not in YYYY-MM-DD format.
+    """
+    from app.services.export_service import parse_date_range
+    from app.services.rollup_service import VIRTUE_COLUMNS
+
+    start_at, end_before = parse_date_range(args.get('start') or None, args.get('end') or None)
+    kind = args.get('kind')
+    virtue = args.get('virtue')
+    try:
+        ritual_id = int(args['ritual_id']) if args.get('ritual_id') else None
+    except ValueError:
+        ritual_id = None
+    return {
+        'query_text': (args.get('q') or '').strip(),
+        'kinds': (kind,) if kind in KINDS else KINDS,
+        'start_at': start_at,
+        'end_before': end_before,
+        'ritual_id': ritual_id,
+        'virtue': virtue if virtue in VIRTUE_COLUMNS else None,
+    }
+
+
+def search(user_id, query_text, kinds=KINDS, start_at=None, end_before=None,
+           ritual_id=None, virtue=None, cursor=None, per_page=20):
+    """Return a KeysetPage of SearchHits for a user, best match first.
+
+    start_at/end_before bound created_at (half-open). ritual_id and virtue
+    only apply to ritual logs, so setting either leaves reflections out.
+    """
+    terms = _terms(query_text)
+    if not terms:
+        return KeysetPage([])
+    if ritual_id is not None or virtue:
+        kinds = [kind for kind in kinds if kind == 'logs']
+
+    dialect = dialect_name()
+    position = _decode_search_cursor(cursor)
+    hits = []
+    for kind_rank, kind in enumerate(KINDS):
+        if kind not in kinds:
+            continue
+        source = SOURCES[kind]
+        model = source.model
+        stmt, score = _ranked(source, terms, dialect)
+        stmt = stmt.where(model.user_id == user_id)
+        if start_at is not None:
+            stmt = stmt.where(model.created_at >= start_at)
+        if end_before is not None:
+            stmt = stmt.where(model.created_at < end_before)
+        if ritual_id is not None:
+            stmt = stmt.where(RitualLogEntry.ritual_id == ritual_id)
+        if virtue:
+            stmt = stmt.where(or_(Ritual.primary_category == virtue,
+                                  Ritual.secondary_category == virtue))
+        if position is not None:
+            stmt = stmt.where(_after_cursor(score, model, kind_rank, position))
+        stmt = stmt.order_by(score, model.id).limit(per_page + 1)
+
+        for row in db.session.execute(stmt):
+            hits.append((kind_rank, SearchHit(
+                kind=source.kind, id=row.id, created_at=row.created_at, score=float(row.score),
+                snippet=row.snippet or '', ritual_id=row.ritual_id, ritual_name=row.ritual_name,
+            )))
+
+    # Each source is already sorted; merging them is cheaper than a UNION in SQL
+    # because FTS5 ranking functions only work next to their own MATCH.
+    hits.sort(key=lambda item: (item[1].score, item[0], item[1].id))
+    items = [hit for _, hit in hits[:per_page]]
+    next_cursor = None
+    if len(hits) > per_page:
+        kind_rank, last = hits[per_page - 1]
+        next_cursor = encode_token([last.score, kind_rank, last.id])
+    return KeysetPage(items, next_cursor=next_cursor)
+
+
+def highlight(snippet):
+    """HTML-escape a snippet and wrap its matched terms in <mark> tags."""
+    escaped = str(escape(snippet))
+    return Markup(escaped.replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
@@ -0,0 +1,247 @@
+"""Single-pass summary engine for the /summary page.
+
+SummaryEngine loads a user's daily rollup rows and per-ritual counts once and
+derives every statistic on the summary page in memory, instead of issuing a
+separate query per metric. get_summary() wraps it in the result cache.
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+
+from app import db
+from app.cache import get_result_cache
+from app.models import DailyRollup, Reflection, User
+from app.services import timezone_service, usage_service, version_service
+from app.services.activity_service import ActivitySet
+from app.services.rollup_service import VIRTUE_COLUMNS
+
+DAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+
+@dataclass
+class AllTimeStats:
+    total_logs: int
+    total_reflections: int
+    days_on_journey: int
+    most_practiced: Optional[dict]
+    longest_streak: int
+    virtue_metrics: Dict[str, float]
+
+
+@dataclass
+class SummaryResult:
+    week_start: date
+    week_end: date
+    total_rituals: int
+    last_week_total: int
+    days_practiced: int
+    streak: int
+    daily_counts: Dict[str, int]
+    virtue_metrics: Dict[str, float]
+    weekly_trend: List[dict]
+    all_time: AllTimeStats
+
+    @property
+    def week_change(self):
+        return self.total_rituals - self.last_week_total
+
+
+@dataclass
+class _DayRow:
+    count: int
+    scores: Dict[str, float] = field(default_factory=dict)
+
+
+class SummaryEngine:
+    """Compute all summary metrics for one user from a single rollup scan."""
+
+    def __init__(self, user_id, today=None, trend_weeks=8, joined_at=None,
+                 day_rows=None, most_practiced_row=None, total_reflections=None, timezone=None):
+        """day_rows, most_practiced_row and total_reflections may be passed in
+        already fetched (by the async read path); otherwise they are queried.
+        today defaults to today in timezone, the user's zone (looked up if None).
+        """
+        self.user_id = user_id
+        self.joined_at = joined_at
+        self.timezone = timezone
+        self.today = today or timezone_service.local_today(self._timezone())
+        self.trend_weeks = trend_weeks
+        self.week_start = self.today - timedelta(days=self.today.weekday())
+        self.week_end = self.week_start + timedelta(days=6)
+        self._days = self.days_from_rows(day_rows) if day_rows is not None else None
+        self._most_practiced_row = most_practiced_row
+        self._most_practiced_loaded = day_rows is not None
+        self._total_reflections = total_reflections
+        self._activity_set = None
+
+    def _timezone(self):
+        if self.timezone is None:
+            self.timezone = timezone_service.get_user_timezone(self.user_id)
+        return self.timezone
+
+    # Statements are shared with the async read path (async_reads)
+
+    @staticmethod
+    def days_statement(user_id):
+        columns = [getattr(DailyRollup, column) for column in VIRTUE_COLUMNS.values()]
+        return db.select(DailyRollup.day, DailyRollup.log_count, *columns)\
+            .where(DailyRollup.user_id == user_id)\
+            .order_by(DailyRollup.day)
+
+    @staticmethod
+    def most_practiced_statement(user_id):
+        # Reads the usage counters, not the log history
+        return usage_service.top_rituals_statement(user_id, 1)
+
+    @staticmethod
+    def reflection_count_statement(user_id):
+        return db.select(func.count(Reflection.id)).where(Reflection.user_id == user_id)
+
+    @staticmethod
+    def days_from_rows(rows):
+        return {
+            row[0]: _DayRow(row[1], dict(zip(VIRTUE_COLUMNS, row[2:])))
+            for row in rows
+        }
+
+    def _load_days(self):
+        """Fetch every active day for the user, with counts and virtue scores."""
+        if self._days is None:
+            rows = db.session.execute(self.days_statement(self.user_id)).all()
+            self._days = self.days_from_rows(rows)
+        return self._days
+
+    def _most_practiced(self):
+        if not self._most_practiced_loaded:
+            self._most_practiced_row = db.session.execute(
+                self.most_practiced_statement(self.user_id)
+            ).first()
+            self._most_practiced_loaded = True
+        result = self._most_practiced_row
+        if result:
+            return {'name': result[0], 'count': result[1]}
+        return None
+
+    @staticmethod
+    def _sum_scores(rows):
+        scores = {virtue: 0.0 for virtue in VIRTUE_COLUMNS}
+        for row in rows:
+            for virtue, score in row.scores.items():
+                scores[virtue] += score
+        return scores
+
+    def _days_between(self, start, end):
+        """Yield (day, row) for active days in an inclusive date range."""
+        for day, row in self._load_days().items():
+            if start <= day <= end:
+                yield day, row
+
+    def _activity(self):
+        # Streaks use the same bit operations as the stored activity bitmaps,
+        # built from the day rows already loaded so no extra query is needed
+        if self._activity_set is None:
+            self._activity_set = ActivitySet.from_days(self._load_days())
+        return self._activity_set
+
+    def _current_streak(self):
+        return self._activity().current_streak(self.today)
+
+    def _longest_streak(self):
+        return self._activity().longest_streak()
+
+    def _weekly_trend(self):
+        first_week_start = self.week_start - timedelta(weeks=self.trend_weeks - 1)
+        counts = defaultdict(int)
+        for day, row in self._days_between(first_week_start, self.week_end):
+            counts[(day - first_week_start).days // 7] += row.count
+        return [
+            {
+                'label': (first_week_start + timedelta(weeks=i)).strftime('%b %d'),
+                'count': counts[i],
+            }
+            for i in range(self.trend_weeks)
+        ]
+
+    def _all_time(self):
+        days = self._load_days()
+        total_logs = sum(row.count for row in days.values())
+        total_reflections = self._total_reflections
+        if total_reflections is None:
+            total_reflections = db.session.execute(
+                self.reflection_count_statement(self.user_id)
+            ).scalar()
+
+        joined_at = self.joined_at
+        if joined_at is None:
+            user = db.session.get(User, self.user_id)
+            joined_at = user.created_at if user else None
+        days_on_journey = 0
+        if joined_at:
+            # Calendar days in the user's zone, counting the day they joined
+            joined_on = timezone_service.local_date(joined_at, self._timezone())
+            days_on_journey = max(1, (self.today - joined_on).days + 1)
+
+        return AllTimeStats(
+            total_logs=total_logs,
+            total_reflections=total_reflections,
+            days_on_journey=days_on_journey,
+            most_practiced=self._most_practiced() if total_logs > 0 else None,
+            longest_streak=self._longest_streak(),
+            virtue_metrics=self._sum_scores(days.values()),
+        )
+
+    def compute(self):
+        """Return a SummaryResult for the engine's user and date."""
+        this_week = list(self._days_between(self.week_start, self.week_end))
+        last_week_start = self.week_start - timedelta(days=7)
+        last_week = self._days_between(last_week_start, self.week_start - timedelta(days=1))
+
+        daily_counts = {day: 0 for day in DAY_NAMES}
+        for day, row in this_week:
+            daily_counts[DAY_NAMES[day.weekday()]] += row.count
+
+        return SummaryResult(
+            week_start=self.week_start,
+            week_end=self.week_end,
+            total_rituals=sum(row.count for _, row in this_week),
+            last_week_total=sum(row.count for _, row in last_week),
+            days_practiced=self._activity().count_between(self.week_start, self.week_end),
+            streak=self._current_streak(),
+            daily_counts=daily_counts,
+            virtue_metrics=self._sum_scores(row for _, row in this_week),
+            weekly_trend=self._weekly_trend(),
+            all_time=self._all_time(),
+        )
+
+
+def summary_cache_key(user_id, today=None, versions=None):
+    """Key a user's summary on their data versions and the ISO week date.
+
+    Any write bumps the user's data version, so stale entries are never read
+    again; the weekday is in the key because streaks change at midnight.
+    versions is a get_versions() result, if the caller already has one.
+    """
+    from app.services.ritual_service import PRESET_CACHE_VERSION
+    today = today or timezone_service.local_today(timezone_service.get_user_timezone(user_id))
+    user_key = version_service.user_data_key(user_id)
+    if versions is None:
+        versions = version_service.get_versions(user_key, PRESET_CACHE_VERSION)
+    year, week, weekday = today.isocalendar()
+    return (f'summary:{user_id}:{versions[user_key][0]}:{versions[PRESET_CACHE_VERSION][0]}:'
+            f'{year}-W{week:02d}-{weekday}')
+
+
+def get_summary(user_id, joined_at=None, timezone=None):
+    """Return the SummaryResult for a user, from the result cache when current.
+
+    The week and streaks are computed for today in the user's time zone.
+    """
+    timezone = timezone or timezone_service.get_user_timezone(user_id)
+    today = timezone_service.local_today(timezone)
+    return get_result_cache().get_or_compute(
+        summary_cache_key(user_id, today),
+        lambda: SummaryEngine(user_id, today=today, joined_at=joined_at, timezone=timezone).compute()
+    )
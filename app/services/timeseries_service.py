@@ -0,0 +1,225 @@
+"""Bucketed time series of a user's practice over any date range.
+
+Dates are truncated to day, week, month or year buckets in SQL (date()
+modifiers on SQLite, date_trunc on PostgreSQL) and counted with a single
+GROUP BY; buckets with no activity are filled in memory. A chart spanning
+several years therefore costs one query.
+
+Totals and the virtue breakdown are read from daily_rollups. The ritual
+breakdown groups ritual_log_entries by ritual. Both are keyed by the user's
+local calendar date.
+"""
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import cast, func
+
+from app import db
+from app.database import dialect_name
+from app.models import DailyRollup, Ritual, RitualLogEntry
+from app.services.rollup_service import VIRTUE_COLUMNS
+
+GRANULARITIES = ('day', 'week', 'month', 'year')
+BREAKDOWNS = ('virtue', 'ritual')
+MAX_BUCKETS = 3660
+
+# Number of buckets shown when the caller gives no start date
+DEFAULT_BUCKETS = {'day': 30, 'week': 8, 'month': 12, 'year': 5}
+
+# SQLite date() modifiers that move a date to the start of its bucket
+SQLITE_MODIFIERS = {
+    'day': (),
+    'week': ('weekday 0', '-6 days'),
+    'month': ('start of month',),
+    'year': ('start of year',),
+}
+
+TOTAL = 'total'
+UNNAMED_RITUAL = 'Unnamed Ritual'
+
+
+@dataclass
+class Series:
+    name: str
+    values: List[float]
+    ritual_id: Optional[int] = None
+
+
+@dataclass
+class TimeSeries:
+    granularity: str
+    start: date
+    end: date
+    buckets: List[date]
+    series: List[Series] = field(default_factory=list)
+
+    def get(self, name):
+        """Return the values of the series called name, or None."""
+        return next((s.values for s in self.series if s.name == name), None)
+
+
+def bucket_start(day, granularity):
+    """First day of the bucket containing day (weeks start on Monday)."""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'year':
+        return day.replace(month=1, day=1)
+    return day
+
+
+def _next_bucket(day, granularity):
+    if granularity == 'week':
+        return day + timedelta(weeks=1)
+    if granularity == 'month':
+        return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+    if granularity == 'year':
+        return date(day.year + 1, 1, 1)
+    return day + timedelta(days=1)
+
+
+def _buckets_back(end, granularity, count):
+    """Start of the bucket count - 1 buckets before the one holding end."""
+    last = bucket_start(end, granularity)
+    if granularity == 'week':
+        return last - timedelta(weeks=count - 1)
+    if granularity == 'month':
+        months = last.year * 12 + last.month - 1 - (count - 1)
+        return date(months // 12, months % 12 + 1, 1)
+    if granularity == 'year':
+        return date(last.year - (count - 1), 1, 1)
+    return last - timedelta(days=count - 1)
+
+
+def bucket_starts(start, end, granularity):
+    """Every bucket start from the bucket holding start to the one holding end."""
+    buckets = []
+    current = bucket_start(start, granularity)
+    while current <= end:
+        buckets.append(current)
+        current = _next_bucket(current, granularity)
+    return buckets
+
+
+def truncate_date(column, granularity, dialect=None):
+    """SQL expression for the first day of column's bucket, typed as a Date."""
+    if (dialect or dialect_name()) == 'sqlite':
+        return func.date(column, *SQLITE_MODIFIERS[granularity], type_=db.Date)
+    return cast(func.date_trunc(granularity, column), db.Date)
+
+
+def _as_date(value):
+    # Drivers hand back a date, a datetime or (SQLite without a typed column) a string
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+def _rollup_series(user_id, start, end, granularity, breakdown):
+    bucket = truncate_date(DailyRollup.day, granularity).label('bucket')
+    columns = [func.sum(DailyRollup.log_count)]
+    if breakdown == 'virtue':
+        columns += [func.sum(getattr(DailyRollup, column)) for column in VIRTUE_COLUMNS.values()]
+    rows = db.session.query(bucket, *columns).filter(
+        DailyRollup.user_id == user_id,
+        DailyRollup.day >= start,
+        DailyRollup.day <= end
+    ).group_by(bucket).all()
+
+    names = [TOTAL] + (list(VIRTUE_COLUMNS) if breakdown == 'virtue' else [])
+    values = {name: {} for name in names}
+    for bucket_day, *sums in rows:
+        for name, value in zip(names, sums):
+            values[name][_as_date(bucket_day)] = value or 0
+    return [(name, None, values[name]) for name in names]
+
+
+def _ritual_series(user_id, start, end, granularity):
+    bucket = truncate_date(RitualLogEntry.local_date, granularity).label('bucket')
+    rows = db.session.query(
+        bucket, RitualLogEntry.ritual_id, Ritual.name, func.count(RitualLogEntry.id)
+    ).outerjoin(
+        Ritual, Ritual.id == RitualLogEntry.ritual_id
+    ).filter(
+        RitualLogEntry.user_id == user_id,
+        RitualLogEntry.local_date >= start,
+        RitualLogEntry.local_date <= end
+    ).group_by(bucket, RitualLogEntry.ritual_id, Ritual.name).all()
+
+    totals = {}
+    by_ritual = {}
+    for bucket_day, ritual_id, name, count in rows:
+        bucket_day = _as_date(bucket_day)
+        totals[bucket_day] = totals.get(bucket_day, 0) + count
+        counts = by_ritual.setdefault(ritual_id, (name or UNNAMED_RITUAL, {}))[1]
+        counts[bucket_day] = count
+
+    # Most practiced rituals first
+    ordered = sorted(by_ritual.items(), key=lambda item: -sum(item[1][1].values()))
+    return [(TOTAL, None, totals)] + [
+        (name, ritual_id, counts) for ritual_id, (name, counts) in ordered
+    ]
+
+
+def get_time_series(user_id, start, end, granularity='week', breakdown=None):
+    """Return a TimeSeries of a user's activity for the inclusive range [start, end].
+
+    The first series is always the log count ('total'). breakdown='virtue'
+    adds one series of virtue scores per virtue; breakdown='ritual' adds one
+    log-count series per ritual practised in the range. Raises ValueError for
+    an unknown granularity or breakdown, or a range with too many buckets.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'granularity must be one of {", ".join(GRANULARITIES)}')
+    if breakdown is not None and breakdown not in BREAKDOWNS:
+        raise ValueError(f'breakdown must be one of {", ".join(BREAKDOWNS)}')
+    if end < start:
+        raise ValueError('end must not be before start')
+
+    buckets = bucket_starts(start, end, granularity)
+    if len(buckets) > MAX_BUCKETS:
+        raise ValueError(f'range covers more than {MAX_BUCKETS} {granularity} buckets')
+
+    if breakdown == 'ritual':
+        raw = _ritual_series(user_id, start, end, granularity)
+    else:
+        raw = _rollup_series(user_id, start, end, granularity, breakdown)
+
+    return TimeSeries(
+        granularity=granularity,
+        start=start,
+        end=end,
+        buckets=buckets,
+        series=[
+            Series(name=name, ritual_id=ritual_id,
+                   values=[values.get(bucket, 0) for bucket in buckets])
+            for name, ritual_id, values in raw
+        ],
+    )
+
+
+def parse_time_series_args(args, today=None):
+    """Turn request args (start, end, granularity, breakdown) into get_time_series() keywords.
+
+    end defaults to today, and start to DEFAULT_BUCKETS buckets before it.
+    Raises ValueError for malformed dates or unknown values.
+    """
+    today = today or datetime.now().date()
+    granularity = args.get('granularity') or 'week'
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'granularity must be one of {", ".join(GRANULARITIES)}')
+    end = datetime.strptime(args['end'], '%Y-%m-%d').date() if args.get('end') else today
+    if args.get('start'):
+        start = datetime.strptime(args['start'], '%Y-%m-%d').date()
+    else:
+        start = _buckets_back(end, granularity, DEFAULT_BUCKETS[granularity])
+    return {
+        'start': start,
+        'end': end,
+        'granularity': granularity,
+        'breakdown': args.get('breakdown') or None,
+    }
@@ -0,0 +1,174 @@
+"""Per-user time zones and local calendar dates.
+
+Timestamps are stored in UTC. Each log and reflection also stores the
+calendar date it was written on in its author's time zone (local_date),
+fixed at write time, so daily rollups, week ranges and streaks work on an
+indexed date column instead of converting timestamps in every query.
+"""
+from datetime import datetime, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError, available_timezones
+
+from sqlalchemy import bindparam, cast, func, or_, update
+
+from app import db
+from app.database import dialect_name, retry_on_busy
+from app.models import Reflection, RitualLogEntry, User
+from app.services import version_service
+
+DEFAULT_TIMEZONE = 'UTC'
+UTC_NAMES = ('UTC', 'Etc/UTC')
+BACKFILL_BATCH_SIZE = 5000
+MODELS = (RitualLogEntry, Reflection)
+
+
+@lru_cache(maxsize=512)
+def get_zone(name):
+    """ZoneInfo for an IANA zone name, falling back to UTC for unknown names."""
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(DEFAULT_TIMEZONE)
+
+
+def is_valid_timezone(name):
+    try:
+        ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError, TypeError):
+        return False
+    return bool(name)
+
+
+@lru_cache(maxsize=1)
+def timezone_choices():
+    """Sorted IANA zone names for the profile form."""
+    return sorted(available_timezones())
+
+
+def local_date(utc_datetime, tz_name):
+    """Calendar date of a naive UTC datetime in the given zone."""
+    return utc_datetime.replace(tzinfo=timezone.utc).astimezone(get_zone(tz_name)).date()
+
+
+def local_today(tz_name, now=None):
+    """Today's date in the given zone."""
+    return local_date(now or datetime.utcnow(), tz_name)
+
+
+def get_user_timezone(user_id):
+    return db.session.query(User.timezone).filter(User.id == user_id).scalar() or DEFAULT_TIMEZONE
+
+
+def _is_utc(tz_name):
+    return tz_name is None or tz_name in UTC_NAMES
+
+
+def _utc_users():
+    return db.select(User.id).where(or_(User.timezone.is_(None), User.timezone.in_(UTC_NAMES)))
+
+
+def _set_based(model, tz_name, where, dialect):
+    """Fill local_date for matching rows in one UPDATE. Returns the row count."""
+    if dialect == 'sqlite':
+        # Only reached for UTC users: SQLite has no time zone database
+        value = func.date(model.created_at)
+    else:
+        value = cast(func.timezone(tz_name, func.timezone('UTC', model.created_at)), db.Date)
+    result = db.session.execute(update(model).where(*where).values(local_date=value))
+    db.session.commit()
+    return result.rowcount
+
+
+def _in_batches(model, user_id, tz_name, recompute):
+    """Fill local_date for one user's rows in id order, converting in Python."""
+    table = model.__table__
+    statement = update(table).where(table.c.id == bindparam('_id'))\
+        .values(local_date=bindparam('_local_date'))
+    updated = 0
+    last_id = 0
+    while True:
+        query = db.session.query(model.id, model.created_at)\
+            .filter(model.user_id == user_id, model.id > last_id)
+        if not recompute:
+            query = query.filter(model.local_date.is_(None))
+        rows = query.order_by(model.id).limit(BACKFILL_BATCH_SIZE).all()
+        if not rows:
+            return updated
+        db.session.execute(statement, [
+            {'_id': row_id, '_local_date': local_date(created_at, tz_name)}
+            for row_id, created_at in rows
+        ])
+        db.session.commit()
+        updated += len(rows)
+        last_id = rows[-1][0]
+
+
+def backfill_local_dates(user_id=None, recompute=False):
+    """Fill local_date on logs and reflections from created_at and the owner's zone.
+
+    By default only rows without a local_date are touched; recompute=True
+    redoes every row (after a time zone change). Commits as it goes and
+    returns the number of rows updated. Daily rollups are derived from
+    local_date, so rebuild them afterwards when dates may have moved.
+    """
+    dialect = dialect_name()
+    users = db.session.query(User.id, User.timezone)
+    if user_id is not None:
+        users = users.filter(User.id == user_id)
+    users = users.all()
+
+    updated = 0
+    for model in MODELS:
+        pending = () if recompute else (model.local_date.is_(None),)
+        if user_id is None:
+            # One statement covers every UTC user on any database
+            updated += _set_based(model, DEFAULT_TIMEZONE,
+                                  (model.user_id.in_(_utc_users()), *pending), dialect)
+        for row_user_id, tz_name in users:
+            if user_id is None and _is_utc(tz_name):
+                continue
+            if dialect != 'sqlite' or _is_utc(tz_name):
+                updated += _set_based(model, get_zone(tz_name).key,
+                                      (model.user_id == row_user_id, *pending), dialect)
+            else:
+                updated += _in_batches(model, row_user_id, tz_name, recompute)
+    return updated
+
+
+@retry_on_busy
+def recompute_local_history(user_id):
+    """Re-date all of a user's logs and reflections in their zone and rebuild rollups.
+
+    Returns the number of rows re-dated.
+    """
+    from app.services import rollup_service
+
+    updated = backfill_local_dates(user_id, recompute=True)
+    rollup_service.rebuild_rollups(user_id)
+    # Summaries cached while the rows were moving are stale now
+    version_service.bump_user_data_version(user_id)
+    db.session.commit()
+    return updated
+
+
+def set_user_timezone(user_id, tz_name, recompute=True):
+    """Change a user's zone and re-date their history in it.
+
+    recompute=False leaves the re-dating to the caller (the profile page
+    queues it as a background job). Raises ValueError for an unknown zone name.
+    """
+    from app.services import auth_service
+
+    if not is_valid_timezone(tz_name):
+        raise ValueError(f'Unknown time zone "{tz_name}".')
+    user = db.session.get(User, user_id)
+    if user.timezone == tz_name:
+        return user
+    user.timezone = tz_name
+    version_service.bump_user_data_version(user_id)
+    auth_service.invalidate_user(user_id)
+    db.session.commit()
+
+    if recompute:
+        recompute_local_history(user_id)
+    return user
@@ -0,0 +1,180 @@
+"""Per-user, per-ritual usage counters.
+
+Each RitualUsage row holds how many logs one user has for one ritual, and
+rows exist only while that count is positive. "Most practiced" and top-N
+rankings read a user's few counter rows instead of grouping their whole log
+history, and checking whether a ritual is still in use is one index probe.
+
+The record_* helpers only stage changes; the calling service commits them
+together with the log entry itself, as with the daily rollups. check_usage()
+compares the counters with the logs and can repair any drift.
+"""
+from collections import Counter
+from dataclasses import dataclass
+
+from sqlalchemy import delete, func, insert, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import Ritual, RitualLogEntry, RitualUsage
+
+DEFAULT_TOP_LIMIT = 5
+MAX_TOP_LIMIT = 50
+
+
+@dataclass
+class UsageDrift:
+    user_id: int
+    ritual_id: int
+    stored: int
+    actual: int
+
+
+def adjust_usage(user_id, ritual_id, count):
+    """Add count (may be negative) to a user's counter for one ritual."""
+    if ritual_id is None or count == 0:
+        return
+    table = RitualUsage.__table__
+    where = (table.c.user_id == user_id, table.c.ritual_id == ritual_id)
+    result = db.session.execute(
+        update(table).where(*where).values(log_count=table.c.log_count + count)
+    )
+    if result.rowcount == 0:
+        if count <= 0:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(table).values(
+                    user_id=user_id, ritual_id=ritual_id, log_count=count
+                ))
+        except IntegrityError:
+            # Another transaction created this counter first; retry as an update
+            adjust_usage(user_id, ritual_id, count)
+    elif count < 0:
+        db.session.execute(delete(table).where(*where, table.c.log_count <= 0))
+
+
+def record_entry_added(entry):
+    """Stage the counter change for a newly created log entry."""
+    adjust_usage(entry.user_id, entry.ritual_id, 1)
+
+
+def record_entries_added(user_id, ritual_ids):
+    """Stage counter changes for many new entries of one user, one statement per ritual."""
+    for ritual_id, count in Counter(ritual_ids).items():
+        adjust_usage(user_id, ritual_id, count)
+
+
+def record_entry_removed(entry):
+    """Stage the counter change for a log entry about to be deleted."""
+    adjust_usage(entry.user_id, entry.ritual_id, -1)
+
+
+def record_entry_changed(entry, old_ritual_id):
+    """Stage the counter changes for a log entry moved to another ritual."""
+    if old_ritual_id == entry.ritual_id:
+        return
+    adjust_usage(entry.user_id, old_ritual_id, -1)
+    adjust_usage(entry.user_id, entry.ritual_id, 1)
+
+
+def top_rituals_statement(user_id, limit):
+    """Select (name, log_count, ritual_id) for a user's most logged rituals."""
+    return db.select(Ritual.name, RitualUsage.log_count, RitualUsage.ritual_id)\
+        .join(Ritual, Ritual.id == RitualUsage.ritual_id)\
+        .where(RitualUsage.user_id == user_id)\
+        .order_by(RitualUsage.log_count.desc(), RitualUsage.ritual_id)\
+        .limit(limit)
+
+
+def get_top_rituals(user_id, limit=DEFAULT_TOP_LIMIT):
+    """Return a user's most practiced rituals as dicts, most logs first."""
+    rows = db.session.execute(top_rituals_statement(user_id, limit)).all()
+    return [
+        {'ritual_id': ritual_id, 'name': name, 'count': count}
+        for name, count, ritual_id in rows
+    ]
+
+
+def get_most_practiced(user_id):
+    """Return {'name', 'count'} for a user's most logged ritual, or None."""
+    top = get_top_rituals(user_id, 1)
+    if not top:
+        return None
+    return {'name': top[0]['name'], 'count': top[0]['count']}
+
+
+def get_usage_counts(user_id):
+    """Return {ritual_id: logs} for every ritual the user has logged."""
+    return dict(db.session.query(RitualUsage.ritual_id, RitualUsage.log_count)
+                .filter(RitualUsage.user_id == user_id))
+
+
+def is_ritual_in_use(ritual_id):
+    """True if any user has logged the ritual."""
+    return db.session.query(
+        db.select(RitualUsage.ritual_id).where(RitualUsage.ritual_id == ritual_id).exists()
+    ).scalar()
+
+
+def _stored_counts(user_id):
+    query = db.session.query(RitualUsage.user_id, RitualUsage.ritual_id, RitualUsage.log_count)
+    if user_id is not None:
+        query = query.filter(RitualUsage.user_id == user_id)
+    return {(row_user_id, ritual_id): count for row_user_id, ritual_id, count in query}
+
+
+def _actual_counts(user_id):
+    query = db.session.query(
+        RitualLogEntry.user_id, RitualLogEntry.ritual_id, func.count(RitualLogEntry.id)
+    ).filter(RitualLogEntry.ritual_id.isnot(None))
+    if user_id is not None:
+        query = query.filter(RitualLogEntry.user_id == user_id)
+    query = query.group_by(RitualLogEntry.user_id, RitualLogEntry.ritual_id)
+    return {(row_user_id, ritual_id): count for row_user_id, ritual_id, count in query}
+
+
+def check_usage(user_id=None, repair=False):
+    """Compare the counters with the logs and return a list of UsageDrift.
+
+    stored is 0 for a missing counter row. With repair=True, wrong or
+    missing counters are rewritten from the logs and stale ones deleted,
+    then the session is committed.
+    """
+    stored = _stored_counts(user_id)
+    actual = _actual_counts(user_id)
+    drift = []
+    for row_user_id, ritual_id in sorted(set(stored) | set(actual)):
+        key = (row_user_id, ritual_id)
+        if stored.get(key, 0) != actual.get(key, 0):
+            drift.append(UsageDrift(row_user_id, ritual_id, stored.get(key, 0), actual.get(key, 0)))
+    if repair and drift:
+        table = RitualUsage.__table__
+        for item in drift:
+            where = (table.c.user_id == item.user_id, table.c.ritual_id == item.ritual_id)
+            if item.actual == 0:
+                db.session.execute(delete(table).where(*where))
+            elif (item.user_id, item.ritual_id) not in stored:
+                db.session.execute(insert(table).values(
+                    user_id=item.user_id, ritual_id=item.ritual_id, log_count=item.actual
+                ))
+            else:
+                db.session.execute(update(table).where(*where).values(log_count=item.actual))
+        db.session.commit()
+    return drift
+
+
+def rebuild_usage(user_id=None):
+    """Stage regenerating the counters from the logs with one INSERT ... SELECT."""
+    delete_stmt = delete(RitualUsage)
+    source = db.select(
+        RitualLogEntry.user_id, RitualLogEntry.ritual_id, func.count(RitualLogEntry.id)
+    ).where(RitualLogEntry.ritual_id.isnot(None))
+    if user_id is not None:
+        delete_stmt = delete_stmt.where(RitualUsage.user_id == user_id)
+        source = source.where(RitualLogEntry.user_id == user_id)
+    db.session.execute(delete_stmt)
+    db.session.execute(insert(RitualUsage).from_select(
+        ['user_id', 'ritual_id', 'log_count'],
+        source.group_by(RitualLogEntry.user_id, RitualLogEntry.ritual_id)
+    ))
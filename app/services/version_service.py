@@ -0,0 +1,79 @@
+"""Shared version stamps for cache invalidation.
+
+Each name (e.g. 'presets', or 'user:<id>' for one user's data) maps to an
+integer in the cache_versions table. Writers bump the version in the same
+transaction as their change; readers in any worker process compare it with
+the version their cached copy was built from.
+"""
+from datetime import datetime
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import CacheVersion
+
+
+def get_version(name):
+    """Return the current version for name (0 if it was never bumped)."""
+    version = db.session.query(CacheVersion.version).filter_by(name=name).scalar()
+    return version or 0
+
+
+def get_versions(*names):
+    """Return {name: (version, updated_at)} for several names in one query.
+
+    Names that were never bumped map to (0, None).
+    """
+    rows = db.session.execute(versions_statement(*names)).all()
+    return versions_from_rows(names, rows)
+
+
+def versions_statement(*names):
+    return db.select(CacheVersion.name, CacheVersion.version, CacheVersion.updated_at)\
+        .where(CacheVersion.name.in_(names))
+
+
+def versions_from_rows(names, rows):
+    versions = {name: (0, None) for name in names}
+    versions.update({name: (version, updated_at) for name, version, updated_at in rows})
+    return versions
+
+
+def user_data_key(user_id):
+    """Version name covering everything a user has logged, written or created."""
+    return f'user:{user_id}'
+
+
+def identity_key(user_id):
+    """Version name bumped when a user's signed-in identity changes (see auth_service)."""
+    return f'identity:{user_id}'
+
+
+def get_user_data_version(user_id):
+    return get_version(user_data_key(user_id))
+
+
+def bump_user_data_version(user_id):
+    """Stage a bump of a user's data version. The caller commits."""
+    bump_version(user_data_key(user_id))
+
+
+def bump_version(name):
+    """Stage an increment of name's version. The caller commits."""
+    now = datetime.utcnow()
+    result = db.session.execute(
+        update(CacheVersion)
+        .where(CacheVersion.name == name)
+        .values(version=CacheVersion.version + 1, updated_at=now)
+    )
+    if result.rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(CacheVersion).values(name=name, version=1, updated_at=now))
+    except IntegrityError:
+        # Another worker inserted the row first; increment it instead
+        db.session.execute(
+            update(CacheVersion)
+            .where(CacheVersion.name == name)
+            .values(version=CacheVersion.version + 1, updated_at=now)
+        )
@@ -0,0 +1,160 @@
+"""The `flask worker` loop: runs queued jobs on a thread or process pool.
+
+The loop claims a job only when a pool slot is free, so queued jobs stay
+claimable by other workers until this one can start them, and hands the job
+id to the pool. Threads share the worker's app and each run in their own app
+context (and so their own database session). Processes are started with
+'spawn' and build their own app with create_app(), which reads the same
+environment, so no connection is ever shared across a fork.
+
+While jobs run, the loop refreshes their heartbeat every HEARTBEAT_SECONDS,
+so a long job whose handler never reports progress is not taken for one
+whose worker died and requeued to run twice.
+"""
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+STALE_CHECK_SECONDS = 60
+
+_process_app = None
+
+
+def _run(job_id):
+    from app.services import job_service
+    try:
+        job_service.run_job(job_id)
+    finally:
+        db.session.remove()
+
+
+def _reap(running):
+    """Drop finished futures from running, logging runners that crashed."""
+    for future in [f for f in running if f.done()]:
+        del running[future]
+        if future.exception() is not None:
+            logger.error('Job runner crashed', exc_info=future.exception())
+
+
+def _init_process():
+    global _process_app
+    from app import create_app
+    _process_app = create_app()
+
+
+def _run_in_process(job_id):
+    with _process_app.app_context():
+        _run(job_id)
+
+
+class Worker:
+    """Claims queued jobs and runs them, concurrency at a time."""
+
+    def __init__(self, app, concurrency=2, processes=False, poll_interval=1.0):
+        self.app = app
+        self.concurrency = concurrency
+        self.processes = processes
+        self.poll_interval = poll_interval
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.stop_event = threading.Event()
+
+    def stop(self):
+        """Stop claiming jobs; run() returns once the running ones finish."""
+        self.stop_event.set()
+
+    def _run_in_thread(self, job_id):
+        with self.app.app_context():
+            _run(job_id)
+
+    def _pool(self):
+        if self.processes:
+            return concurrent.futures.ProcessPoolExecutor(
+                self.concurrency, mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_process
+            )
+        return concurrent.futures.ThreadPoolExecutor(self.concurrency, thread_name_prefix='job')
+
+    def _claim(self):
+        from app.services import job_service
+        with self.app.app_context():
+            try:
+                job = job_service.claim_next(self.name)
+                return job.id if job is not None else None
+            finally:
+                db.session.remove()
+
+    def _heartbeat(self, job_ids):
+        from app.services import job_service
+        with self.app.app_context():
+            try:
+                job_service.heartbeat(job_ids, self.name)
+            finally:
+                db.session.remove()
+
+    def _requeue_stale(self):
+        from app.services import job_service
+        with self.app.app_context():
+            try:
+                count = job_service.requeue_stale()
+            finally:
+                db.session.remove()
+        if count:
+            logger.warning('Requeued %s stale job(s)', count)
+
+    def run(self, drain=False):
+        """Run jobs until stop() is called (or, with drain=True, until the queue is empty).
+
+        Returns the number of jobs started.
+        """
+        from app.services import job_service
+        target = _run_in_process if self.processes else self._run_in_thread
+        running = {}  # future -> job id
+        started = 0
+        next_stale_check = 0.0
+        next_heartbeat = time.monotonic() + job_service.HEARTBEAT_SECONDS
+        with self._pool() as pool:
+            while not self.stop_event.is_set():
+                _reap(running)
+
+                if time.monotonic() >= next_heartbeat:
+                    self._heartbeat(list(running.values()))
+                    next_heartbeat = time.monotonic() + job_service.HEARTBEAT_SECONDS
+
+                if time.monotonic() >= next_stale_check:
+                    self._requeue_stale()
+                    next_stale_check = time.monotonic() + STALE_CHECK_SECONDS
+
+                if len(running) >= self.concurrency:
+                    concurrent.futures.wait(running, timeout=self.poll_interval,
+                                            return_when=concurrent.futures.FIRST_COMPLETED)
+                    continue
+
+                job_id = self._claim()
+                if job_id is None:
+                    if drain and not running:
+                        break
+                    if running:
+                        concurrent.futures.wait(running, timeout=self.poll_interval,
+                                                return_when=concurrent.futures.FIRST_COMPLETED)
+                    else:
+                        self.stop_event.wait(self.poll_interval)
+                    continue
+
+                running[pool.submit(target, job_id)] = job_id
+                started += 1
+
+            # After stop(), keep the heartbeat going while the running jobs finish
+            while running:
+                concurrent.futures.wait(running, timeout=job_service.HEARTBEAT_SECONDS)
+                _reap(running)
+                if running:
+                    self._heartbeat(list(running.values()))
+        return started
@@ -0,0 +1,23 @@
+"""Synthetic data generator and timing harness for the service layer.
+
+    python -m benchmarks.generate --database /tmp/bench.db --users 50 --logs 200000
+    python -m benchmarks.run --database /tmp/bench.db --output results.json
+    python -m benchmarks.run --database /tmp/bench.db --baseline results.json
+"""
+import os
+
+
+def database_url(value):
+    """Accept a SQLAlchemy URL or a plain SQLite file path."""
+    if '://' in value:
+        return value
+    return 'sqlite:///' + os.path.abspath(value)
+
+
+def make_app(database, **config):
+    """Create the app against a benchmark database."""
+    os.environ['DATABASE_URL'] = database_url(database)
+    for key, value in config.items():
+        os.environ[key] = str(value)
+    from app import create_app
+    return create_app()
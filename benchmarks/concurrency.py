@@ -0,0 +1,111 @@
+"""Concurrent write throughput: several processes logging rituals at once.
+
+Each process plays one gunicorn worker: it builds its own app and calls
+log_service.create_log_entry in a loop for its own user. The database is
+copied first, so runs never change the source file. Compare a checkout
+before and after a change with --tree, or journal modes with --journal-mode:
+
+    python -m benchmarks.concurrency --database /tmp/bench.db --workers 8
+    python -m benchmarks.concurrency --database /tmp/bench.db --workers 8 --journal-mode DELETE
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import database_url
+
+PROBE = r'''
+import json, sys, time
+tree, user_id, ritual_id, operations, start_at = sys.argv[1:6]
+sys.path.insert(0, tree)
+from sqlalchemy.exc import OperationalError
+from app import create_app, db
+from app.services import log_service
+app = create_app()
+ok = errors = 0
+with app.app_context():
+    while time.time() < float(start_at):
+        time.sleep(0.001)
+    started = time.time()
+    for i in range(int(operations)):
+        try:
+            log_service.create_log_entry(int(user_id), int(ritual_id), 'self', f'concurrency {i}')
+            ok += 1
+        except OperationalError:
+            db.session.rollback()
+            errors += 1
+print(json.dumps({'ok': ok, 'errors': errors, 'started': started, 'finished': time.time()}))
+'''
+
+
+def run(tree, database, workers, operations, journal_mode=None):
+    workdir = tempfile.mkdtemp(prefix='concurrency-')
+    copy = os.path.join(workdir, 'bench.db')
+    shutil.copyfile(database, copy)
+
+    env = dict(os.environ, DATABASE_URL=database_url(copy))
+    if journal_mode:
+        env['SQLITE_JOURNAL_MODE'] = journal_mode
+
+    import sqlite3
+    conn = sqlite3.connect(copy)
+    if journal_mode:
+        conn.execute(f'PRAGMA journal_mode={journal_mode}')
+    user_ids = [row[0] for row in conn.execute('SELECT id FROM users ORDER BY id LIMIT ?', (workers,))]
+    ritual_id = conn.execute('SELECT MIN(id) FROM rituals WHERE user_id IS NULL').fetchone()[0]
+    conn.close()
+    if len(user_ids) < workers:
+        raise SystemExit(f'Need at least {workers} users in the database.')
+
+    start_at = time.time() + 3.0
+    processes = [
+        subprocess.Popen([sys.executable, '-c', PROBE, os.path.abspath(tree), str(user_id),
+                          str(ritual_id), str(operations), str(start_at)],
+                         env=env, cwd=workdir, stdout=subprocess.PIPE, text=True)
+        for user_id in user_ids
+    ]
+    reports = []
+    for process in processes:
+        output, _ = process.communicate()
+        reports.append(json.loads(output.strip().splitlines()[-1]))
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    wall = max(r['finished'] for r in reports) - min(r['started'] for r in reports)
+    ok = sum(r['ok'] for r in reports)
+    return {
+        'workers': workers,
+        'operations_per_worker': operations,
+        'journal_mode': journal_mode,
+        'committed': ok,
+        'failed': sum(r['errors'] for r in reports),
+        'seconds': wall,
+        'writes_per_second': ok / wall if wall else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', required=True, help='SQLite benchmark database file')
+    parser.add_argument('--tree', default='.', help='checkout to measure (default: this one)')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--operations', type=int, default=200, help='writes per worker')
+    parser.add_argument('--journal-mode', default=None,
+                        help='force a SQLite journal mode (e.g. DELETE to compare with WAL)')
+    parser.add_argument('--output', help='write JSON results to this file')
+    args = parser.parse_args(argv)
+
+    result = run(args.tree, args.database, args.workers, args.operations, args.journal_mode)
+    for key, value in result.items():
+        print(f'{key:<22} {value:.1f}' if isinstance(value, float) else f'{key:<22} {value}')
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Fill a database with synthetic users, rituals, logs and reflections.
+
+Rows are written with bulk Core inserts in chunks and the daily rollups,
+usage counters and community aggregates are rebuilt once at the end, so a
+million logs take minutes rather than hours.
+Every generated user has the password BENCH_PASSWORD.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+from benchmarks import make_app
+
+BENCH_PASSWORD = 'benchpass'
+USERNAME_PREFIX = 'bench'
+CHUNK_SIZE = 5000
+CONTEXTS = ['family', 'teacher', 'classmate', 'friend', 'stranger', 'self', 'community']
+VIRTUES = ['Ren', 'Yi', 'Li', 'Zhi']
+WORDS = ('pause breath listen elder greeting patience kindness study promise anger '
+         'respect family teacher friend noticed chose quietly again today small').split()
+
+
+def _sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def _timestamps(rng, count, days, now):
+    """Random timestamps over the last `days` days, oldest first."""
+    span = days * 86400
+    return sorted(now - timedelta(seconds=rng.randrange(span)) for _ in range(count))
+
+
+def _insert_chunks(db, model, rows):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(insert(model), rows[start:start + CHUNK_SIZE])
+    db.session.commit()
+
+
+def generate(app, users=20, custom_rituals=3, logs=20000, reflections=2000, days=365,
+             seed=1, echo=print):
+    """Add synthetic data to the app's database. Returns the row counts added."""
+    from app import db, migrations
+    from app.models import Reflection, Ritual, RitualLogEntry, User
+    from app.seed import seed_preset_rituals
+    from app.services import community_service, rollup_service, usage_service
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    with app.app_context():
+        migrations.upgrade()
+        seed_preset_rituals()
+        first = db.session.query(db.func.count(User.id)).scalar() + 1
+        password_hash = generate_password_hash(BENCH_PASSWORD)
+        _insert_chunks(db, User, [
+            {'username': f'{USERNAME_PREFIX}{first + i}', 'password_hash': password_hash,
+             'created_at': now - timedelta(days=days)}
+            for i in range(users)
+        ])
+        user_ids = [row[0] for row in db.session.query(User.id)
+                    .filter(User.username.like(f'{USERNAME_PREFIX}%'))
+                    .order_by(User.id.desc()).limit(users)]
+        echo(f'users: {len(user_ids)}')
+
+        _insert_chunks(db, Ritual, [
+            {'name': f'Custom ritual {n + 1}', 'description': _sentence(rng),
+             'primary_category': rng.choice(VIRTUES), 'secondary_category': rng.choice(VIRTUES),
+             'user_id': user_id, 'created_at': now - timedelta(days=days)}
+            for user_id in user_ids for n in range(custom_rituals)
+        ])
+        preset_ids = [row[0] for row in db.session.query(Ritual.id).filter(Ritual.user_id.is_(None))]
+        rituals_by_user = {user_id: list(preset_ids) for user_id in user_ids}
+        for ritual_id, user_id in db.session.query(Ritual.id, Ritual.user_id)\
+                .filter(Ritual.user_id.in_(user_ids)):
+            rituals_by_user[user_id].append(ritual_id)
+        echo(f'custom rituals: {len(user_ids) * custom_rituals}')
+
+        # Split logs unevenly so the first user is the heavy account the
+        # benchmark harness measures.
+        weights = [1.0 / (rank + 1) for rank in range(len(user_ids))]
+        total_weight = sum(weights)
+        started = time.perf_counter()
+        written = 0
+        for user_id, weight in zip(reversed(user_ids), weights):
+            count = int(logs * weight / total_weight)
+            rows = [
+                {'user_id': user_id, 'ritual_id': rng.choice(rituals_by_user[user_id]),
+                 'context': rng.choice(CONTEXTS), 'reflection': _sentence(rng), 'created_at': ts,
+                 'local_date': ts.date()}
+                for ts in _timestamps(rng, count, days, now)
+            ]
+            _insert_chunks(db, RitualLogEntry, rows)
+            written += count
+            echo(f'logs: {written}/{logs} ({time.perf_counter() - started:.1f}s)')
+
+        _insert_chunks(db, Reflection, [
+            {'user_id': rng.choice(user_ids), 'reflection_text': _sentence(rng, 30), 'created_at': ts,
+             'local_date': ts.date()}
+            for ts in _timestamps(rng, reflections, days, now)
+        ])
+        echo(f'reflections: {reflections}')
+
+        usage_service.rebuild_usage()
+        rollup_rows = rollup_service.rebuild_rollups()
+        echo(f'rollup rows: {rollup_rows}')
+        community_service.refresh_community_stats(full=True)
+
+    return {'users': len(user_ids), 'custom_rituals': len(user_ids) * custom_rituals,
+            'logs': written, 'reflections': reflections}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', required=True, help='SQLite file path or SQLAlchemy URL')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--custom-rituals', type=int, default=3, help='per user')
+    parser.add_argument('--logs', type=int, default=20000, help='total across all users')
+    parser.add_argument('--reflections', type=int, default=2000, help='total across all users')
+    parser.add_argument('--days', type=int, default=365, help='history length')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    app = make_app(args.database)
+    counts = generate(app, users=args.users, custom_rituals=args.custom_rituals, logs=args.logs,
+                      reflections=args.reflections, days=args.days, seed=args.seed,
+                      echo=lambda message: print(message, file=sys.stderr))
+    print(counts)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,661 @@
+"""Time the public service functions and main routes against a benchmark database.
+
+Results are written as JSON (--output) and can be compared with an earlier
+run (--baseline); a benchmark whose median grew by more than --threshold is
+reported as a regression.
+"""
+import argparse
+import inspect
+import io
+import json
+import pkgutil
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from benchmarks import make_app
+from benchmarks.generate import BENCH_PASSWORD
+
+MARKER = 'benchmark-run'
+
+
+@dataclass
+class Case:
+    """One timed call. setup's return value is passed to fn and teardown."""
+    name: str
+    fn: Callable
+    setup: Optional[Callable] = None
+    teardown: Optional[Callable] = None
+
+
+class Context:
+    """Ids the cases run against, picked from the benchmark database."""
+
+    def __init__(self, app):
+        from app import db
+        from app.models import Reflection, Ritual, RitualLogEntry, User
+
+        with app.app_context():
+            self.user_id = db.session.query(RitualLogEntry.user_id)\
+                .group_by(RitualLogEntry.user_id)\
+                .order_by(db.func.count(RitualLogEntry.id).desc()).limit(1).scalar()
+            if self.user_id is None:
+                raise SystemExit('The database has no logs; run benchmarks.generate first.')
+            user = db.session.get(User, self.user_id)
+            self.username = user.username
+            self.joined_at = user.created_at
+            self.entry_id = db.session.query(db.func.max(RitualLogEntry.id))\
+                .filter(RitualLogEntry.user_id == self.user_id).scalar()
+            self.ritual_id = db.session.query(db.func.min(Ritual.id))\
+                .filter(Ritual.user_id == self.user_id).scalar()
+            self.preset_id = db.session.query(db.func.min(Ritual.id))\
+                .filter(Ritual.user_id.is_(None)).scalar()
+            self.reflection_id = db.session.query(db.func.max(Reflection.id))\
+                .filter(Reflection.user_id == self.user_id).scalar()
+            self.counts = {
+                'users': User.query.count(),
+                'rituals': Ritual.query.count(),
+                'logs': RitualLogEntry.query.count(),
+                'reflections': Reflection.query.count(),
+                'bench_user_logs': RitualLogEntry.query.filter_by(user_id=self.user_id).count(),
+            }
+        self.today = datetime.now().date()
+        self.sequence = 0
+
+    def unique(self, prefix):
+        self.sequence += 1
+        return f'{prefix}{self.sequence}-{int(time.time())}'
+
+
+def _rollback(state=None, result=None):
+    from app import db
+    db.session.rollback()
+
+
+def _drain(iterable):
+    for _ in iterable:
+        pass
+
+
+def service_cases(ctx):
+    """Cases for every public function in app/services."""
+    from app import db
+    from app.models import RitualLogEntry, User
+    from app.models import Job
+    from app.services import (account_service, activity_service, auth_service, community_service,
+                              export_service, import_service, job_service, log_service, pagination,
+                              reflection_service, ritual_service, rollup_service, search_service,
+                              summary_engine, summary_service, timeseries_service, timezone_service,
+                              usage_service, version_service)
+
+    uid = ctx.user_id
+    week_start = ctx.today - timedelta(days=ctx.today.weekday())
+    two_years_ago = ctx.today - timedelta(days=730)
+
+    def new_entry():
+        return log_service.create_log_entry(uid, ctx.preset_id, 'self', MARKER)
+
+    def new_ritual():
+        return ritual_service.create_custom_ritual(uid, ctx.unique('bench ritual '), MARKER, 'Ren', 'Li')
+
+    def delete_user(user, result=None):
+        db.session.rollback()
+        User.query.filter_by(id=user.id if user else result.id).delete()
+        db.session.commit()
+
+    def import_payload():
+        lines = [json.dumps({'created_at': f'{ctx.today}T12:00:00', 'ritual_id': ctx.preset_id,
+                             'reflection': MARKER}) for _ in range(1000)]
+        return io.BytesIO('\n'.join(lines).encode())
+
+    def remove_imported(state, result):
+        RitualLogEntry.query.filter_by(user_id=uid, reflection=MARKER).delete()
+        db.session.commit()
+        rollup_service.rebuild_rollups(uid)
+        usage_service.check_usage(uid, repair=True)
+
+    def logs_query():
+        return RitualLogEntry.query.filter_by(user_id=uid)
+
+    def new_job(priority=0, dedup_key=None):
+        # Above anything a real queue would hold, so claim_next picks this job
+        return job_service.enqueue('refresh_community_stats', {}, priority=priority + 1000,
+                                   dedup_key=dedup_key)
+
+    def claimed_job():
+        new_job()
+        return job_service.claim_next(MARKER)
+
+    def delete_jobs(state=None, result=None):
+        db.session.rollback()
+        Job.query.filter(db.or_(Job.worker == MARKER, Job.priority >= 1000)).delete()
+        db.session.commit()
+
+    scratch_user = lambda: auth_service.create_user(ctx.unique('scratch'), BENCH_PASSWORD)
+    first_page = lambda: log_service.get_user_ritual_logs_page(uid, per_page=10)
+
+    def user_with_history():
+        user = scratch_user()
+        import_service.import_file(user.id, import_payload(), 'jsonl')
+        return user
+
+    def user_with_job():
+        user = scratch_user()
+        job_service.enqueue('refresh_community_stats', {}, user_id=user.id)
+        return user
+
+    return [
+        # account_service
+        Case('account_service.close_account',
+             lambda user: account_service.close_account(user.id, BENCH_PASSWORD),
+             setup=scratch_user, teardown=delete_user),
+        Case('account_service.count_account_rows',
+             lambda _: account_service.count_account_rows(uid)),
+        Case('account_service.delete_account[1000 logs]',
+             lambda user: account_service.delete_account(user.id), setup=user_with_history),
+
+        # activity_service (mark/rebuild only stage changes; roll them back)
+        Case('activity_service.get_activity', lambda _: activity_service.get_activity(uid)),
+        Case('activity_service.mark_day',
+             lambda _: activity_service.mark_day(uid, ctx.today, True), teardown=_rollback),
+        Case('activity_service.rebuild_bitmaps[user]',
+             lambda _: activity_service.rebuild_bitmaps(uid), teardown=_rollback),
+        Case('activity_service.get_heatmap[3y]',
+             lambda _: activity_service.get_heatmap(uid, ctx.today.year - 2, ctx.today.year)),
+        Case('activity_service.heatmap_weeks',
+             lambda activity: activity_service.heatmap_weeks(activity, ctx.today.year),
+             setup=lambda: activity_service.get_activity(uid)),
+
+        # auth_service
+        Case('auth_service.load_user_identity', lambda _: auth_service.load_user_identity(f'{uid}:1'),
+             setup=lambda: auth_service.invalidate_user(uid), teardown=_rollback),
+        Case('auth_service.invalidate_user', lambda _: auth_service.invalidate_user(uid),
+             teardown=_rollback),
+        Case('auth_service.validate_registration_data',
+             lambda _: auth_service.validate_registration_data('someone', 'secret1', 'secret1')),
+        Case('auth_service.check_user_exists', lambda _: auth_service.check_user_exists(ctx.username)),
+        Case('auth_service.create_user',
+             lambda name: auth_service.create_user(name, BENCH_PASSWORD),
+             setup=lambda: ctx.unique('scratch'),
+             teardown=lambda name, user: delete_user(None, user)),
+        Case('auth_service.authenticate_user',
+             lambda _: auth_service.authenticate_user(ctx.username, BENCH_PASSWORD)),
+        Case('auth_service.change_password',
+             lambda user: auth_service.change_password(user.id, BENCH_PASSWORD, BENCH_PASSWORD,
+                                                       BENCH_PASSWORD),
+             setup=scratch_user, teardown=delete_user),
+
+        # community_service
+        Case('community_service.refresh_community_stats',
+             lambda _: community_service.refresh_community_stats()),
+        Case('community_service.refresh_community_stats[full]',
+             lambda _: community_service.refresh_community_stats(full=True)),
+        Case('community_service.get_community_stats',
+             lambda _: community_service.get_community_stats(week_start)),
+
+        # export_service
+        Case('export_service.parse_date_range',
+             lambda _: export_service.parse_date_range('2024-01-01', '2024-12-31')),
+        Case('export_service.generate_export[logs.csv]',
+             lambda _: _drain(export_service.generate_export('logs', 'csv', uid))),
+        Case('export_service.generate_export[reflections.ndjson]',
+             lambda _: _drain(export_service.generate_export('reflections', 'ndjson', uid))),
+        Case('export_service.export_filename', lambda _: export_service.export_filename('logs', 'csv')),
+
+        # import_service
+        Case('import_service.detect_format', lambda _: import_service.detect_format('data.jsonl')),
+        Case('import_service.import_file[1000 logs]',
+             lambda stream: import_service.import_file(uid, stream, 'jsonl'),
+             setup=import_payload, teardown=remove_imported),
+
+        # job_service
+        Case('job_service.handler',
+             lambda _: job_service.handler(MARKER)(lambda job: None),
+             teardown=lambda *_: job_service.HANDLERS.pop(MARKER, None)),
+        Case('job_service.queue_enabled', lambda _: job_service.queue_enabled()),
+        Case('job_service.enqueue', lambda _: new_job(), teardown=delete_jobs),
+        Case('job_service.enqueue[dedup hit]', lambda _: new_job(dedup_key=MARKER),
+             setup=lambda: new_job(dedup_key=MARKER), teardown=delete_jobs),
+        Case('job_service.get_job', lambda job: job_service.get_job(job.id, uid),
+             setup=new_job, teardown=delete_jobs),
+        Case('job_service.claim_next', lambda _: job_service.claim_next(MARKER),
+             setup=new_job, teardown=delete_jobs),
+        Case('job_service.report_progress',
+             lambda job: job_service.report_progress(job, rows_read=1000),
+             setup=claimed_job, teardown=delete_jobs),
+        Case('job_service.heartbeat', lambda job: job_service.heartbeat([job.id], MARKER),
+             setup=claimed_job, teardown=delete_jobs),
+        Case('job_service.run_job', lambda job: job_service.run_job(job.id),
+             setup=claimed_job, teardown=delete_jobs),
+        Case('job_service.requeue_stale', lambda _: job_service.requeue_stale()),
+        Case('job_service.prune_finished', lambda _: job_service.prune_finished()),
+        Case('job_service.delete_user_jobs', lambda user: job_service.delete_user_jobs(user.id),
+             setup=user_with_job, teardown=delete_user),
+
+        # log_service
+        Case('log_service.create_log_entry', lambda _: new_entry(),
+             teardown=lambda _, entry: log_service.delete_log_entry(entry)),
+        Case('log_service.get_user_ritual_logs', lambda _: log_service.get_user_ritual_logs(uid)),
+        Case('log_service.get_user_ritual_logs[limit=20]',
+             lambda _: log_service.get_user_ritual_logs(uid, limit=20)),
+        Case('log_service.get_user_ritual_logs_paginated[page=1]',
+             lambda _: log_service.get_user_ritual_logs_paginated(uid, page=1).items),
+        Case('log_service.get_user_ritual_logs_paginated[page=50]',
+             lambda _: log_service.get_user_ritual_logs_paginated(uid, page=50).items),
+        Case('log_service.get_user_ritual_logs_page[first]', lambda _: first_page()),
+        Case('log_service.get_user_ritual_logs_page[cursor]',
+             lambda cursor: log_service.get_user_ritual_logs_page(uid, cursor=cursor),
+             setup=lambda: first_page().next_cursor),
+        Case('log_service.get_user_logs_for_period[week]',
+             lambda _: log_service.get_user_logs_for_period(uid, week_start, ctx.today)),
+        Case('log_service.get_log_entry_by_id', lambda _: log_service.get_log_entry_by_id(ctx.entry_id)),
+        Case('log_service.update_log_entry',
+             lambda entry: log_service.update_log_entry(entry, ctx.ritual_id, 'friend', MARKER),
+             setup=new_entry, teardown=lambda entry, _: log_service.delete_log_entry(entry)),
+        Case('log_service.delete_log_entry', lambda entry: log_service.delete_log_entry(entry),
+             setup=new_entry),
+        Case('log_service.can_user_modify_log',
+             lambda entry: log_service.can_user_modify_log(entry, uid),
+             setup=lambda: log_service.get_log_entry_by_id(ctx.entry_id)),
+
+        # pagination
+        Case('pagination.encode_cursor',
+             lambda entry: pagination.encode_cursor(entry, 'n'),
+             setup=lambda: log_service.get_log_entry_by_id(ctx.entry_id)),
+        Case('pagination.decode_cursor', lambda cursor: pagination.decode_cursor(cursor),
+             setup=lambda: first_page().next_cursor),
+        Case('pagination.encode_token', lambda _: pagination.encode_token([0.5, 1, 42])),
+        Case('pagination.decode_token', lambda token: pagination.decode_token(token),
+             setup=lambda: pagination.encode_token([0.5, 1, 42])),
+        Case('pagination.paginate_keyset',
+             lambda _: pagination.paginate_keyset(logs_query(), RitualLogEntry).items),
+
+        # reflection_service
+        Case('reflection_service.create_reflection',
+             lambda _: reflection_service.create_reflection(uid, MARKER),
+             teardown=lambda _, r: reflection_service.delete_reflection(r.id, uid)),
+        Case('reflection_service.get_user_reflections',
+             lambda _: reflection_service.get_user_reflections(uid)),
+        Case('reflection_service.get_user_reflections_paginated',
+             lambda _: reflection_service.get_user_reflections_paginated(uid).items),
+        Case('reflection_service.get_user_reflections_page',
+             lambda _: reflection_service.get_user_reflections_page(uid).items),
+        Case('reflection_service.get_reflection_count',
+             lambda _: reflection_service.get_reflection_count(uid)),
+        Case('reflection_service.delete_reflection',
+             lambda r: reflection_service.delete_reflection(r.id, uid),
+             setup=lambda: reflection_service.create_reflection(uid, MARKER)),
+
+        # ritual_service
+        Case('ritual_service.get_available_rituals',
+             lambda _: ritual_service.get_available_rituals(uid)),
+        Case('ritual_service.get_preset_rituals', lambda _: ritual_service.get_preset_rituals()),
+        Case('ritual_service.invalidate_preset_cache',
+             lambda _: ritual_service.invalidate_preset_cache(), teardown=_rollback),
+        Case('ritual_service.get_user_custom_rituals',
+             lambda _: ritual_service.get_user_custom_rituals(uid)),
+        Case('ritual_service.get_ritual_by_id', lambda _: ritual_service.get_ritual_by_id(ctx.ritual_id)),
+        Case('ritual_service.create_custom_ritual', lambda _: new_ritual(),
+             teardown=lambda _, ritual: ritual_service.delete_custom_ritual(ritual)),
+        Case('ritual_service.update_custom_ritual',
+             lambda ritual: ritual_service.update_custom_ritual(ritual, ritual.name, MARKER, 'Yi', 'Zhi'),
+             setup=new_ritual, teardown=lambda ritual, _: ritual_service.delete_custom_ritual(ritual)),
+        Case('ritual_service.delete_custom_ritual',
+             lambda ritual: ritual_service.delete_custom_ritual(ritual), setup=new_ritual),
+        Case('ritual_service.can_user_modify_ritual',
+             lambda ritual: ritual_service.can_user_modify_ritual(ritual, uid),
+             setup=lambda: ritual_service.get_ritual_by_id(ctx.ritual_id)),
+
+        # rollup_service (the record_* hooks only stage changes; roll them back)
+        Case('rollup_service.virtue_points', lambda _: rollup_service.virtue_points('Ren', 'Li')),
+        Case('rollup_service.adjust_day',
+             lambda _: rollup_service.adjust_day(uid, ctx.today, 1, {'ren_score': 1.0}),
+             teardown=_rollback),
+        Case('rollup_service.record_entry_added',
+             lambda entry: rollup_service.record_entry_added(entry),
+             setup=lambda: log_service.get_log_entry_by_id(ctx.entry_id), teardown=_rollback),
+        Case('rollup_service.record_entries_added[1000]',
+             lambda rows: rollup_service.record_entries_added(uid, rows),
+             setup=lambda: [((datetime.now() - timedelta(hours=i)).date(), ctx.preset_id)
+                            for i in range(1000)],
+             teardown=_rollback),
+        Case('rollup_service.record_entry_removed',
+             lambda entry: rollup_service.record_entry_removed(entry),
+             setup=lambda: log_service.get_log_entry_by_id(ctx.entry_id), teardown=_rollback),
+        Case('rollup_service.record_entry_changed',
+             lambda entry: rollup_service.record_entry_changed(entry, ctx.ritual_id),
+             setup=lambda: log_service.get_log_entry_by_id(ctx.entry_id), teardown=_rollback),
+        Case('rollup_service.record_ritual_recategorized',
+             lambda ritual: rollup_service.record_ritual_recategorized(ritual, 'Yi', None),
+             setup=lambda: ritual_service.get_ritual_by_id(ctx.ritual_id), teardown=_rollback),
+        Case('rollup_service.rebuild_rollups[user]', lambda _: rollup_service.rebuild_rollups(uid)),
+
+        # search_service
+        Case('search_service.install_search_indexes',
+             lambda _: search_service.install_search_indexes(), teardown=_rollback),
+        Case('search_service.rebuild_search_indexes',
+             lambda _: search_service.rebuild_search_indexes()),
+        Case('search_service.parse_search_args',
+             lambda _: search_service.parse_search_args({'q': 'patience', 'start': '2024-01-01'})),
+        Case('search_service.search', lambda _: search_service.search(uid, 'patience').items),
+        Case('search_service.search[prefix, virtue]',
+             lambda _: search_service.search(uid, 'elder gre', virtue='Ren').items),
+        Case('search_service.search[cursor]',
+             lambda cursor: search_service.search(uid, 'patience', cursor=cursor).items,
+             setup=lambda: search_service.search(uid, 'patience').next_cursor),
+        Case('search_service.highlight',
+             lambda _: search_service.highlight('a \ue000match\ue001 <b>')),
+
+        # summary_engine
+        Case('summary_engine.SummaryEngine.compute',
+             lambda _: summary_engine.SummaryEngine(uid, joined_at=ctx.joined_at).compute()),
+        Case('summary_engine.summary_cache_key', lambda _: summary_engine.summary_cache_key(uid)),
+        Case('summary_engine.get_summary',
+             lambda _: summary_engine.get_summary(uid, joined_at=ctx.joined_at)),
+
+        # summary_service
+        Case('summary_service.get_week_date_range', lambda _: summary_service.get_week_date_range()),
+        Case('summary_service.calculate_daily_counts',
+             lambda _: summary_service.calculate_daily_counts(uid)),
+        Case('summary_service.calculate_virtue_metrics',
+             lambda _: summary_service.calculate_virtue_metrics(uid)),
+        Case('summary_service.calculate_all_time_virtue_metrics',
+             lambda _: summary_service.calculate_all_time_virtue_metrics(uid)),
+        Case('summary_service.get_total_rituals_this_week',
+             lambda _: summary_service.get_total_rituals_this_week(uid)),
+        Case('summary_service.get_total_rituals_last_week',
+             lambda _: summary_service.get_total_rituals_last_week(uid)),
+        Case('summary_service.get_days_practiced_this_week',
+             lambda _: summary_service.get_days_practiced_this_week(uid)),
+        Case('summary_service.get_all_time_stats', lambda _: summary_service.get_all_time_stats(uid)),
+        Case('summary_service.get_weekly_trend', lambda _: summary_service.get_weekly_trend(uid)),
+        Case('summary_service.calculate_longest_streak',
+             lambda _: summary_service.calculate_longest_streak(uid)),
+        Case('summary_service.calculate_current_streak',
+             lambda _: summary_service.calculate_current_streak(uid)),
+
+        # timeseries_service
+        Case('timeseries_service.bucket_start',
+             lambda _: timeseries_service.bucket_start(ctx.today, 'month')),
+        Case('timeseries_service.bucket_starts[2y days]',
+             lambda _: timeseries_service.bucket_starts(two_years_ago, ctx.today, 'day')),
+        Case('timeseries_service.truncate_date',
+             lambda _: timeseries_service.truncate_date(RitualLogEntry.created_at, 'week')),
+        Case('timeseries_service.get_time_series[2y weeks]',
+             lambda _: timeseries_service.get_time_series(uid, two_years_ago, ctx.today, 'week')),
+        Case('timeseries_service.get_time_series[2y days, virtue]',
+             lambda _: timeseries_service.get_time_series(uid, two_years_ago, ctx.today, 'day', 'virtue')),
+        Case('timeseries_service.get_time_series[2y months, ritual]',
+             lambda _: timeseries_service.get_time_series(uid, two_years_ago, ctx.today, 'month', 'ritual')),
+        Case('timeseries_service.parse_time_series_args',
+             lambda _: timeseries_service.parse_time_series_args({'granularity': 'month'})),
+
+        # timezone_service
+        Case('timezone_service.get_zone', lambda _: timezone_service.get_zone('America/New_York')),
+        Case('timezone_service.is_valid_timezone',
+             lambda _: timezone_service.is_valid_timezone('Asia/Kolkata')),
+        Case('timezone_service.timezone_choices', lambda _: timezone_service.timezone_choices()),
+        Case('timezone_service.local_date',
+             lambda _: timezone_service.local_date(datetime.utcnow(), 'Asia/Tokyo')),
+        Case('timezone_service.local_today', lambda _: timezone_service.local_today('Europe/Berlin')),
+        Case('timezone_service.get_user_timezone', lambda _: timezone_service.get_user_timezone(uid)),
+        Case('timezone_service.backfill_local_dates[user]',
+             lambda _: timezone_service.backfill_local_dates(uid)),
+        Case('timezone_service.backfill_local_dates[user, recompute]',
+             lambda _: timezone_service.backfill_local_dates(uid, recompute=True)),
+        Case('timezone_service.set_user_timezone',
+             lambda user: timezone_service.set_user_timezone(user.id, 'Pacific/Auckland'),
+             setup=scratch_user, teardown=delete_user),
+        Case('timezone_service.recompute_local_history[user]',
+             lambda _: timezone_service.recompute_local_history(uid)),
+
+        # usage_service (record/rebuild only stage changes; roll them back)
+        Case('usage_service.adjust_usage',
+             lambda _: usage_service.adjust_usage(uid, ctx.preset_id, 1), teardown=_rollback),
+        Case('usage_service.record_entry_added',
+             lambda entry: usage_service.record_entry_added(entry),
+             setup=lambda: log_service.get_log_entry_by_id(ctx.entry_id), teardown=_rollback),
+        Case('usage_service.record_entries_added[1000]',
+             lambda ritual_ids: usage_service.record_entries_added(uid, ritual_ids),
+             setup=lambda: [ctx.preset_id] * 1000, teardown=_rollback),
+        Case('usage_service.record_entry_removed',
+             lambda entry: usage_service.record_entry_removed(entry),
+             setup=lambda: log_service.get_log_entry_by_id(ctx.entry_id), teardown=_rollback),
+        Case('usage_service.record_entry_changed',
+             lambda entry: usage_service.record_entry_changed(entry, ctx.preset_id + 1),
+             setup=lambda: log_service.get_log_entry_by_id(ctx.entry_id), teardown=_rollback),
+        Case('usage_service.top_rituals_statement',
+             lambda _: usage_service.top_rituals_statement(uid, 5)),
+        Case('usage_service.get_top_rituals', lambda _: usage_service.get_top_rituals(uid)),
+        Case('usage_service.get_most_practiced', lambda _: usage_service.get_most_practiced(uid)),
+        Case('usage_service.is_ritual_in_use',
+             lambda _: usage_service.is_ritual_in_use(ctx.preset_id)),
+        Case('usage_service.check_usage[user]', lambda _: usage_service.check_usage(uid)),
+        Case('usage_service.check_usage[all]', lambda _: usage_service.check_usage()),
+        Case('usage_service.rebuild_usage[user]',
+             lambda _: usage_service.rebuild_usage(uid), teardown=_rollback),
+
+        # version_service (bumps only stage changes; roll them back)
+        Case('version_service.get_version', lambda _: version_service.get_version('presets')),
+        Case('version_service.get_versions',
+             lambda _: version_service.get_versions(version_service.user_data_key(uid), 'presets')),
+        Case('version_service.user_data_key', lambda _: version_service.user_data_key(uid)),
+        Case('version_service.identity_key', lambda _: version_service.identity_key(uid)),
+        Case('version_service.get_user_data_version',
+             lambda _: version_service.get_user_data_version(uid)),
+        Case('version_service.bump_user_data_version',
+             lambda _: version_service.bump_user_data_version(uid), teardown=_rollback),
+        Case('version_service.bump_version',
+             lambda _: version_service.bump_version('benchmark'), teardown=_rollback),
+        Case('version_service.versions_statement',
+             lambda _: version_service.versions_statement('presets')),
+        Case('version_service.versions_from_rows',
+             lambda _: version_service.versions_from_rows(('presets',), [('presets', 3, None)])),
+
+        # cache statistics
+        Case('auth_service.identity_cache_stats', lambda _: auth_service.identity_cache_stats()),
+        Case('ritual_service.preset_cache_stats', lambda _: ritual_service.preset_cache_stats()),
+        Case('pagination.keyset_plan', lambda _: pagination.keyset_plan(RitualLogEntry, page=3)),
+        Case('pagination.build_page',
+             lambda rows: pagination.build_page(rows, 10, 0, None),
+             setup=lambda: log_service.get_user_ritual_logs(uid, limit=11)),
+    ]
+
+
+def async_cases(ctx):
+    """Cases for the async read path (only when ASYNC_READS is on)."""
+    from app.services import async_reads
+
+    uid = ctx.user_id
+    return [
+        Case('async_reads.get_summary', lambda _: async_reads.get_summary(uid, ctx.joined_at)),
+        Case('async_reads.get_summary_page', lambda _: async_reads.get_summary_page(uid, ctx.joined_at)),
+        Case('async_reads.get_rituals_page', lambda _: async_reads.get_rituals_page(uid)),
+        Case('async_reads.get_available_rituals', lambda _: async_reads.get_available_rituals(uid)),
+        Case('async_reads.get_user_ritual_logs_page',
+             lambda _: async_reads.get_user_ritual_logs_page(uid)),
+        Case('async_reads.get_user_reflections_page',
+             lambda _: async_reads.get_user_reflections_page(uid)),
+    ]
+
+
+ROUTES = [
+    '/',
+    '/rituals',
+    '/rituals?page=50',
+    '/my-rituals',
+    '/summary',
+    '/profile',
+    '/import',
+    '/export/logs.csv',
+    '/search?q=patience',
+    '/api/v1/rituals',
+    '/api/v1/logs',
+    '/api/v1/reflections',
+    '/api/v1/summary',
+    '/api/v1/search?q=patience',
+    '/api/v1/timeseries?granularity=month&breakdown=virtue',
+    '/api/v1/heatmap?years=3',
+    '/api/v1/rituals/top',
+    '/api/v1/community',
+]
+
+
+def route_cases(app, ctx):
+    """GET cases for the main pages, through a logged-in test client."""
+    client = app.test_client()
+    response = client.post('/login', data={'username': ctx.username, 'password': BENCH_PASSWORD})
+    if response.status_code != 302:
+        raise SystemExit(f'Could not log in as {ctx.username}.')
+
+    def get(path):
+        response = client.get(path)
+        response.get_data()
+        if response.status_code != 200:
+            raise RuntimeError(f'GET {path} returned {response.status_code}')
+        return response
+
+    return [Case(f'GET {path}', lambda _, path=path: get(path)) for path in ROUTES]
+
+
+def uncovered_functions(cases, skip=()):
+    """Public functions in app/services that no case name mentions."""
+    import app.services as services
+
+    covered = {case.name.split('[')[0] for case in cases}
+    missing = []
+    for module_info in pkgutil.iter_modules(services.__path__):
+        if module_info.name in skip:
+            continue
+        module = __import__(f'app.services.{module_info.name}', fromlist=['_'])
+        for name, obj in inspect.getmembers(module, inspect.isfunction):
+            if name.startswith('_') or obj.__module__ != module.__name__:
+                continue
+            if f'{module_info.name}.{name}' not in covered:
+                missing.append(f'{module_info.name}.{name}')
+    return missing
+
+
+def time_case(app, case, repeats, warmup):
+    """Run a case warmup + repeats times, each in a fresh app context."""
+    samples = []
+    for attempt in range(warmup + repeats):
+        with app.app_context():
+            state = case.setup() if case.setup else None
+            started = time.perf_counter()
+            result = case.fn(state)
+            elapsed = time.perf_counter() - started
+            if case.teardown:
+                case.teardown(state, result)
+        if attempt >= warmup:
+            samples.append(elapsed * 1000.0)
+    samples.sort()
+    return {
+        'repeats': len(samples),
+        'min_ms': samples[0],
+        'median_ms': statistics.median(samples),
+        'mean_ms': statistics.fmean(samples),
+        'p95_ms': samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))],
+        'max_ms': samples[-1],
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold, min_ms=0.1):
+    """Print median ratios against a baseline. Returns the regressed names.
+
+    Benchmarks faster than min_ms in the baseline are shown but never flagged;
+    at that scale the ratio is mostly timer noise.
+    """
+    regressions = []
+    print(f'\n{"benchmark":<58} {"base ms":>10} {"now ms":>10} {"ratio":>7}')
+    for name, stats in results['results'].items():
+        base = baseline['results'].get(name)
+        if not base:
+            print(f'{name:<58} {"-":>10} {stats["median_ms"]:>10.2f} {"new":>7}')
+            continue
+        ratio = stats['median_ms'] / base['median_ms'] if base['median_ms'] else float('inf')
+        regressed = ratio > threshold and base['median_ms'] >= min_ms
+        flag = '  REGRESSION' if regressed else ''
+        print(f'{name:<58} {base["median_ms"]:>10.2f} {stats["median_ms"]:>10.2f} {ratio:>6.2f}x{flag}')
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', required=True, help='SQLite file path or SQLAlchemy URL')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--filter', default='', help='only run benchmarks whose name contains this')
+    parser.add_argument('--result-cache', default='none', choices=['none', 'memory', 'sqlite'],
+                        help='RESULT_CACHE_BACKEND while benchmarking (default: none)')
+    parser.add_argument('--output', help='write JSON results to this file')
+    parser.add_argument('--baseline', help='compare against an earlier JSON results file')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='median ratio above which a benchmark counts as a regression')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args(argv)
+
+    app = make_app(args.database, RESULT_CACHE_BACKEND=args.result_cache)
+    ctx = Context(app)
+    cases = service_cases(ctx)
+    if app.config['ASYNC_READS']:
+        cases += async_cases(ctx)
+        missing = uncovered_functions(cases)
+    else:
+        missing = uncovered_functions(cases, skip=('async_reads',))
+    cases += route_cases(app, ctx)
+
+    results = {
+        'meta': {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': app.config['SQLALCHEMY_DATABASE_URI'].split('://', 1)[0],
+            'repeats': args.repeats,
+            'warmup': args.warmup,
+            'result_cache': args.result_cache,
+            'counts': ctx.counts,
+        },
+        'results': {},
+        'uncovered': missing,
+    }
+
+    for case in cases:
+        if args.filter not in case.name:
+            continue
+        stats = time_case(app, case, args.repeats, args.warmup)
+        results['results'][case.name] = stats
+        print(f'{case.name:<58} median {stats["median_ms"]:>9.2f} ms   p95 {stats["p95_ms"]:>9.2f} ms',
+              file=sys.stderr)
+    if missing:
+        print(f'Not benchmarked: {", ".join(missing)}', file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions and args.fail_on_regression:
+            raise SystemExit(f'{len(regressions)} benchmark(s) regressed.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Measure worker startup: importing the app, create_app() and the first request.
+
+Each run is a fresh interpreter, like a newly forked gunicorn worker without
+--preload. --tree measures another checkout (e.g. a git worktree of an older
+revision) for comparison:
+
+    git worktree add /tmp/before HEAD~1
+    python -m benchmarks.startup --database /tmp/bench.db --tree /tmp/before
+    python -m benchmarks.startup --database /tmp/bench.db
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks import database_url
+
+PROBE = r'''
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+response = app.test_client().get('/login')
+finished = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({'import_ms': (imported - started) * 1000, 'create_app_ms': (created - imported) * 1000,
+                  'first_request_ms': (finished - created) * 1000, 'total_ms': (finished - started) * 1000}))
+'''
+
+
+def measure(tree, database, runs):
+    env = dict(os.environ, DATABASE_URL=database_url(database))
+    samples = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', PROBE, os.path.abspath(tree)],
+                                         env=env, cwd=os.path.dirname(os.path.abspath(database)),
+                                         text=True)
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', required=True, help='SQLite file path or SQLAlchemy URL')
+    parser.add_argument('--tree', default='.', help='checkout to measure (default: this one)')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--output', help='write JSON results to this file')
+    args = parser.parse_args(argv)
+
+    results = measure(args.tree, args.database, args.runs)
+    for key, value in results.items():
+        print(f'{key:<18} median {value:8.1f} ms')
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'tree': os.path.abspath(args.tree), 'runs': args.runs, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
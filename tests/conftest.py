@@ -0,0 +1,74 @@
+import pytest
+from sqlalchemy import false
+
+PASSWORD = 'testpass'
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """The app against a fresh SQLite database with the preset rituals seeded."""
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path / "test.db"}')
+    monkeypatch.setenv('RESULT_CACHE_BACKEND', 'none')
+    monkeypatch.setenv('SQL_DEBUG_HEADER', '1')
+    from app import create_app, db, migrations
+    from app.seed import seed_preset_rituals
+    from app.services import auth_service, ritual_service
+
+    # Process-wide caches would otherwise carry rows over from another test's database
+    monkeypatch.setattr(auth_service, '_identity_cache', None)
+    ritual_service._preset_catalog.clear()
+
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        migrations.upgrade()
+        seed_preset_rituals()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def user(app):
+    """Id of a user with no history yet."""
+    from app.services import auth_service
+    with app.app_context():
+        return auth_service.create_user('tester', PASSWORD).id
+
+
+@pytest.fixture
+def log_in(user):
+    """Return a function giving a test client of an app, logged in as user."""
+    def log_in(app):
+        client = app.test_client()
+        response = client.post('/login', data={'username': 'tester', 'password': PASSWORD})
+        assert response.status_code == 302
+        return client
+    return log_in
+
+
+@pytest.fixture
+def client(app, log_in):
+    """A test client logged in as user."""
+    return log_in(app)
+
+
+@pytest.fixture
+def first_update_misses(monkeypatch):
+    """Return a function making a module's first UPDATE match nothing.
+
+    That is what a writer racing another one for the same new row sees: its
+    insert then collides with the row the other transaction committed.
+    """
+    def patch(module):
+        real_update = module.update
+        calls = []
+
+        def update(table):
+            statement = real_update(table)
+            calls.append(table)
+            return statement.where(false()) if len(calls) == 1 else statement
+
+        monkeypatch.setattr(module, 'update', update)
+    return patch
@@ -0,0 +1,121 @@
+"""Closing an account locks it; deletion then clears it chunk by chunk."""
+import io
+import json
+
+import pytest
+
+from conftest import PASSWORD
+
+LOGS = 7
+REFLECTIONS = 4
+CHUNK = 3
+
+
+def _give_history(user_id):
+    """LOGS logs over several days, REFLECTIONS reflections, two custom rituals, a queued job."""
+    from app.services import import_service, job_service, ritual_service
+
+    first = ritual_service.create_custom_ritual(user_id, 'First', 'Mine.', 'Ren', 'Li')
+    ritual_service.create_custom_ritual(user_id, 'Second', 'Also mine.', 'Yi')
+    records = [{'created_at': f'2030-01-0{n % 3 + 1}T10:00:0{n}', 'ritual_id': first.id,
+                'reflection': f'Log {n}.'} for n in range(LOGS)]
+    records += [{'type': 'reflection', 'created_at': '2030-01-01T12:00:00',
+                 'reflection': f'Thought {n}.'} for n in range(REFLECTIONS)]
+    lines = '\n'.join(json.dumps(record) for record in records).encode()
+    assert import_service.import_file(user_id, io.BytesIO(lines), 'jsonl').error_count == 0
+    job_service.enqueue('recompute_local_history', user_id=user_id)
+
+
+def _rows(user_id):
+    """{table name: rows} across every table holding the user's data."""
+    from app import db
+    from app.models import Job, RitualUsage, User
+    from app.services.account_service import CASCADED_MODELS, CHUNKED_MODELS
+
+    models = CHUNKED_MODELS + CASCADED_MODELS + (RitualUsage, Job)
+    rows = {model.__tablename__: db.session.query(model).filter(model.user_id == user_id).count()
+            for model in models}
+    rows['users'] = db.session.query(User).filter(User.id == user_id).count()
+    return rows
+
+
+@pytest.fixture
+def other(app):
+    """Id of a second user with history of their own."""
+    from app.services import auth_service
+    with app.app_context():
+        other = auth_service.create_user('other', 'otherpass').id
+        _give_history(other)
+        return other
+
+
+def test_closing_checks_the_password_then_locks_the_account(app, user, client, log_in):
+    from app import db
+    from app.models import User
+    from app.services import account_service
+
+    with app.app_context():
+        assert account_service.close_account(user, 'wrong') == (None, 'Password is incorrect.')
+        assert db.session.get(User, user).password_hash != account_service.LOCKED_PASSWORD_HASH
+
+        closed, error = account_service.close_account(user, PASSWORD)
+        assert error is None
+        assert closed.password_hash == account_service.LOCKED_PASSWORD_HASH
+        assert closed.session_version == 2
+        assert not closed.check_password(PASSWORD)
+
+    # The session signed in before closing has ended, and no new one can start
+    assert client.get('/profile').status_code == 302
+    assert log_in(app).get('/profile').status_code == 302
+
+
+def test_deletion_goes_in_chunks_and_leaves_nothing_behind(app, user, other):
+    from app.services import account_service
+
+    with app.app_context():
+        _give_history(user)
+        before = _rows(user)
+        assert before['ritual_log_entries'] == LOGS
+        assert before['daily_rollups'] and before['activity_bitmaps'] and before['ritual_usage']
+        others = _rows(other)
+
+        progress = []
+        deleted = account_service.delete_account(user, chunk_size=CHUNK,
+                                                 on_progress=progress.append)
+
+        assert deleted == {'ritual_log_entries': LOGS, 'reflections': REFLECTIONS, 'rituals': 2}
+        # One call per chunk: 3 + 3 + 1 logs, 3 + 1 reflections, 2 rituals
+        assert [sum(update['deleted'].values()) for update in progress] == [3, 6, 7, 10, 11, 13]
+        assert {update['total'] for update in progress} == {LOGS + REFLECTIONS + 2}
+        assert progress[-1]['deleted'] == deleted
+
+        assert set(_rows(user).values()) == {0}
+        assert _rows(other) == others
+        assert account_service.delete_account(user) == {}
+
+
+def test_deletion_stopped_halfway_finishes_when_run_again(app, user, monkeypatch):
+    from app.services import account_service
+
+    real_delete_chunk = account_service._delete_chunk
+    calls = []
+
+    def dies_after_two_chunks(*args):
+        calls.append(args)
+        if len(calls) > 2:
+            raise RuntimeError('worker died')
+        return real_delete_chunk(*args)
+
+    with app.app_context():
+        _give_history(user)
+        monkeypatch.setattr(account_service, '_delete_chunk', dies_after_two_chunks)
+        with pytest.raises(RuntimeError):
+            account_service.delete_account(user, chunk_size=CHUNK)
+        # Two chunks of logs are gone; the account is locked but still there
+        assert _rows(user)['ritual_log_entries'] == LOGS - 2 * CHUNK
+        assert _rows(user)['users'] == 1
+
+        monkeypatch.setattr(account_service, '_delete_chunk', real_delete_chunk)
+        deleted = account_service.delete_account(user, chunk_size=CHUNK)
+        assert deleted == {'ritual_log_entries': 1, 'reflections': REFLECTIONS, 'rituals': 2}
+        assert set(_rows(user).values()) == {0}
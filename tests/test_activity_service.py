@@ -0,0 +1,78 @@
+"""Bit-operation streaks and counts agree with a day-by-day count."""
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from app.services.activity_service import ActivitySet, _to_bytes
+
+
+def _streak_ending(days, day):
+    count = 0
+    while day in days:
+        count += 1
+        day -= timedelta(days=1)
+    return count
+
+
+def brute_current_streak(days, today):
+    return _streak_ending(days, today) or _streak_ending(days, today - timedelta(days=1))
+
+
+def brute_longest_streak(days):
+    return max((_streak_ending(days, day) for day in days), default=0)
+
+
+def _span(start, end):
+    return [start + timedelta(days=n) for n in range((end - start).days + 1)]
+
+
+def _from_yearly_bitmaps(days):
+    """Round-trip through per-year bitmap rows, as stored in activity_bitmaps."""
+    built = ActivitySet.from_days(days)
+    years = sorted({day.year for day in days})
+    return ActivitySet.from_bitmaps([(year, _to_bytes(built.year_bits(year))) for year in years])
+
+
+CASES = {
+    # A run across New Year's Eve
+    'year boundary': _span(date(2023, 12, 20), date(2024, 1, 10)),
+    # Through 29 February in a leap year, and 28 February / 1 March in a common one
+    'leap day': (_span(date(2024, 2, 25), date(2024, 3, 3))
+                 + _span(date(2023, 2, 27), date(2023, 3, 1))),
+    # 2025 has no active day at all (and no bitmap row); the run resumes in 2026
+    'empty year': (_span(date(2024, 12, 28), date(2024, 12, 31))
+                   + _span(date(2026, 1, 1), date(2026, 1, 3))),
+    'random': sorted({date(2022, 1, 1) + timedelta(days=n)
+                      for n in random.Random(7).sample(range(1500), 700)}),
+}
+
+
+@pytest.mark.parametrize('name', CASES)
+def test_streaks_and_counts_match_a_brute_force_count(name):
+    days = set(CASES[name])
+    first, last = min(days), max(days)
+    for activity in (ActivitySet.from_days(days), _from_yearly_bitmaps(days)):
+        assert activity.longest_streak() == brute_longest_streak(days)
+        for today in _span(first - timedelta(days=2), last + timedelta(days=3)):
+            assert activity.current_streak(today) == brute_current_streak(days, today), today
+            assert activity.is_active(today) == (today in days)
+        for start in _span(first - timedelta(days=1), last)[::17]:
+            end = start + timedelta(days=40)
+            expected = sum(1 for day in days if start <= day <= end)
+            assert activity.count_between(start, end) == expected
+
+
+def test_year_bits_of_an_empty_year():
+    activity = ActivitySet.from_days(CASES['empty year'])
+    assert activity.year_bits(2025) == 0
+    assert activity.year_bits(2026) == 0b111
+    assert activity.longest_streak() == 4
+
+
+def test_no_activity():
+    activity = ActivitySet.from_bitmaps([])
+    assert activity.current_streak(date(2024, 1, 1)) == 0
+    assert activity.longest_streak() == 0
+    assert activity.count_between(date(2024, 1, 1), date(2024, 12, 31)) == 0
+    assert activity.year_bits(2024) == 0
@@ -0,0 +1,52 @@
+"""Conditional GETs on the JSON API."""
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import update
+
+WRITTEN_AT = datetime(2030, 1, 1, 12, 0, 0, 100000)
+
+
+@pytest.fixture
+def written(app, user, monkeypatch):
+    """The user's data version stamped at WRITTEN_AT; returns a function freezing the clock."""
+    from app import api, db
+    from app.models import CacheVersion
+    from app.services import log_service, ritual_service, version_service
+
+    with app.app_context():
+        log_service.create_log_entry(user, ritual_service.get_preset_rituals()[0].id, 'self', 'x')
+        db.session.execute(update(CacheVersion)
+                           .where(CacheVersion.name == version_service.user_data_key(user))
+                           .values(updated_at=WRITTEN_AT))
+        db.session.commit()
+
+    def freeze(now):
+        class Frozen(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return now.replace(tzinfo=timezone.utc).astimezone(tz)
+        monkeypatch.setattr(api, 'datetime', Frozen)
+    return freeze
+
+
+def test_last_modified_rounds_up_to_the_next_second(client, written):
+    written(datetime(2030, 1, 1, 12, 0, 5))
+    response = client.get('/api/v1/summary')
+    assert response.headers['Last-Modified'] == 'Tue, 01 Jan 2030 12:00:01 GMT'
+
+    stale = client.get('/api/v1/summary',
+                       headers={'If-Modified-Since': 'Tue, 01 Jan 2030 12:00:00 GMT'})
+    assert stale.status_code == 200
+    fresh = client.get('/api/v1/summary',
+                       headers={'If-Modified-Since': 'Tue, 01 Jan 2030 12:00:01 GMT'})
+    assert fresh.status_code == 304
+
+
+def test_no_last_modified_within_the_second_of_a_write(client, written):
+    # Another write later in this second would get the same rounded stamp
+    written(datetime(2030, 1, 1, 12, 0, 0, 500000))
+    response = client.get('/api/v1/summary')
+    assert response.status_code == 200
+    assert 'Last-Modified' not in response.headers
+    assert response.headers['ETag']
@@ -0,0 +1,76 @@
+"""Cached identities must follow changes made by other worker processes."""
+from contextlib import contextmanager
+
+from sqlalchemy import event, update
+
+
+def _change_elsewhere(user_id, **values):
+    """Change the user the way another worker would: its identity cache is not ours."""
+    from app import db
+    from app.models import User
+    from app.services import version_service
+
+    db.session.execute(update(User).where(User.id == user_id).values(**values))
+    version_service.bump_version(version_service.identity_key(user_id))
+    db.session.commit()
+
+
+@contextmanager
+def _count_queries(engine):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+def test_warm_identity_hit_runs_no_queries(app, user):
+    from app import db
+    from app.services import auth_service
+
+    with app.app_context():
+        with _count_queries(db.engine) as cold:
+            auth_service.load_user_identity(f'{user}:1')
+        with _count_queries(db.engine) as warm:
+            identity = auth_service.load_user_identity(f'{user}:1')
+    assert len(cold) == 1
+    assert warm == []
+    assert identity.id == user
+
+
+def test_identity_stamp_is_rechecked_after_the_interval(app, user):
+    from app.services import auth_service
+
+    with app.app_context():
+        assert auth_service.load_user_identity(f'{user}:1').timezone == 'UTC'
+        _change_elsewhere(user, timezone='Asia/Tokyo')
+        # Within the interval the cached copy is trusted
+        assert auth_service.load_user_identity(f'{user}:1').timezone == 'UTC'
+        app.config['USER_CACHE_CHECK_SECONDS'] = 0
+        assert auth_service.load_user_identity(f'{user}:1').timezone == 'Asia/Tokyo'
+
+
+def test_cached_identity_follows_a_change_in_another_worker(app, user):
+    from app.services import auth_service
+
+    app.config['USER_CACHE_CHECK_SECONDS'] = 0
+    with app.app_context():
+        assert auth_service.load_user_identity(f'{user}:1').timezone == 'UTC'
+        _change_elsewhere(user, timezone='Asia/Tokyo')
+        assert auth_service.load_user_identity(f'{user}:1').timezone == 'Asia/Tokyo'
+
+
+def test_cached_identity_ends_when_another_worker_ends_sessions(app, user):
+    from app.services import auth_service
+
+    app.config['USER_CACHE_CHECK_SECONDS'] = 0
+    with app.app_context():
+        assert auth_service.load_user_identity(f'{user}:1') is not None
+        _change_elsewhere(user, session_version=2)
+        assert auth_service.load_user_identity(f'{user}:1') is None
+        assert auth_service.load_user_identity(f'{user}:2') is not None
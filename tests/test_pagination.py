@@ -0,0 +1,106 @@
+"""Keyset cursors page through rows sharing a created_at without skipping any."""
+import base64
+from datetime import datetime
+
+import pytest
+from sqlalchemy import update
+
+from app.services.pagination import NEXT, encode_token
+
+# Every row gets the same timestamp, so only the id tie-break orders them
+WRITTEN_AT = datetime(2030, 1, 1, 12, 0)
+ROWS = 23
+PER_PAGE = 5
+
+
+@pytest.fixture
+def history(app, user):
+    """ROWS logs and ROWS reflections all written at WRITTEN_AT."""
+    from app import db
+    from app.models import Reflection, RitualLogEntry
+    from app.services import log_service, reflection_service, ritual_service
+
+    with app.app_context():
+        ritual_id = ritual_service.get_preset_rituals()[0].id
+        for n in range(ROWS):
+            log_service.create_log_entry(user, ritual_id, 'self', f'Log {n}.')
+            reflection_service.create_reflection(user, f'Reflection {n}.')
+        for model in (RitualLogEntry, Reflection):
+            db.session.execute(update(model).where(model.user_id == user)
+                               .values(created_at=WRITTEN_AT))
+        db.session.commit()
+    return user
+
+
+def _fetchers():
+    from app.services import log_service, reflection_service
+    return [log_service.get_user_ritual_logs_page, reflection_service.get_user_reflections_page]
+
+
+@pytest.mark.parametrize('kind', [0, 1], ids=['logs', 'reflections'])
+def test_cursors_visit_every_row_once_in_both_directions(app, history, kind):
+    with app.app_context():
+        fetch = _fetchers()[kind]
+        pages = [fetch(history, per_page=PER_PAGE)]
+        while pages[-1].has_next:
+            pages.append(fetch(history, cursor=pages[-1].next_cursor, per_page=PER_PAGE))
+        ids = [item.id for page in pages for item in page.items]
+        assert ids == sorted(ids, reverse=True)
+        assert len(ids) == len(set(ids)) == ROWS
+        assert len(pages) == -(-ROWS // PER_PAGE)
+        assert not pages[0].has_prev
+
+        # Walking back from the last page gives the same pages in reverse
+        back = [pages[-1]]
+        while back[-1].has_prev:
+            back.append(fetch(history, cursor=back[-1].prev_cursor, per_page=PER_PAGE))
+        assert [[item.id for item in page.items] for page in reversed(back)] == \
+            [[item.id for item in page.items] for page in pages]
+
+
+BAD_CURSORS = {
+    'garbage': '!!not a cursor!!',
+    'not json': base64.urlsafe_b64encode(b'\xff{[').decode(),
+    'not a list': encode_token({'created_at': '2030-01-01T12:00:00', 'id': 1, 'd': NEXT}),
+    'wrong direction': encode_token(['2030-01-01T12:00:00', 1, 'x']),
+    'bad timestamp': encode_token(['yesterday', 1, NEXT]),
+    'bad id': encode_token(['2030-01-01T12:00:00', 'one', NEXT]),
+    'infinite id': encode_token(['2030-01-01T12:00:00', float('inf'), NEXT]),
+    'huge id': encode_token(['2030-01-01T12:00:00', 2 ** 80, NEXT]),
+}
+
+
+@pytest.mark.parametrize('name', BAD_CURSORS)
+def test_a_bad_cursor_falls_back_to_the_first_page(app, history, client, name):
+    with app.app_context():
+        first = _fetchers()[0](history, per_page=PER_PAGE)
+    response = client.get('/api/v1/logs', query_string={'cursor': BAD_CURSORS[name],
+                                                        'limit': PER_PAGE})
+    assert response.status_code == 200
+    assert [item['id'] for item in response.json['items']] == [item.id for item in first.items]
+
+
+def test_a_cursor_forged_from_another_users_row_only_reaches_own_rows(app, history, client):
+    from app.models import RitualLogEntry
+    from app.services import auth_service, log_service, ritual_service
+
+    with app.app_context():
+        other = auth_service.create_user('other', 'otherpass').id
+        ritual_id = ritual_service.get_preset_rituals()[0].id
+        theirs = log_service.create_log_entry(other, ritual_id, 'self', 'Not yours.').id
+        # Positioned after all of the user's rows, so every one of them is older
+        cursor = encode_token(['2031-01-01T00:00:00', theirs + 1, NEXT])
+        own = {entry.id for entry in RitualLogEntry.query.filter_by(user_id=history)}
+
+    response = client.get('/api/v1/logs', query_string={'cursor': cursor, 'limit': 50})
+    assert response.status_code == 200
+    ids = {item['id'] for item in response.json['items']}
+    assert theirs not in ids
+    assert ids == own
+
+
+def test_a_huge_search_cursor_falls_back_to_the_first_page(app, history, client):
+    cursor = encode_token([1.0, 0, 2 ** 80])
+    response = client.get('/api/v1/search', query_string={'q': 'Log', 'cursor': cursor})
+    assert response.status_code == 200
+    assert response.json['items']
@@ -0,0 +1,95 @@
+"""Page query counts must not grow with a user's history (no N+1 queries)."""
+import re
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+CONTEXTS = ['family', 'teacher', 'friend', 'self']
+
+
+def _add_history(app, user_id, logs, reflections):
+    """Insert logs and reflections spread over past days, then rebuild the derived tables."""
+    from app import db
+    from app.models import Reflection, Ritual, RitualLogEntry
+    from app.services import (ritual_service, rollup_service, usage_service,
+                              version_service)
+
+    now = datetime.utcnow()
+    with app.app_context():
+        ritual_service.create_custom_ritual(user_id, f'Custom {logs}', 'A ritual of my own.',
+                                            'Ren', 'Li')
+        ritual_ids = [row[0] for row in db.session.query(Ritual.id).filter(
+            db.or_(Ritual.user_id.is_(None), Ritual.user_id == user_id))]
+        stamps = [now - timedelta(hours=7 * i) for i in range(logs)]
+        db.session.execute(insert(RitualLogEntry), [
+            {'user_id': user_id, 'ritual_id': ritual_ids[i % len(ritual_ids)],
+             'context': CONTEXTS[i % len(CONTEXTS)], 'reflection': f'Entry {i}.',
+             'created_at': ts, 'local_date': ts.date()}
+            for i, ts in enumerate(stamps)
+        ])
+        db.session.execute(insert(Reflection), [
+            {'user_id': user_id, 'reflection_text': f'Reflection {i}.', 'created_at': ts,
+             'local_date': ts.date()}
+            for i, ts in enumerate(stamps[:reflections])
+        ])
+        db.session.commit()
+        usage_service.rebuild_usage(user_id)
+        rollup_service.rebuild_rollups(user_id)
+        version_service.bump_user_data_version(user_id)
+        db.session.commit()
+
+
+def _query_count(client, path):
+    # Warm the identity and preset caches, so both counts see the same cache state
+    client.get(path)
+    response = client.get(path)
+    assert response.status_code == 200
+    return int(re.match(r'count=(\d+)', response.headers['X-SQL-Queries']).group(1))
+
+
+@pytest.mark.parametrize('path', ['/rituals', '/summary'])
+def test_query_count_does_not_grow_with_history(app, user, client, path):
+    _add_history(app, user, logs=3, reflections=1)
+    few = _query_count(client, path)
+
+    _add_history(app, user, logs=120, reflections=40)
+    many = _query_count(client, path)
+
+    assert few == many
+
+
+def test_my_rituals_query_count_does_not_grow_with_custom_rituals(app, user, client):
+    from app.services import log_service, ritual_service
+
+    _add_history(app, user, logs=3, reflections=1)
+    few = _query_count(client, '/my-rituals')
+
+    with app.app_context():
+        for n in range(4):
+            ritual = ritual_service.create_custom_ritual(user, f'Extra {n}', 'More.', 'Yi', 'Zhi')
+            for _ in range(n + 2):
+                log_service.create_log_entry(user, ritual.id, 'self', 'Again.')
+    many = _query_count(client, '/my-rituals')
+
+    assert few == many
+    # Usage comes from the counters: 'Extra 3' was logged five times
+    assert b'Used 5 time(s)' in client.get('/my-rituals').data
+
+
+@pytest.fixture
+def async_reads(monkeypatch):
+    pytest.importorskip('aiosqlite')
+    monkeypatch.setenv('ASYNC_READS', '1')
+
+
+@pytest.mark.parametrize('path', ['/summary', '/api/v1/summary'])
+def test_async_reads_are_counted(async_reads, app, user, client, log_in, path, monkeypatch):
+    from app import create_app
+
+    _add_history(app, user, logs=20, reflections=5)
+    on_async = _query_count(client, path)
+
+    # The same database through the sync read path
+    monkeypatch.setenv('ASYNC_READS', '0')
+    assert _query_count(log_in(create_app()), path) == on_async
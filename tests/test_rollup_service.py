@@ -0,0 +1,15 @@
+"""Daily rollups maintained on every log write."""
+
+
+def test_adjust_day_retries_as_update_when_the_row_appears(app, user, first_update_misses):
+    from app import db
+    from app.models import DailyRollup
+    from app.services import log_service, ritual_service, rollup_service
+
+    with app.app_context():
+        entry = log_service.create_log_entry(user, ritual_service.get_preset_rituals()[0].id,
+                                             'self', 'First.')
+        first_update_misses(rollup_service)
+        rollup_service.adjust_day(user, entry.local_date, 1, {})
+        db.session.commit()
+        assert db.session.query(DailyRollup.log_count).filter_by(user_id=user).scalar() == 2
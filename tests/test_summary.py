@@ -0,0 +1,40 @@
+"""Summary dates follow the user's time zone, not the server's."""
+from datetime import date, datetime
+
+from sqlalchemy import update
+
+# 23:30 UTC on 1 January is already 2 January in Tokyo
+JOINED_AT = datetime(2030, 1, 1, 23, 30)
+NOW = datetime(2030, 1, 2, 0, 30)
+
+
+def _join_in_tokyo(user_id):
+    from app import db
+    from app.models import User
+
+    db.session.execute(update(User).where(User.id == user_id)
+                       .values(created_at=JOINED_AT, timezone='Asia/Tokyo'))
+    db.session.commit()
+
+
+def test_days_on_journey_counts_local_calendar_days(app, user):
+    from app.services.summary_engine import SummaryEngine
+
+    with app.app_context():
+        _join_in_tokyo(user)
+        first_day = SummaryEngine(user, today=date(2030, 1, 2)).compute()
+        second_day = SummaryEngine(user, today=date(2030, 1, 3)).compute()
+    assert first_day.all_time.days_on_journey == 1
+    assert second_day.all_time.days_on_journey == 2
+
+
+def test_all_time_stats_use_the_users_today(app, user, monkeypatch):
+    from app.services import summary_service, timezone_service
+
+    real_local_today = timezone_service.local_today
+    monkeypatch.setattr(timezone_service, 'local_today',
+                        lambda tz_name, now=None: real_local_today(tz_name, now or NOW))
+    with app.app_context():
+        _join_in_tokyo(user)
+        assert summary_service.get_all_time_stats(user)['days_on_journey'] == 1
+        assert summary_service.get_week_date_range(tz_name='Asia/Tokyo')[0] == date(2029, 12, 31)
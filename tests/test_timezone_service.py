@@ -0,0 +1,59 @@
+"""Changing a user's time zone re-dates their history."""
+from datetime import date, datetime
+
+from sqlalchemy import update
+
+# 23:30 UTC on 1 January is already 2 January in Tokyo
+WRITTEN_AT = datetime(2030, 1, 1, 23, 30)
+
+
+def _write_late_on_new_years_day(user_id):
+    from app import db
+    from app.models import Reflection, RitualLogEntry
+    from app.services import (log_service, reflection_service, ritual_service,
+                              rollup_service)
+
+    ritual_id = ritual_service.get_preset_rituals()[0].id
+    for _ in range(2):
+        log_service.create_log_entry(user_id, ritual_id, 'self', 'Late.')
+    reflection_service.create_reflection(user_id, 'Late thoughts.')
+    for model in (RitualLogEntry, Reflection):
+        db.session.execute(update(model).where(model.user_id == user_id)
+                           .values(created_at=WRITTEN_AT, local_date=WRITTEN_AT.date()))
+    db.session.commit()
+    rollup_service.rebuild_rollups(user_id)
+
+
+def _history(user_id):
+    from app import db
+    from app.models import DailyRollup, Reflection, RitualLogEntry
+    from app.services import activity_service
+
+    activity = activity_service.get_activity(user_id)
+    return {
+        'logs': {day for (day,) in db.session.query(RitualLogEntry.local_date)
+                 .filter_by(user_id=user_id)},
+        'reflections': {day for (day,) in db.session.query(Reflection.local_date)
+                        .filter_by(user_id=user_id)},
+        'rollups': dict(db.session.query(DailyRollup.day, DailyRollup.log_count)
+                        .filter_by(user_id=user_id)),
+        'active': [day for day in (date(2030, 1, 1), date(2030, 1, 2)) if activity.is_active(day)],
+    }
+
+
+def test_time_zone_change_redates_logs_rollups_and_bitmaps(app, user, client):
+    with app.app_context():
+        _write_late_on_new_years_day(user)
+        assert _history(user) == {
+            'logs': {date(2030, 1, 1)}, 'reflections': {date(2030, 1, 1)},
+            'rollups': {date(2030, 1, 1): 2}, 'active': [date(2030, 1, 1)],
+        }
+
+    response = client.post('/profile', data={'action': 'set_timezone', 'timezone': 'Asia/Tokyo'})
+    assert response.status_code == 302
+
+    with app.app_context():
+        assert _history(user) == {
+            'logs': {date(2030, 1, 2)}, 'reflections': {date(2030, 1, 2)},
+            'rollups': {date(2030, 1, 2): 2}, 'active': [date(2030, 1, 2)],
+        }
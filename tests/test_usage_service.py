@@ -0,0 +1,101 @@
+"""Per-ritual usage counters."""
+
+
+def test_adjust_usage_retries_as_update_when_the_row_appears(app, user, first_update_misses):
+    from app import db
+    from app.models import RitualUsage
+    from app.services import log_service, ritual_service, usage_service
+
+    with app.app_context():
+        ritual_id = ritual_service.get_preset_rituals()[0].id
+        log_service.create_log_entry(user, ritual_id, 'self', 'First.')
+        first_update_misses(usage_service)
+        usage_service.adjust_usage(user, ritual_id, 1)
+        db.session.commit()
+        assert db.session.query(RitualUsage.log_count).filter_by(user_id=user).scalar() == 2
+
+
+def _derived(user_id):
+    """The user's rollups, activity bitmaps and usage counters as plain data."""
+    from app import db
+    from app.models import ActivityBitmap, DailyRollup, RitualUsage
+    from app.services.rollup_service import VIRTUE_COLUMNS
+
+    scores = [getattr(DailyRollup, column) for column in VIRTUE_COLUMNS.values()]
+    return {
+        'rollups': {row[0]: tuple(row[1:]) for row in db.session.query(
+            DailyRollup.day, DailyRollup.log_count, *scores).filter_by(user_id=user_id)},
+        'bitmaps': dict(db.session.query(ActivityBitmap.year, ActivityBitmap.days)
+                        .filter_by(user_id=user_id)),
+        'usage': dict(db.session.query(RitualUsage.ritual_id, RitualUsage.log_count)
+                      .filter_by(user_id=user_id)),
+    }
+
+
+def _import(user_id, records):
+    import io
+    import json
+    from app.services import import_service
+
+    lines = '\n'.join(json.dumps(record) for record in records).encode()
+    report = import_service.import_file(user_id, io.BytesIO(lines), 'jsonl')
+    assert report.error_count == 0
+
+
+def test_incremental_counters_match_a_full_rebuild(app, user):
+    from app.models import RitualLogEntry
+    from app.services import (log_service, ritual_service, rollup_service, usage_service)
+
+    with app.app_context():
+        preset, other = [ritual.id for ritual in ritual_service.get_preset_rituals()[:2]]
+        custom = ritual_service.create_custom_ritual(user, 'Mine', 'A ritual.', 'Ren', 'Li')
+
+        # create
+        entries = [log_service.create_log_entry(user, ritual_id, 'self', 'Done.')
+                   for ritual_id in (preset, preset, custom.id, other)]
+        # import, over several days and across a year boundary
+        _import(user, [{'created_at': created_at, 'ritual_id': ritual_id, 'reflection': 'Old.'}
+                       for created_at, ritual_id in (('2029-12-31T10:00:00', custom.id),
+                                                     ('2030-01-01T10:00:00', preset),
+                                                     ('2030-01-01T11:00:00', custom.id),
+                                                     ('2030-03-01T09:00:00', other))])
+        # edit: move a log to another ritual
+        log_service.update_log_entry(entries[0], custom.id, 'family', 'Moved.')
+        # recategorize the custom ritual its logs now score under
+        ritual_service.update_custom_ritual(custom, 'Mine', 'A ritual.', 'Yi', 'Zhi')
+        # delete: one log of today, and the only log of 1 March
+        log_service.delete_log_entry(entries[3])
+        march = RitualLogEntry.query.filter_by(user_id=user, ritual_id=other).one()
+        log_service.delete_log_entry(march)
+
+        incremental = _derived(user)
+        assert usage_service.check_usage(user) == []
+
+        rollup_service.rebuild_rollups(user)
+        usage_service.rebuild_usage(user)
+        assert _derived(user) == incremental
+        assert incremental['usage'] == {preset: 2, custom.id: 4}
+
+
+def test_check_usage_repairs_drifted_counters(app, user):
+    from app import db
+    from app.models import RitualUsage
+    from app.services import log_service, ritual_service, usage_service
+
+    with app.app_context():
+        preset, other = [ritual.id for ritual in ritual_service.get_preset_rituals()[:2]]
+        log_service.create_log_entry(user, preset, 'self', 'Done.')
+        # Counters gone wrong: one too high, one missing, one for a ritual never logged
+        db.session.query(RitualUsage).filter_by(user_id=user, ritual_id=preset)\
+            .update({'log_count': 5})
+        log_service.create_log_entry(user, other, 'self', 'Done.')
+        db.session.query(RitualUsage).filter_by(user_id=user, ritual_id=other).delete()
+        custom = ritual_service.create_custom_ritual(user, 'Unused', 'Never logged.', 'Ren')
+        db.session.add(RitualUsage(user_id=user, ritual_id=custom.id, log_count=2))
+        db.session.commit()
+
+        drift = usage_service.check_usage(user, repair=True)
+        assert {(item.ritual_id, item.stored, item.actual) for item in drift} == {
+            (preset, 5, 1), (other, 0, 1), (custom.id, 2, 0)}
+        assert usage_service.check_usage(user) == []
+        assert usage_service.get_usage_counts(user) == {preset: 1, other: 1}
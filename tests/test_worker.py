@@ -0,0 +1,21 @@
+"""The worker keeps running jobs alive in the queue's eyes."""
+import time
+
+
+def test_worker_heartbeats_jobs_that_never_report_progress(app, monkeypatch):
+    from app import db
+    from app.models import Job
+    from app.services import job_service
+    from app.worker import Worker
+
+    monkeypatch.setattr(job_service, 'HEARTBEAT_SECONDS', 0.05)
+    monkeypatch.setitem(job_service.HANDLERS, 'sleep', lambda job: time.sleep(0.5))
+    with app.app_context():
+        job_id = job_service.enqueue('sleep').id
+
+    Worker(app, concurrency=1, poll_interval=0.01).run(drain=True)
+
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        assert job.status == job_service.SUCCEEDED
+        assert job.heartbeat_at > job.started_at
@@ -4,4 +4,10 @@ from app import create_app
 app = create_app()
 
 if __name__ == "__main__":
+    # Local convenience; deployments run `flask init-db` once instead
+    from app import migrations
+    from app.seed import seed_preset_rituals
+    with app.app_context():
+        migrations.upgrade()
+        seed_preset_rituals()
     app.run()